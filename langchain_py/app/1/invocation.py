@@ -1,18 +1,10 @@
-from app.config import settings
-from langchain_openai import ChatOpenAI
+from app.registry import get_chat_model
+from app.batch import AdaptiveBatchExecutor
+from app.stream_metrics import StreamingMetricsHandler
 from langchain_core.output_parsers import StrOutputParser
 from langchain.messages import HumanMessage, AIMessage, SystemMessage
 
 
-model = ChatOpenAI(
-    model=settings.glm_model,
-    base_url=settings.siliconflow_base_url,
-    api_key=settings.siliconflow_api_key,
-    temperature=0.9,
-    max_tokens=3000,
-    timeout=60,
-)
-
 def test_invoke():
     """
     invoke 调用
@@ -34,6 +26,7 @@ def test_invoke():
     """
     # 通过管道符 | 链接模型和解析器，返回一个增强的链。 新的链调用模型的结果 会从 AIMessage 转换为字符串
     # 文档参考：https://reference.langchain.com/python/langchain_core/output_parsers/#langchain_core.output_parsers.JsonOutputParser.assign
+    model = get_chat_model("glm", max_tokens=3000)
     chain = model | StrOutputParser() # 这就是 LCEL (LangChain Expression Language)
     ans = chain.invoke("Translate 'I love programming' into Chinese.")
     print(ans)
@@ -46,12 +39,15 @@ def test_stream():
     """
     Stream 调用 (流式输出)
     """
+    model = get_chat_model("glm", max_tokens=3000)
     chain = model | StrOutputParser()
     messages = [
         ["system", "You are a helpful translator. Translate the user sentence to Chinese."],
         ["human", "I love programming."]
     ]
-    stream = chain.stream(messages) # 返回一个迭代器
+    # 通过 callbacks 记录首 token 延迟、chunk 间隔等指标
+    metrics = StreamingMetricsHandler()
+    stream = chain.stream(messages, config={"callbacks": [metrics]}) # 返回一个迭代器
     for chunk in stream: 
         print(chunk, end="\n", flush=True)
     """
@@ -60,6 +56,34 @@ def test_stream():
         喜欢
         编程。
     """
+    print(metrics.to_json(indent=2))
+
+
+def test_stream_metrics():
+    """
+    对比不同模型的流式输出延迟：同一个 handler 挂到多个链上，按模型分别统计
+    """
+    metrics = StreamingMetricsHandler()
+    messages = [
+        ["system", "You are a helpful assistant."],
+        ["human", "100字内，介绍下langchain。"]
+    ]
+    for name in ("glm", "ds", "qwen3_32b"):
+        chain = get_chat_model(name, max_tokens=3000) | StrOutputParser()
+        for _ in range(3):
+            for _ in chain.stream(messages, config={"callbacks": [metrics]}):
+                pass
+    for model, m in metrics.snapshot().items():
+        print(f"{model}: TTFT p50={m['ttft_seconds']['p50']:.2f}s, chunk 间隔 p99={m['inter_chunk_gap_seconds']['p99']:.3f}s")
+    # Prometheus text 格式，可以直接写到 node_exporter 的 textfile 目录
+    print(metrics.to_prometheus())
+    """
+    输出：
+        # HELP llm_stream_ttft_seconds Time from request start to the first streamed token
+        # TYPE llm_stream_ttft_seconds histogram
+        llm_stream_ttft_seconds_bucket{model="Pro/zai-org/GLM-4.7",le="0.05"} 0
+        ...
+    """
 
 
 def test_batch():
@@ -67,6 +91,7 @@ def test_batch():
     # Batch 调用 (并行执行多个请求)
     数组的每一项是一个请求, 请求是并行的
     """
+    model = get_chat_model("glm", max_tokens=3000)
     chain = model | StrOutputParser()
     batches = chain.batch([
         [
@@ -100,5 +125,87 @@ def test_batch():
     #     ],
     # ])
 
+
+def test_adaptive_batch():
+    """
+    自适应并发的批量调用（大批量请求时使用）
+    并发数根据 429 / 超时自动调整；传入 checkpoint 后可以断点续跑
+    """
+    # max_retries=0：让 429 直接抛给执行器，由执行器降并发并重新排队
+    model = get_chat_model("glm", max_tokens=3000, max_retries=0)
+    chain = model | StrOutputParser()
+    sentences = ["I love programming.", "The weather is nice today.", "LangChain makes LLM apps easier."]
+    inputs = [
+        [
+            {"role": "system", "content": "You are a helpful translator. Translate the sentence to Chinese."},
+            {"role": "human", "content": sentence},
+        ]
+        for sentence in sentences
+    ]
+    executor = AdaptiveBatchExecutor(initial_concurrency=2, max_concurrency=32)
+
+    # 保持输入顺序
+    results = executor.batch(chain, inputs, checkpoint="translate_batch.jsonl", return_exceptions=True)
+    for i, res in enumerate(results):
+        print(f"Result {i+1}:\n{res}\n")
+    print(executor.stats)
+
+    # 按完成顺序流式返回
+    # for i, res in executor.batch_as_completed(chain, inputs):
+    #     print(f"Result {i+1}:\n{res}\n")
+
+
+# ================================== 异步 ==================================
+# 每个 Runnable 都有对应的异步方法：ainvoke / astream / abatch。
+# 在 asyncio 中，一个并发会话不再占用一个线程，适合高并发的服务端场景。
+
+async def atest_invoke():
+    """
+    ainvoke 调用
+    """
+    model = get_chat_model("glm", max_tokens=3000)
+    chain = model | StrOutputParser()
+    ans = await chain.ainvoke("Translate 'I love programming' into Chinese.")
+    print(ans)
+
+
+async def atest_stream():
+    """
+    astream 调用 (异步流式输出)
+    """
+    model = get_chat_model("glm", max_tokens=3000)
+    chain = model | StrOutputParser()
+    messages = [
+        ["system", "You are a helpful translator. Translate the user sentence to Chinese."],
+        ["human", "I love programming."]
+    ]
+    async for chunk in chain.astream(messages): # 返回一个异步迭代器
+        print(chunk, end="\n", flush=True)
+
+
+async def atest_batch():
+    """
+    abatch 调用，以及用 asyncio.gather 并发多个会话
+    """
+    model = get_chat_model("glm", max_tokens=3000)
+    chain = model | StrOutputParser()
+    batches = await chain.abatch([
+        [{"role": "human", "content": "I love programming. 翻译成中文"}],
+        [{"role": "human", "content": "100字内，介绍下langchain。"}],
+    ])
+    for i, res in enumerate(batches):
+        print(f"Result {i+1}:\n{res}\n")
+
+    # 按完成顺序返回：abatch_as_completed
+    # async for i, res in chain.abatch_as_completed([...]):
+    #     print(i, res)
+
+    # 自适应并发的异步版本
+    # executor = AdaptiveBatchExecutor()
+    # results = await executor.abatch(chain, inputs)
+
+
 if __name__ == "__main__":
     test_batch()
+    # import asyncio
+    # asyncio.run(atest_invoke())
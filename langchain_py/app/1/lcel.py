@@ -1,5 +1,7 @@
-from app.config import settings
-from langchain_openai import ChatOpenAI
+from app.registry import get_chat_model
+from app.local_classifier import LocalClassifier
+from app.profiler import RunnableProfiler
+from app.speculative import SpeculativeBranch
 from langchain_core.prompts import SystemMessagePromptTemplate, HumanMessagePromptTemplate,AIMessagePromptTemplate, ChatPromptTemplate
 from langchain_core.runnables import RunnableSequence, RunnablePassthrough, RunnableLambda, RunnableBranch
 from langchain_core.output_parsers import StrOutputParser
@@ -8,15 +10,6 @@ from pydantic import BaseModel
 from typing import Literal
 
 
-model = ChatOpenAI(
-    model=settings.glm_model,
-    base_url=settings.siliconflow_base_url,
-    api_key=settings.siliconflow_api_key,
-    temperature=0.9,
-    max_tokens=3000,
-    timeout=60,
-)
-
 def test_prompt_template():
     """
     测试提示模板:
@@ -85,6 +78,7 @@ def test_lcel():
         ]
     )
 
+    model = get_chat_model("glm", max_tokens=3000)
     chain = c_prompt | model | StrOutputParser()
     ans = chain.invoke({
         "role": "专业的翻译", "user_input": "I love programming."
@@ -96,6 +90,7 @@ def test_lcel():
 
 
 def test_runnable_sequence():
+    model = get_chat_model("glm", max_tokens=3000)
 
     prompt = ChatPromptTemplate(
         [
@@ -118,22 +113,79 @@ def test_runnable_sequence():
     # chain = RunnableLambda(classifier) | prompt | model | StrOutputParser()
     # 等价于
     chain = RunnableSequence(RunnableLambda(classifier), prompt, model, StrOutputParser())  
+    # 按阶段统计耗时（墙钟 / CPU 时间、内存分配、输入输出大小），多次调用累计
+    profiler = RunnableProfiler()
     ans = chain.invoke(
         {
             "question": "科普，鲸鱼是哺乳动物么？只需要回答是或不是",
             "instruction": "用中文回答",
-        }
+        },
+        config={"callbacks": [profiler]},
     )
     print(ans)
     # 是
+    print(profiler.format_table())
+    # stage                                             calls   p50(ms)  self(ms)  cpu(ms)   blocks    in(B)   out(B)
+    # RunnableSequence > ChatOpenAI                         1    708.11    708.11     3.02      233      128        3
+    # RunnableSequence                                      1    713.47      1.52     0.89       76      101        3
+    # ...
+    # 导出为火焰图：flamegraph.pl profile.folded > profile.svg，或者直接拖进 https://www.speedscope.app
+    # profiler.write_collapsed("profile.folded")
+    # profiler.write_json("profile.json")
 
 
-def test_runnable_branch():
-    class ClassifyResult(BaseModel):
-        type: Literal["科普", "编程", "其他"]
+class ClassifyResult(BaseModel):
+    type: Literal["科普", "编程", "其他"]
 
-    structured_model = model.with_structured_output(ClassifyResult)
 
+# 本地分类器的示例问题和关键词（每个类别的示例越有代表性，需要回退到 LLM 的比例越低）
+TOPIC_EXAMPLES = {
+    "科普": [
+        "鲸鱼是哺乳动物吗？", "为什么天空是蓝色的？", "黑洞是怎么形成的？", "人为什么会做梦？",
+        "地球为什么有四季？", "光速是多少？", "植物是怎么进行光合作用的？", "恐龙是怎么灭绝的？",
+    ],
+    "编程": [
+        "Python 怎么读取文件？", "如何用 langchain 创建一个 agent？", "JavaScript 中 let 和 var 有什么区别？",
+        "这段代码报错 KeyError 怎么办？", "怎么写一个快速排序？", "git rebase 和 merge 有什么区别？",
+        "如何在 Java 里实现单例模式？", "SQL 怎么查询重复的数据？",
+    ],
+    "其他": [
+        "帮我写一首关于春天的诗", "周末去哪里玩比较好？", "推荐几本好看的小说", "今天心情不好怎么办？",
+        "帮我起一个公司名字", "怎么和同事相处？", "晚饭吃什么好？", "给我讲个笑话",
+    ],
+}
+TOPIC_KEYWORDS = {
+    "科普": ["为什么", "原理", "动物", "宇宙", "物理", "化学", "生物", "地球", "天文", "科学"],
+    "编程": ["python", "java", "javascript", "代码", "编程", "函数", "报错", "bug", "sql", "git", "langchain", "算法", "api"],
+    "其他": ["推荐", "诗", "笑话", "心情", "旅游", "名字"],
+}
+
+
+def build_topic_classifier(structured_model=None) -> LocalClassifier:
+    """
+    本地分类器（关键词 + 字符 n-gram 质心），不确定时回退到 LLM 结构化输出分类
+    """
+    def llm_classify(text: str) -> str:
+        return structured_model.invoke(
+            f"请判断以下问题的类型，并只返回JSON：{{\"type\": \"科普\"|\"编程\"|\"其他\"}}。问题：{text}"
+        ).type
+
+    async def allm_classify(text: str) -> str:
+        return (await structured_model.ainvoke(
+            f"请判断以下问题的类型，并只返回JSON：{{\"type\": \"科普\"|\"编程\"|\"其他\"}}。问题：{text}"
+        )).type
+
+    return LocalClassifier(
+        TOPIC_EXAMPLES,
+        TOPIC_KEYWORDS,
+        fallback=llm_classify if structured_model is not None else None,
+        afallback=allm_classify if structured_model is not None else None,
+        default_label="其他",
+    )
+
+
+def build_topic_experts(model) -> dict[str, RunnableSequence]:
+    """科普 / 编程 / 其他 三个专家链"""
     science_prompt = ChatPromptTemplate(
         [
             ("system", "你是科普专家，通俗准确、简洁回答。"),
@@ -157,13 +209,21 @@ def test_runnable_branch():
         ]
     )
     general_expert = RunnableSequence(general_prompt, model, StrOutputParser())
+    return {"科普": science_expert, "编程": code_expert, "其他": general_expert}
+
+
+def test_runnable_branch():
+    model = get_chat_model("glm", max_tokens=3000)
+    structured_model = model.with_structured_output(ClassifyResult)
+    # 先在本地分类，只有不确定时才调用 LLM（structured_model）
+    topic_classifier = build_topic_classifier(structured_model)
+    experts = build_topic_experts(model)
+    science_expert, code_expert, general_expert = experts["科普"], experts["编程"], experts["其他"]
 
 
     classifier = RunnablePassthrough.assign(
         # classify_result 会 赋值给 input["classify_result"]
-        classify_result=lambda input: structured_model.invoke(
-            f"请判断以下问题的类型，并只返回JSON：{{\"type\": \"科普\"|\"编程\"|\"其他\"}}。问题：{input['question']}"
-        )
+        classify_result=lambda input: ClassifyResult(type=topic_classifier.classify(input["question"]).label)
     )
     debug_runnable = RunnableLambda(
         lambda input: (print("中间结果:", input), input)[1]
@@ -186,12 +246,63 @@ def test_runnable_branch():
     print(result)
     # 中间结果: {'question': '简单回答下，鲸鱼是哺乳动物吗？', 'classify_result': ClassifyResult(type='科普')}
     # 是的，**鲸鱼是哺乳动物**，而不是鱼类。
+    print(topic_classifier.stats)
+    # ClassifierStats(counts={'keyword': 1})  本地判断（命中了“动物”），没有调用 LLM 分类
     
 
 
+async def atest_lcel():
+    """
+    LCEL 链的异步调用：ainvoke / astream
+    """
+    c_prompt = ChatPromptTemplate(
+        [
+            ("system", "你是一个{role}。"),
+            ("human", "请将以下文本从英文翻译为中文：\n {user_input}"),
+        ]
+    )
+    model = get_chat_model("glm", max_tokens=3000)
+    chain = c_prompt | model | StrOutputParser()
+    ans = await chain.ainvoke({"role": "专业的翻译", "user_input": "I love programming."})
+    print(ans)
+
+    async for chunk in chain.astream({"role": "专业的翻译", "user_input": "LangChain makes LLM apps easier."}):
+        print(chunk, end="", flush=True)
+    print()
+
+
+def test_speculative_branch():
+    """
+    投机执行：LLM 分类的同时，按本地分类器的排序先启动最可能的 top_k 个专家链，
+    分类结果出来后直接输出命中分支已经生成的内容，其它分支取消
+    """
+    model = get_chat_model("glm", max_tokens=3000)
+    structured_model = model.with_structured_output(ClassifyResult)
+    topic_classifier = build_topic_classifier()  # 只用来排序，不回退到 LLM
+
+    branch = SpeculativeBranch(
+        RunnableLambda(lambda input: structured_model.invoke(
+            f"请判断以下问题的类型，并只返回JSON：{{\"type\": \"科普\"|\"编程\"|\"其他\"}}。问题：{input['question']}"
+        )),
+        build_topic_experts(model),
+        default="其他",
+        top_k=1,  # 投机执行的分支数：越大命中率越高，浪费的请求也越多
+        predict=lambda input: topic_classifier.rank(input["question"]),
+        label_of=lambda result: result.type,
+    )
+    for chunk in branch.stream({"question": "简单回答下，鲸鱼是哺乳动物吗？"}):
+        print(chunk, end="", flush=True)
+    print()
+    print(branch.stats)
+    # SpeculativeStats(runs=1, hits=1, misses=0, cancelled=0)
+
+
 if __name__ == "__main__":
     # test_prompt_template()
     # test_output_parser()
     # test_lcel()
     # test_runnable_sequence()
     test_runnable_branch()
+    # test_speculative_branch()
+    # import asyncio
+    # asyncio.run(atest_lcel())
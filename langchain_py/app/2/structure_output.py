@@ -1,24 +1,16 @@
 
 from langchain.agents import create_agent
-from app.config import settings
-from langchain_openai import ChatOpenAI
+from app.registry import get_chat_model
+from app.json_repair import RepairingOutputParser
+from app.structured_stream import with_streaming_structure
+from app.tracing import tracing_config
 from pydantic import BaseModel, Field, RootModel
-from langchain_core.globals import set_debug
 from langchain_core.output_parsers import PydanticOutputParser,CommaSeparatedListOutputParser
 
-# 开启全局详细模式
-set_debug(True)
+# 本模块的链挂上的跟踪 handler（采样写入 TRACE_PATH），代替 set_debug(True)；TRACE_VERBOSITY=debug 时恢复原来的同步打印
+TRACE_MODULE = "app.2.structure_output"
 
 
-model = ChatOpenAI(
-    model=settings.glm_model,
-    base_url=settings.siliconflow_base_url,
-    api_key=settings.siliconflow_api_key,
-    temperature=0.9,
-    max_tokens=5000,
-    timeout=60,
-)
-
 class Movie(BaseModel):
     """电影的相关信息"""
     title: str = Field(..., description="电影名称")
@@ -31,7 +23,8 @@ class DevProcessList(RootModel[list[str]]):
     """按顺序的软件开发流程字符串列表"""
 
 def test_structure_class():
-    model_with_structure = model.with_structured_output(Movie)
+    model = get_chat_model("glm", max_tokens=5000)
+    model_with_structure = model.with_structured_output(Movie).with_config(tracing_config(TRACE_MODULE))
     response = model_with_structure.invoke(
         [{"role": "user", "content": "介绍下电影《罗小黑战记2》，获取title、year、director、rating信息"}], 
     )
@@ -41,7 +34,8 @@ def test_structure_class():
 
 def test_structure_list():
     # 使用LLM provider API 强制结构化输出
-    model_with_structure = model.with_structured_output(DevProcessList)
+    model = get_chat_model("glm", max_tokens=5000)
+    model_with_structure = model.with_structured_output(DevProcessList).with_config(tracing_config(TRACE_MODULE))
     # 使用langchain自己的解析器 获取结构化输出（可靠性一般）
     # model_with_structure = model | PydanticOutputParser(pydantic_object=DevProcessList)
     response = model_with_structure.invoke(
@@ -58,6 +52,62 @@ def test_structure_list():
     # print(response) ['以下是标准软件开发流程（SDLC）的字符串列表：', '1. 需求分析', '2. 系统设计', '3. 开发实施', '4. 软件测试', '5. 部署上线', '6. 运维与迭代']
     
 
+def test_structure_stream():
+    """
+    流式结构化输出：边生成边解析，每多一个完整的字段 / 列表元素就产出一次，下游不用等整个 JSON
+    """
+    model = get_chat_model("glm", max_tokens=5000)
+    # 请求参数与 with_structured_output 相同，只是解析器换成流式的
+    movie_stream = with_streaming_structure(model, Movie).with_config(tracing_config(TRACE_MODULE))
+    for partial in movie_stream.stream(
+        [{"role": "user", "content": "介绍下电影《罗小黑战记2》，获取title、year、director、rating信息"}],
+    ):
+        print(partial)
+    # title='罗小黑战记2' year=None director=None rating=None       <- PartialMovie，未出现的字段为 None
+    # title='罗小黑战记2' year=2025 director=None rating=None
+    # ...
+    # title='罗小黑战记2' year=2025 director='MTJJ' rating=8.5     <- 最后一次是完整校验过的 Movie
+
+    list_stream = with_streaming_structure(model, DevProcessList).with_config(tracing_config(TRACE_MODULE))
+    for partial in list_stream.stream(
+        [{"role": "user", "content": "软件开发的流程是？请给我一个有顺序的字符串列表"}],
+    ):
+        print(partial.root)
+    # ['需求分析']
+    # ['需求分析', '系统设计']
+    # ...
+
+
+def test_structure_repair():
+    """
+    解析器方式的结构化输出 + 本地修复：输出带说明文字、编号列表、单引号、被截断时先在本地修复，
+    修不好才把原输出和错误交给模型重新生成（原来每次解析失败都要多一次完整的模型调用）
+    """
+    model = get_chat_model("glm", max_tokens=5000)
+    parser = RepairingOutputParser(pydantic_object=DevProcessList, retry_model=model)
+    chain = (model | parser).with_config(tracing_config(TRACE_MODULE))
+    response = chain.invoke(
+        [{"role": "user", "content": f"软件开发的流程是？请给我一个有顺序的字符串列表\n{parser.get_format_instructions()}"}],
+    )
+    print(response.model_dump()) # ['需求分析', '系统设计', '开发实施', '软件测试', '部署上线', '运维与迭代']
+    # "以下是标准软件开发流程（SDLC）的字符串列表：\n1. 需求分析\n2. 系统设计..." 也能在本地解析成列表
+    print(parser.stats) # RepairStats(strict=0, repaired=1, retries=0, failed=0, fixes=Counter({'list_lines': 1}))
+
+
+async def atest_structure_class():
+    """结构化输出的异步调用"""
+    model = get_chat_model("glm", max_tokens=5000)
+    model_with_structure = model.with_structured_output(Movie).with_config(tracing_config(TRACE_MODULE))
+    response = await model_with_structure.ainvoke(
+        [{"role": "user", "content": "介绍下电影《罗小黑战记2》，获取title、year、director、rating信息"}],
+    )
+    print(response)
+
+
 if __name__ == "__main__":
     # test_structure_class()
     test_structure_list()
+    # test_structure_stream()
+    # test_structure_repair()
+    # import asyncio
+    # asyncio.run(atest_structure_class())
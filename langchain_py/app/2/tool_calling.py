@@ -1,27 +1,20 @@
 
-import json
 from dataclasses import dataclass
 from typing import Literal
-from app.config import settings
+from app.registry import get_chat_model
+from app.tool_cache import cached_tool, tool_cache
+from app.tool_executor import ToolExecutor
+from app.tracing import tracing_config
 from langchain.agents import create_agent
-from langchain_core.globals import set_debug
 from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
-from langchain_openai import ChatOpenAI
 from langchain.tools import tool, ToolRuntime
 
-set_debug(True)
+# 本模块的模型 / agent 调用挂上的跟踪 handler，详细程度见 app/tracing.py（TRACE_VERBOSITY / TRACE_MODULE_VERBOSITY）
+TRACE_MODULE = "app.2.tool_calling"
 
 
-model = ChatOpenAI(
-    model=settings.glm_model,
-    base_url=settings.siliconflow_base_url,
-    api_key=settings.siliconflow_api_key,
-    temperature=0.9,
-    max_tokens=5000,
-    timeout=60,
-)
-
-@tool
+# 评论列表变化很慢，缓存 1 小时；多轮对话、多个会话中重复调用时不再执行函数
+@cached_tool(ttl=3600)
 def get_reviews(positive: bool) -> list[str]:
     """
     获取罗小黑电影评论列表
@@ -100,7 +93,8 @@ def test_tool_calling():
 
     tools = [get_reviews]
     tool_by_name = {t.name: t for t in tools}
-    model_with_tools = model.bind_tools(tools)
+    model = get_chat_model("glm", max_tokens=5000)
+    model_with_tools = model.bind_tools(tools).with_config(tracing_config(TRACE_MODULE))
     response = model_with_tools.invoke("请分析罗小黑电影的负面评论原因？") # 返回 AIMessage
     for tool_call in response.tool_calls:
         # 查看函数调用
@@ -118,25 +112,17 @@ def test_tool_calling_2():
     测试工具调用2（测试多轮对话）
     """
     tools = [get_reviews]
-    tool_by_name = {t.name: t for t in tools}
-    model_with_tools = model.bind_tools(tools)
+    executor = ToolExecutor(tools, timeout=30)
+    model = get_chat_model("glm", max_tokens=5000)
+    model_with_tools = model.bind_tools(tools).with_config(tracing_config(TRACE_MODULE))
     prompt = "请分析罗小黑电影的正面评论原因？"
     response = model_with_tools.invoke(prompt)
 
-    tool_messages: list[ToolMessage] = []
     for tool_call in response.tool_calls:
         print(f"Tool: {tool_call['name']}")
         print(f"Args: {tool_call['args']}")
-        tool = tool_by_name.get(tool_call["name"])
-        if tool is None:
-            raise ValueError(f"Unknown tool: {tool_call['name']}")
-        reviews = tool.invoke(tool_call["args"])
-        tool_messages.append(
-            ToolMessage(
-                content=json.dumps(reviews, ensure_ascii=False),
-                tool_call_id=tool_call["id"],
-            )
-        )
+    # 多个工具调用并发执行，返回的 ToolMessage 与 tool_calls 顺序一致
+    tool_messages: list[ToolMessage] = executor.execute(response)
 
     final_response = model_with_tools.invoke([HumanMessage(content=prompt), response, *tool_messages])
     print(final_response.content)
@@ -153,25 +139,18 @@ def test_tool_calling_3():
     测试工具调用3 (仅仅把问题改了，测试并行调用工具)
     """
     tools = [get_reviews]
-    tool_by_name = {t.name: t for t in tools}
-    model_with_tools = model.bind_tools(tools)
+    # 模型并行调用工具（正面评论、负面评论）时，总耗时是最慢的那个工具而不是所有工具之和
+    executor = ToolExecutor(tools, timeout=30)
+    model = get_chat_model("glm", max_tokens=5000)
+    model_with_tools = model.bind_tools(tools).with_config(tracing_config(TRACE_MODULE))
     prompt = "请分析罗小黑电影的正面评论原因和负面评论原因？"
     response = model_with_tools.invoke(prompt)
 
-    tool_messages: list[ToolMessage] = []
     for tool_call in response.tool_calls:
         print(f"Tool: {tool_call['name']}")
         print(f"Args: {tool_call['args']}")
-        tool = tool_by_name.get(tool_call["name"])
-        if tool is None:
-            raise ValueError(f"Unknown tool: {tool_call['name']}")
-        reviews = tool.invoke(tool_call["args"])
-        tool_messages.append(
-            ToolMessage(
-                content=json.dumps(reviews, ensure_ascii=False),
-                tool_call_id=tool_call["id"],
-            )
-        )
+    # 多个工具调用并发执行，返回的 ToolMessage 与 tool_calls 顺序一致
+    tool_messages: list[ToolMessage] = executor.execute(response)
 
     final_response = model_with_tools.invoke([HumanMessage(content=prompt), response, *tool_messages])
     print(final_response.content)
@@ -182,16 +161,70 @@ def test_tool_calling_3():
     '''
 
 
+def test_cached_tool():
+    """
+    带缓存的工具：相同参数直接返回缓存的结果
+    """
+    get_reviews.invoke({"positive": True})
+    get_reviews.invoke({"positive": True})   # 命中缓存
+    get_reviews.invoke({"positive": False})
+    cache = tool_cache(get_reviews)
+    print(cache.stats, f"hit_rate={cache.stats.hit_rate:.0%}")
+    # CacheStats(hits=1, misses=2, expired=0, evictions=0, writes=2) hit_rate=33%
+
+    # 数据更新后手动失效（可以只传部分参数）
+    cache.invalidate(positive=True)
+    get_reviews.invoke({"positive": True})   # 重新执行
+    print(cache.stats)
+    # CacheStats(hits=1, misses=3, expired=0, evictions=0, writes=3)
+
+
 def test_tool_runtime():
     agent = create_agent(
-        model,
+        get_chat_model("glm", max_tokens=5000),
         tools=[get_reviews_with_runtime],
         context_schema=Context,
-    )
+    ).with_config(tracing_config(TRACE_MODULE))
     result = agent.invoke(
         {"messages": [{"role": "user", "content": "请分析罗小黑电影的正面评论原因？"}]},
         context=Context(user_id="user123")
     )
 
+async def atest_tool_calling_2():
+    """
+    测试工具调用2 的异步版本：模型用 ainvoke，工具用 ainvoke
+    """
+    tools = [get_reviews]
+    executor = ToolExecutor(tools, timeout=30)
+    model = get_chat_model("glm", max_tokens=5000)
+    model_with_tools = model.bind_tools(tools).with_config(tracing_config(TRACE_MODULE))
+    prompt = "请分析罗小黑电影的正面评论原因？"
+    response = await model_with_tools.ainvoke(prompt)
+
+    tool_messages: list[ToolMessage] = await executor.aexecute(response)
+
+    final_response = await model_with_tools.ainvoke([HumanMessage(content=prompt), response, *tool_messages])
+    print(final_response.content)
+
+
+async def atest_tool_runtime():
+    """
+    agent 的异步调用：ainvoke / astream
+    """
+    agent = create_agent(
+        get_chat_model("glm", max_tokens=5000),
+        tools=[get_reviews_with_runtime],
+        context_schema=Context,
+    ).with_config(tracing_config(TRACE_MODULE))
+    async for chunk in agent.astream(
+        {"messages": [{"role": "user", "content": "请分析罗小黑电影的正面评论原因？"}]},
+        context=Context(user_id="user123"),
+        stream_mode="updates",
+    ):
+        print(chunk)
+
+
 if __name__ == "__main__":
     test_tool_runtime()
+    # import asyncio
+    # asyncio.run(atest_tool_calling_2())
@@ -1,14 +1,21 @@
 from langchain.agents.structured_output import ToolStrategy
+from app.checkpoint_memory import default_checkpointer
+from app.complexity import ComplexityRouter, current_thread_id, default_pre_classifiers
 from app.config import settings
+from app.latency_routing import LatencyRoutingMiddleware
+from app.registry import get_chat_model
+from app.resilience import ResilientModelMiddleware
+from app.stream_metrics import StreamingMetricsHandler
+from app.structured_response import SingleCallResponseMiddleware
+from app.tool_cache import cached_tool, tool_cache
+from app.tracing import tracing_config
 from dataclasses import dataclass
-from typing import Literal, Callable
+from typing import Any, Awaitable, Literal, Callable
 from langchain.agents import create_agent
-from langchain.tools import tool, ToolRuntime
+from langchain.tools import ToolRuntime
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import InMemorySaver
 from langchain.agents.middleware import wrap_model_call, wrap_tool_call,  ModelRequest, ModelResponse
 from langchain.messages import HumanMessage, ToolMessage
-from langchain_core.globals import set_debug
 from pydantic import BaseModel, Field
 
 '''
@@ -20,7 +27,16 @@ from pydantic import BaseModel, Field
 '''
 
 
-set_debug(True)
+# 本模块创建的 agent 按 TRACE_VERBOSITY / TRACE_MODULE_VERBOSITY 中 app.3.agent 的设置跟踪
+TRACE_MODULE = "app.3.agent"
+
+
+def traced_agent(model, **kwargs):
+    """
+    create_agent，并在 agent 的 config 上挂上本模块的跟踪 handler（抽样记录每轮对话的事件到 JSONL，不再同步打印每一步）。
+    调用时传入的 callbacks 会替换 agent 上的 callbacks，需要额外的 handler 时用 .with_config(callbacks=[...]) 加在 agent 上
+    """
+    return create_agent(model, **kwargs).with_config(tracing_config(TRACE_MODULE))
 
 
 @dataclass
@@ -28,7 +44,8 @@ class Context:
     """Custom runtime context schema."""
     user_id: str
 
-@tool
+# 纯函数，相同参数的结果可以一直复用
+@cached_tool
 def compare_two_numbers(a: float, b: float) -> int:
     """
     比较两个数字a，b的大小
@@ -45,7 +62,8 @@ def compare_two_numbers(a: float, b: float) -> int:
     else:
         return 0
 
-@tool
+# 不同用户的位置不同，按 context.user_id 隔离缓存
+@cached_tool(scope="user_id")
 def get_user_location(runtime: ToolRuntime[Context]) -> str:
     """根据用户ID获取用户位置"""
     user_id = runtime.context.user_id
@@ -53,32 +71,19 @@ def get_user_location(runtime: ToolRuntime[Context]) -> str:
 
 
 
-glm_model = ChatOpenAI(
-    model=settings.glm_model,
-    base_url=settings.siliconflow_base_url,
-    api_key=settings.siliconflow_api_key,
-    temperature=0.9,
-    max_tokens=10000,
-    timeout=60,
-)
+# 模型在第一次调用时才创建（见 app.registry）；
+# 放在 resilient_model_calls 后面的模型传 max_retries=0，重试 / 退避只由中间件负责，不和 SDK 内部的重试叠加
+def glm_model(**overrides: Any) -> ChatOpenAI:
+    return get_chat_model("glm", max_tokens=10000, **overrides)
 
-ds_model = ChatOpenAI(
-    model=settings.ds_model,
-    base_url=settings.siliconflow_base_url,
-    api_key=settings.siliconflow_api_key,
-    temperature=0.9,
-    max_tokens=10000,
-    timeout=60,
-)
 
-qwen3_32b_model = ChatOpenAI(
-    model=settings.qwen3_32b_model,
-    base_url=settings.siliconflow_base_url,
-    api_key=settings.siliconflow_api_key,
-    temperature=0.9,
-    max_tokens=5000,
-    timeout=60,
-)
+def ds_model(**overrides: Any) -> ChatOpenAI:
+    return get_chat_model("ds", max_tokens=10000, **overrides)
+
+
+def qwen3_32b_model() -> ChatOpenAI:
+    return get_chat_model("qwen3_32b", max_tokens=5000)
+
 
 def _extract_latest_user_text(messages: list) -> str:
     for message in reversed(messages):
@@ -93,17 +98,17 @@ def _extract_latest_user_text(messages: list) -> str:
     return str(last)
 
 
-def _judge_complexity(user_text: str) -> Literal["simple", "complex"]:
-    router = qwen3_32b_model.bind(max_tokens=64) # 控制输出长度，避免冗余信息输出
-    res = router.invoke(
-        [
-            {
-                "role": "system",
-                "content": "你是问题复杂度分类器。根据用户问题判断复杂度：\n- simple：单一事实/常识问答、简单翻译/润色、很短的直接回答、无需多步推理或设计。\n- complex：需要多步推理、方案设计/架构、长文写作、复杂代码/调试、严谨数学推导、对比权衡。\n只输出：simple 或 complex。",
-            },
-            {"role": "user", "content": user_text},
-        ]
-    )
+def _router_messages(user_text: str) -> list[dict]:
+    return [
+        {
+            "role": "system",
+            "content": "你是问题复杂度分类器。根据用户问题判断复杂度：\n- simple：单一事实/常识问答、简单翻译/润色、很短的直接回答、无需多步推理或设计。\n- complex：需要多步推理、方案设计/架构、长文写作、复杂代码/调试、严谨数学推导、对比权衡。\n只输出：simple 或 complex。",
+        },
+        {"role": "user", "content": user_text},
+    ]
+
+
+def _parse_complexity(res) -> Literal["simple", "complex"]:
     text = str(getattr(res, "content", res)).strip().lower()
     if text == "simple" or "simple" in text or "简单" in text:
         return "simple"
@@ -112,34 +117,117 @@ def _judge_complexity(user_text: str) -> Literal["simple", "complex"]:
     return "complex"
 
 
+def _judge_complexity(user_text: str) -> Literal["simple", "complex"]:
+    # 控制输出长度，避免冗余信息输出；分类结果应该是确定的，temperature=0（也让并发的相同问题可以合并）
+    router = qwen3_32b_model().bind(max_tokens=64, temperature=0)
+    return _parse_complexity(router.invoke(_router_messages(user_text)))
+
+
+async def _ajudge_complexity(user_text: str) -> Literal["simple", "complex"]:
+    router = qwen3_32b_model().bind(max_tokens=64, temperature=0)
+    return _parse_complexity(await router.ainvoke(_router_messages(user_text)))
+
+
+# 同一轮对话（thread_id + 最新的用户消息）只分类一次，工具循环的后续步骤复用；
+# 寒暄 / 明显的复杂任务、以及本地模型（COMPLEXITY_MODEL_PATH）有把握的问题不调用 LLM
+complexity_router = ComplexityRouter(
+    _judge_complexity,
+    _ajudge_complexity,
+    pre_classifiers=default_pre_classifiers(),
+    decision_log=settings.complexity_decision_log or None,
+)
+
+
+def _retry_overrides(request: ModelRequest) -> dict[str, Any]:
+    """选出的模型沿用 agent 模型的 max_retries=0（resilient_model_calls 的 agent），否则用默认值"""
+    return {"max_retries": 0} if getattr(request.model, "max_retries", None) == 0 else {}
+
+
 @wrap_model_call
 def dynamic_model_selection(request: ModelRequest, handler: Callable[[ModelRequest], ModelResponse]) -> ModelResponse:
     """Choose model based on conversation complexity."""
     user_text = _extract_latest_user_text(request.messages)
-    complexity = _judge_complexity(user_text)
-    selected_model = ds_model if complexity == "simple" else glm_model
+    complexity = complexity_router.decide(user_text, current_thread_id())
+    overrides = _retry_overrides(request)
+    selected_model = ds_model(**overrides) if complexity == "simple" else glm_model(**overrides)
     return handler(request.override(model=selected_model))
 
 
+# 异步调用 agent（ainvoke / astream）时，中间件也需要是异步的
+@wrap_model_call
+async def adynamic_model_selection(
+    request: ModelRequest, handler: Callable[[ModelRequest], Awaitable[ModelResponse]]
+) -> ModelResponse:
+    """dynamic_model_selection 的异步版本"""
+    user_text = _extract_latest_user_text(request.messages)
+    complexity = await complexity_router.adecide(user_text, current_thread_id())
+    overrides = _retry_overrides(request)
+    selected_model = ds_model(**overrides) if complexity == "simple" else glm_model(**overrides)
+    return await handler(request.override(model=selected_model))
+
+
+# 可以回答的模型（按偏好排序）：简单问题 ds / glm 都可以，复杂问题只用 glm（同一个模型上对冲）
+def _eligible_models(request: ModelRequest) -> list[ChatOpenAI]:
+    complexity = complexity_router.decide(_extract_latest_user_text(request.messages), current_thread_id())
+    return [ds_model(), glm_model()] if complexity == "simple" else [glm_model()]
+
+
+async def _aeligible_models(request: ModelRequest) -> list[ChatOpenAI]:
+    complexity = await complexity_router.adecide(_extract_latest_user_text(request.messages), current_thread_id())
+    return [ds_model(), glm_model()] if complexity == "simple" else [glm_model()]
+
+
+# 代替 dynamic_model_selection：在可选的模型中选延迟 / 错误率最低的，超过 p95 还没返回时向另一个模型发出对冲请求
+latency_routing = LatencyRoutingMiddleware(_eligible_models, _aeligible_models)
+
+
+def _tool_error_message(request, e: Exception) -> ToolMessage:
+    # 返回自定义的错误消息给LLM
+    return ToolMessage(
+        content=f"Tool error: Please check your input and try again. ({str(e)})",
+        tool_call_id=request.tool_call["id"]
+    )
+
+
 @wrap_tool_call
 def handle_tool_errors(request: ModelRequest, handler: Callable[[ModelRequest], ModelResponse]) -> ModelResponse:
     """处理工具调用错误，返回自定义错误消息"""
     try:
         return handler(request)
     except Exception as e:
-        # 返回自定义的错误消息给LLM
-        return ToolMessage(
-            content=f"Tool error: Please check your input and try again. ({str(e)})",
-            tool_call_id=request.tool_call["id"]
-        )
+        return _tool_error_message(request, e)
+
+
+@wrap_tool_call
+async def ahandle_tool_errors(request: ModelRequest, handler: Callable[[ModelRequest], Awaitable[ModelResponse]]) -> ModelResponse:
+    """handle_tool_errors 的异步版本"""
+    try:
+        return await handler(request)
+    except Exception as e:
+        return _tool_error_message(request, e)
+
+
+# 模型调用的超时 / 重试 / 熔断，放在 dynamic_model_selection 之后：对选出的模型重试，熔断或重试用完时改用另一个模型；
+# 同一轮对话（含工具循环）的所有模型调用共用 AGENT_TURN_TIMEOUT 的截止时间。
+# agent 的模型和 fallbacks 都用 max_retries=0：否则每次尝试 SDK 还会再发最多 3 次请求，内部退避也会占用 call_timeout
+resilient_model_calls = ResilientModelMiddleware(
+    fallbacks=lambda request: [glm_model(max_retries=0), ds_model(max_retries=0)],
+    call_timeout=settings.llm_call_timeout,
+    turn_timeout=settings.agent_turn_timeout,
+    max_retries=settings.llm_max_retries,
+    failure_threshold=settings.llm_circuit_failure_threshold,
+    reset_timeout=settings.llm_circuit_reset_timeout,
+)
+
 
 def test_dynamic_model_selection():
     """
     """
-    checkpointer = InMemorySaver()
+    # 有上限的内存 checkpointer（CHECKPOINT_* 配置），thread 多了按 LRU 淘汰
+    checkpointer = default_checkpointer()
 
-    agent = create_agent(
-        glm_model,
+    agent = traced_agent(
+        glm_model(),
         context_schema=Context,
         checkpointer=checkpointer,
         middleware=[dynamic_model_selection],
@@ -196,16 +284,16 @@ def test_dynamic_model_selection():
 def test_tool_compare_two_numbers():
     """
     测试 compare_two_numbers 工具. 
-    加入 handle_tool_errors 中间件
+    加入 handle_tool_errors 中间件，以及模型调用的超时 / 重试 / 熔断（resilient_model_calls）
     """
-    checkpointer = InMemorySaver()
+    checkpointer = default_checkpointer()
 
-    agent = create_agent(
-        ds_model,
+    agent = traced_agent(
+        ds_model(max_retries=0),
         context_schema=Context,
         checkpointer=checkpointer,
         tools=[compare_two_numbers],
-        middleware=[dynamic_model_selection, handle_tool_errors],
+        middleware=[dynamic_model_selection, resilient_model_calls, handle_tool_errors],
     )
     r = agent.invoke(
         {"messages": [{"role": "user", "content": "1.9 和1.11 哪个数字大？"}]},
@@ -221,6 +309,20 @@ def test_tool_compare_two_numbers():
     # 根据比较结果，**1.9 比 1.11 大**。
     # 调用模型：
     # deepseek-ai/DeepSeek-V3.2-Exp
+
+    # 另一个会话问同样的问题：模型仍会发起工具调用，但 compare_two_numbers 直接命中缓存
+    agent.invoke(
+        {"messages": [{"role": "user", "content": "1.9 和1.11 哪个数字大？"}]},
+        config={"configurable": {"thread_id": "2"}},
+        context=Context(user_id="1"),
+    )
+    print(tool_cache(compare_two_numbers).stats)
+    # CacheStats(hits=1, misses=1, expired=0, evictions=0, writes=1)
+    # 每个会话中工具调用前后两次模型调用只分类一次
+    print(complexity_router.thread_stats("1"))
+    # RouterStats(decisions=2, cached=1, pre_classified=0, llm=1)
+    print(resilient_model_calls.stats)
+    # ResilienceStats(calls=4, retries=0, timeouts=0, short_circuits=0, fallbacks=0, deadline_exceeded=0, failures=0)
     """
     最后一次prompt:
         Human: 1.9 和1.11 哪个数字大？
@@ -230,6 +332,32 @@ def test_tool_compare_two_numbers():
 
 
 
+def test_stream_metrics():
+    """
+    agent 流式输出（stream_mode="messages"）时统计各模型的首 token 延迟和 chunk 间隔
+    dynamic_model_selection 会在 glm / ds 之间切换，指标按实际调用的模型分别记录
+    """
+    metrics = StreamingMetricsHandler()
+    agent = traced_agent(
+        glm_model(),
+        context_schema=Context,
+        checkpointer=default_checkpointer(),
+        tools=[compare_two_numbers],
+        middleware=[dynamic_model_selection, handle_tool_errors],
+    ).with_config(callbacks=[metrics])
+    for thread_id, question in enumerate(["1.9 和1.11 哪个数字大？", "100字内，介绍下langchain。"]):
+        for token, meta in agent.stream(
+            {"messages": [{"role": "user", "content": question}]},
+            config={"configurable": {"thread_id": str(thread_id)}},
+            context=Context(user_id="1"),
+            stream_mode="messages",
+        ):
+            if meta["langgraph_node"] == "model":
+                print(token.content, end="", flush=True)
+        print()
+    print(metrics.to_prometheus())
+
+
 class CompareResult(BaseModel):
     num1: float  = Field(..., description="第一个数字")
     num2: float  = Field(..., description="第二个数字")
@@ -240,10 +368,10 @@ def test_response_fomat():
     """
     测试响应格式是否符合要求
     """
-    checkpointer = InMemorySaver()
+    checkpointer = default_checkpointer()
 
-    agent = create_agent(
-        glm_model,
+    agent = traced_agent(
+        glm_model(),
         context_schema=Context,
         checkpointer=checkpointer,
         tools=[compare_two_numbers],
@@ -269,7 +397,87 @@ def test_response_fomat():
     }
     """
 
+def test_single_call_response_format():
+    """
+    结构化响应在结束循环的那次模型调用中直接生成：不传 response_format，
+    由 SingleCallResponseMiddleware 带上 provider 的 json_schema / json_object，模型的最终回答本身就是 CompareResult 的 JSON
+    """
+    middleware = SingleCallResponseMiddleware(CompareResult, mode="json_mode")
+    agent = traced_agent(
+        glm_model(),
+        context_schema=Context,
+        checkpointer=default_checkpointer(),
+        tools=[compare_two_numbers],
+        middleware=[handle_tool_errors, middleware],
+    )
+    r = agent.invoke(
+        {"messages": [{"role": "user", "content": "1.9 和1.11 哪个数字大？"}]},
+        config={"configurable": {"thread_id": "1"}},
+        context=Context(user_id="1"),
+    )
+    print(r["structured_response"])
+    # 输出 num1=1.9 num2=1.11 result=1
+    print(r["messages"][-1].content)
+    # {"num1": 1.9, "num2": 1.11, "result": 1}   <- 最后的 AIMessage 就是结构化结果，没有额外的工具调用和 ToolMessage
+    print(middleware.stats)
+    # RepairStats(strict=1, repaired=0, retries=0, failed=0, fixes=Counter())
+
+
+def test_latency_aware_routing():
+    """
+    按延迟选择模型 + 对冲请求：多问几次后 latency_routing 会优先使用延迟更低、错误更少的模型，
+    某次请求超过该模型的 p95 延迟时向另一个模型再发一次，先返回的结果生效
+    """
+    agent = traced_agent(
+        glm_model(),
+        context_schema=Context,
+        checkpointer=default_checkpointer(),
+        tools=[compare_two_numbers],
+        middleware=[latency_routing, handle_tool_errors],
+    )
+    for thread_id, question in enumerate(["1.9 和1.11 哪个数字大？", "你好", "100字内，介绍下langchain。"]):
+        r = agent.invoke(
+            {"messages": [{"role": "user", "content": question}]},
+            config={"configurable": {"thread_id": str(thread_id)}},
+            context=Context(user_id="1"),
+        )
+        print(r["messages"][-1].response_metadata["model_name"], r["messages"][-1].content[:50])
+    print(latency_routing.stats)
+    # RoutingStats(calls=4, hedged=0, hedge_wins=0, failovers=0, cancelled=0)
+    print(latency_routing.health.snapshot())
+    # {'deepseek-ai/DeepSeek-V3.2-Exp': {'calls': 4, 'errors': 0, 'latency_ewma': 2.1, 'error_rate': 0.0, 'p95': 3.4}}
+
+
+async def atest_tool_compare_two_numbers():
+    """
+    agent 的异步调用（ainvoke），使用异步版本的中间件
+    """
+    checkpointer = default_checkpointer()
+
+    agent = traced_agent(
+        ds_model(max_retries=0),
+        context_schema=Context,
+        checkpointer=checkpointer,
+        tools=[compare_two_numbers],
+        middleware=[adynamic_model_selection, resilient_model_calls, ahandle_tool_errors],
+    )
+    r = await agent.ainvoke(
+        {"messages": [{"role": "user", "content": "1.9 和1.11 哪个数字大？"}]},
+        config={"configurable": {"thread_id": "1"}},
+        context=Context(user_id="1"),
+    )
+    ai_message = r["messages"][-1]
+    print("响应内容：", end="\n")
+    print(ai_message.content)
+    print(f"调用模型：\n {ai_message.response_metadata['model_name']}")
+
+
 if __name__ == "__main__":
     # test_dynamic_model_selection()
     # test_tool_compare_two_numbers()
+    # test_stream_metrics()
     test_response_fomat()
+    # test_single_call_response_format()
+    # test_latency_aware_routing()
+    # import asyncio
+    # asyncio.run(atest_tool_compare_two_numbers())
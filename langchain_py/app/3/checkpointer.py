@@ -1,11 +1,12 @@
 from langchain.agents.structured_output import ToolStrategy
-from app.config import settings
+from app.checkpoint_delta import DeltaCheckpointSaver
+from app.checkpoint_memory import default_checkpointer
+from app.registry import get_chat_model
 from dataclasses import dataclass
 from typing import Literal, Callable
 from langchain.agents import create_agent
 from langchain.tools import tool, ToolRuntime
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import InMemorySaver
 from langchain.agents.middleware import wrap_model_call, wrap_tool_call,  ModelRequest, ModelResponse
 from langchain.messages import HumanMessage, ToolMessage
 from langchain_core.globals import set_debug
@@ -23,14 +24,9 @@ class Context:
     user_id: str
 
 
-qwen3_32b_model = ChatOpenAI(
-    model=settings.qwen3_32b_model,
-    base_url=settings.siliconflow_base_url,
-    api_key=settings.siliconflow_api_key,
-    temperature=0.5,  
-    max_tokens=5000,
-    timeout=60,
-)
+# 模型在第一次调用时才创建（见 app.registry）
+def qwen3_32b_model() -> ChatOpenAI:
+    return get_chat_model("qwen3_32b", temperature=0.5, max_tokens=5000)
 
 
 def test_no_checkpointer():
@@ -43,7 +39,7 @@ def test_no_checkpointer():
     print("="*50)
     
     # 1. 创建不带 checkpointer 的 agent
-    agent = create_agent(qwen3_32b_model, checkpointer=None)
+    agent = create_agent(qwen3_32b_model(), checkpointer=None)
     
     # 2. 第一次交互
     print("\n【步骤 1】\n [用户]: 嗨！我叫 Bob。")
@@ -67,7 +63,7 @@ def test_no_checkpointer():
 
 def test_with_checkpointer():
     """
-    测试 2: create_agent 使用 checkpointer=InMemorySaver()。
+    测试 2: create_agent 使用内存 checkpointer（default_checkpointer()，有上限的 InMemorySaver）。
     预期：在同一个 thread_id 内有记忆。
     """
     print("\n" + "="*50)
@@ -75,8 +71,9 @@ def test_with_checkpointer():
     print("="*50)
     
     # 1. 创建带 checkpointer 的 agent
-    memory = InMemorySaver()
-    agent = create_agent(qwen3_32b_model, checkpointer=memory)
+    # 和 InMemorySaver() 用法相同，但 thread 数、每个 thread 的 checkpoint 数和占用的内存有上限
+    memory = default_checkpointer()
+    agent = create_agent(qwen3_32b_model(), checkpointer=memory)
     thread_config = {"configurable": {"thread_id": "thread-1"}}
     
     # 2. 第一次交互
@@ -105,8 +102,8 @@ def test_checkpointer_thread_isolation():
     print("测试 3: create_agent 线程隔离")
     print("="*50)
     
-    memory = InMemorySaver()
-    agent = create_agent(qwen3_32b_model, checkpointer=memory)
+    memory = default_checkpointer()
+    agent = create_agent(qwen3_32b_model(), checkpointer=memory)
     
     # 1. 线程 A 交互
     print("\n[线程 A] 用户: 嗨！我叫 Charlie。")
@@ -150,8 +147,9 @@ def test_checkpoints():
     print("测试 4: 检查 checkpointer 保存的 checkpoint")
     print("="*50)
 
-    memory = InMemorySaver()
-    agent = create_agent(qwen3_32b_model, checkpointer=memory)
+    # 每一步只保存新增的消息，list() / get_tuple() 返回的仍是还原后的完整 checkpoint
+    memory = DeltaCheckpointSaver(default_checkpointer())
+    agent = create_agent(qwen3_32b_model(), checkpointer=memory)
     thread_config = {"configurable": {"thread_id": "thread-1"}}
     
     print("\n[用户]: 嗨！我叫 疯狂踩坑人。")
@@ -165,6 +163,10 @@ def test_checkpoints():
     print(len(checkpoints), end="\n")
     for checkpoint_tuple in checkpoints:
         print(checkpoint_tuple.checkpoint, end='\n\n')
+    # 保存时按 CHECKPOINT_COMPRESSION 压缩（见 app/checkpoint_serde.py），这里打印压缩前后的字节数
+    serde = memory.inner.serde
+    if hasattr(serde, "stats"):
+        print(f"压缩：{serde.stats.raw_bytes} -> {serde.stats.stored_bytes} 字节（{serde.stats.ratio:.0%}）")
 
 
 
@@ -1,11 +1,14 @@
-import sqlite3
-from app.config import settings
+import asyncio
+from app.checkpoint_delta import DeltaCheckpointSaver
+from app.checkpoint_memory import default_checkpointer
+from app.checkpoint_serde import default_serde
+from app.checkpoint_sqlite import PooledSqliteSaver
+from app.registry import get_chat_model
 from langchain.agents import create_agent
 from langchain.agents.middleware import SummarizationMiddleware
 from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import InMemorySaver
-from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 
 
 
@@ -14,25 +17,8 @@ SYSTEM_PROMPT = "你是一个人工智能助手"
 
 
 def _build_models() -> tuple[ChatOpenAI, ChatOpenAI]:
-    base_kwargs = dict(
-        base_url=settings.siliconflow_base_url,
-        api_key=settings.siliconflow_api_key,
-        timeout=60,
-    )
-
-    agent_model = ChatOpenAI(
-        model=settings.qwen3_32b_model,
-        temperature=0.7,
-        max_tokens=2000,
-        **base_kwargs,
-    )
-
-    summarizer = ChatOpenAI(
-        model=settings.qwen3_32b_model,
-        temperature=0.2,
-        max_tokens=512,
-        **base_kwargs,
-    )
+    agent_model = get_chat_model("qwen3_32b", temperature=0.7, max_tokens=2000)
+    summarizer = get_chat_model("qwen3_32b", temperature=0.2, max_tokens=512)
 
     return agent_model, summarizer
 
@@ -42,7 +28,7 @@ def test_summarization_middleware() -> None:
     测试 SummarizationMiddleware 中间件。
     """
     agent_model, summarizer = _build_models()
-    checkpointer = InMemorySaver()
+    checkpointer = default_checkpointer()
     agent = create_agent(
         agent_model,
         system_prompt=SYSTEM_PROMPT,
@@ -84,11 +70,14 @@ def test_summarization_middleware() -> None:
 
 def test_sqlite_saver() -> None:
     """
-    测试 SQLiteSaver 检查点存储。
+    测试 SQLite 检查点存储。
+    PooledSqliteSaver 与 SqliteSaver 的表结构相同，WAL + 读连接池 + 单独的写线程按批提交，适合多个会话并发。
+    DeltaCheckpointSaver 每一步只保存新增的消息（每 20 步一次完整快照），对话越长省下的空间越多。
+    default_serde() 再把每个值压缩保存；之前未压缩保存的 checkpoint 照常读取。
     """
     agent_model, summarizer = _build_models()
-    conn = sqlite3.connect("checkpoints.sqlite", check_same_thread=False)
-    memory = SqliteSaver(conn)
+    store = PooledSqliteSaver("checkpoints.sqlite", serde=default_serde())
+    memory = DeltaCheckpointSaver(store)
 
     agent = create_agent(
         agent_model,
@@ -103,9 +92,38 @@ def test_sqlite_saver() -> None:
     messages = r["messages"]
     print(f"[user] {messages[-2].content}")
     print(f"[assistant] {messages[-1].content}")
+    store.close()
     # 我最近老是健忘！(尴尬地挠头) 不过既然是"疯狂踩坑人"，那你...
 
 
+async def atest_async_sqlite_saver() -> None:
+    """
+    测试 AsyncSqliteSaver：agent 的异步调用需要使用异步的 checkpointer（依赖 aiosqlite）。
+    多个会话可以在同一个事件循环里并发执行。
+    """
+    agent_model, _ = _build_models()
+    async with AsyncSqliteSaver.from_conn_string("checkpoints.sqlite") as memory:
+        agent = create_agent(
+            agent_model,
+            system_prompt=SYSTEM_PROMPT,
+            checkpointer=memory,
+        )
+
+        async def chat(thread_id: str, text: str) -> str:
+            config: RunnableConfig = {"configurable": {"thread_id": thread_id}}
+            r = await agent.ainvoke({"messages": [{"role": "user", "content": text}]}, config=config)
+            return r["messages"][-1].content
+
+        # 两个会话并发执行
+        answers = await asyncio.gather(
+            chat("async-thread-1", "你好，我叫“疯狂踩坑人”"),
+            chat("async-thread-2", "你好，我叫小明"),
+        )
+        print(answers)
+        print(await chat("async-thread-1", "请问我叫什么名字？"))
+
+
 if __name__ == "__main__":
     # test_summarization_middleware()
     test_sqlite_saver()
+    # asyncio.run(atest_async_sqlite_saver())
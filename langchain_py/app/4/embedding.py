@@ -1,6 +1,5 @@
 import numpy as np
-from app.config import settings
-from langchain_openai import OpenAIEmbeddings
+from app.registry import get_embeddings
 
 """
 OpenAIEmbeddings 模型测试
@@ -15,11 +14,6 @@ def cosine_similarity(vec1:list[float], vec2:list[float]) -> float:
     dot = np.dot(vec1, vec2)
     return dot / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
 
-embeddings = OpenAIEmbeddings(
-        model=settings.embedding_model,
-        base_url=settings.siliconflow_base_url,
-        api_key=settings.siliconflow_api_key,
-    )
 
 # ================================== 公共 ==================================
 
@@ -35,11 +29,8 @@ def test_embedding_model():
     # embeddings = OpenAIEmbeddings(
     #     model="text-embedding-3-large",
     # )
-    # 这里使用第三方Embedding模型（需要配置baseURL）
-    embeddings = OpenAIEmbeddings(
-        model=settings.embedding_model,
-        base_url=settings.siliconflow_base_url,
-        api_key=settings.siliconflow_api_key,
+    # 这里使用第三方Embedding模型（需要配置baseURL，见 app.registry）
+    embeddings = get_embeddings(
         # dimensions=1024 # 1024, 1536, 2560 (Qwen/Qwen3-Embedding-4B 最多支持到2560维)
     )
 
@@ -54,6 +45,7 @@ def test_embedding_similarity():
     """
     Embedding模型计算的向量，相似度计算的结果测试，评估embedding模型的相似度计算能力
     """
+    embeddings = get_embeddings()
 
     # 完全相似
     similarity = cosine_similarity(
@@ -93,6 +85,7 @@ def test_create_embeddings():
     """
     embed_documents 同时创建多个向量
     """
+    embeddings = get_embeddings()
     text1 = "你好"
     text2 = (
         "Langchain是一个用于构建基于LLM的应用程序的框架"
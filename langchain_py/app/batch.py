@@ -0,0 +1,370 @@
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import warnings
+from collections import deque
+from collections.abc import AsyncIterator, Iterator, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.load import dumpd, load
+from langchain_core.runnables import Runnable, RunnableConfig
+
+"""
+自适应并发的批量执行器，用来替代 chain.batch 跑大批量请求。
+- AIMD 控制并发：请求成功时并发数加性增长，遇到 429 / 超时（或延迟超过目标值）时乘性减小
+- 过载的请求会退避后重新排队，其它异常按 return_exceptions 处理
+- batch() 保持输入顺序，batch_as_completed() 按完成顺序流式返回；对应的异步版本为 abatch()、abatch_as_completed()
+- 传入 checkpoint 文件后，成功的结果会写入 JSONL，中断或部分失败后再次运行只会执行剩下的输入
+
+用法：
+    executor = AdaptiveBatchExecutor(max_concurrency=64)
+    results = executor.batch(chain, inputs, checkpoint="translate.jsonl")
+    print(executor.stats)
+
+注意：ChatOpenAI 默认会在内部重试 429，建议配合 max_retries=0 使用，让执行器感知到限流。
+"""
+
+
+def is_overload(error: BaseException) -> bool:
+    """是否是限流 / 超时类错误（应该降低并发而不是直接失败）"""
+    if isinstance(error, TimeoutError):
+        return True
+    try:
+        import openai
+        import httpx
+    except ImportError:  # pragma: no cover
+        pass
+    else:
+        if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, httpx.TimeoutException)):
+            return True
+    return getattr(error, "status_code", None) in (429, 503)
+
+
+class AIMDLimiter:
+    """加性增、乘性减（AIMD）的并发上限"""
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        decrease_factor: float = 0.5,
+        latency_target: float | None = None,
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._last_decrease = 0.0
+        self._latency = 0.0  # 平滑后的延迟，用作两次减小之间的冷却时间
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def on_success(self, latency: float) -> None:
+        with self._lock:
+            self._latency = latency if not self._latency else 0.8 * self._latency + 0.2 * latency
+            if self.latency_target is not None and latency > self.latency_target:
+                self._decrease()
+            else:
+                # 每一轮（约 limit 个请求）并发数 +1
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    def on_overload(self) -> None:
+        with self._lock:
+            self._decrease()
+
+    def _decrease(self) -> None:
+        # 同一波拥塞里的多次失败只减小一次
+        now = time.monotonic()
+        if now - self._last_decrease < self._latency:
+            return
+        self._last_decrease = now
+        self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+
+
+@dataclass
+class BatchStats:
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    restored: int = 0  # 从 checkpoint 恢复、没有重新执行的数量
+    overloads: int = 0
+    retries: int = 0
+    peak_concurrency: int = 0
+    final_concurrency: int = 0
+    elapsed: float = 0.0
+
+
+class BatchCheckpoint:
+    """把成功的结果逐条追加到 JSONL 文件，用于断点续跑"""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def input_key(value: Any) -> str:
+        data = json.dumps(dumpd(value), ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+    def load(self) -> dict[tuple[int, str], Any]:
+        if not self.path.exists():
+            return {}
+        done: dict[tuple[int, str], Any] = {}
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 上次中断时写了一半的行
+                output = record["output"]
+                # 只有 langchain 对象（如 AIMessage）需要反序列化
+                if isinstance(output, dict) and "lc" in output:
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore", LangChainBetaWarning)
+                        output = load(output)
+                done[(record["index"], record["key"])] = output
+        return done
+
+    def save(self, index: int, key: str, output: Any) -> None:
+        line = json.dumps({"index": index, "key": key, "output": dumpd(output)}, ensure_ascii=False)
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class _BatchRun:
+    """一次批量执行的状态：待执行队列、统计和 checkpoint，同步 / 异步两种执行循环共用"""
+
+    def __init__(self, executor: "AdaptiveBatchExecutor", inputs: Sequence[Any], checkpoint: str | Path | None) -> None:
+        self.executor = executor
+        self.limiter = executor.limiter
+        self.stats = executor.stats
+        self.store = BatchCheckpoint(checkpoint) if checkpoint else None
+        self.keys = [BatchCheckpoint.input_key(v) for v in inputs] if self.store else []
+        self.restored: list[tuple[int, Any]] = []
+        # (下标, 尝试次数, 最早可以开始的时间)
+        self.queue: deque[tuple[int, int, float]] = deque()
+        done = self.store.load() if self.store else {}
+        for index in range(len(inputs)):
+            if self.store and (index, self.keys[index]) in done:
+                self.restored.append((index, done[(index, self.keys[index])]))
+            else:
+                self.queue.append((index, 1, 0.0))
+        self.stats.restored = self.stats.succeeded = len(self.restored)
+
+    def ready(self, in_flight: int) -> list[tuple[int, int]]:
+        """按当前并发上限取出可以开始的请求，跳过还在退避中的请求"""
+        now = time.monotonic()
+        started = []
+        for _ in range(len(self.queue)):
+            if in_flight + len(started) >= self.limiter.limit:
+                break
+            index, attempt, not_before = self.queue.popleft()
+            if not_before > now:
+                self.queue.append((index, attempt, not_before))
+                continue
+            started.append((index, attempt))
+        self.stats.peak_concurrency = max(self.stats.peak_concurrency, in_flight + len(started))
+        return started
+
+    def idle_wait(self) -> float:
+        """没有进行中的请求时，距离下一个请求退避结束的时间"""
+        return max(0.0, min(t for _, _, t in self.queue) - time.monotonic())
+
+    def complete(
+        self, index: int, attempt: int, error: BaseException | None, output: Any, latency: float,
+        return_exceptions: bool,
+    ) -> tuple[bool, Any]:
+        """处理一个请求的结果，返回 (是否产出结果, 结果)；过载时重新排队"""
+        stats = self.stats
+        if error is None:
+            self.limiter.on_success(latency)
+            stats.succeeded += 1
+            if self.store:
+                self.store.save(index, self.keys[index], output)
+            return True, output
+        if is_overload(error):
+            self.limiter.on_overload()
+            stats.overloads += 1
+            if attempt < self.executor.max_attempts:
+                stats.retries += 1
+                self.queue.append((index, attempt + 1, time.monotonic() + self.executor._retry_delay(attempt)))
+                return False, None
+        stats.failed += 1
+        if not return_exceptions:
+            raise error
+        return True, error
+
+
+class AdaptiveBatchExecutor:
+    """
+    自适应并发的批量执行器
+    Args:
+        initial_concurrency: 初始并发数
+        max_concurrency: 并发数上限（也是线程池大小）
+        latency_target: 单个请求的目标延迟（秒），超过时也会降低并发；None 表示只看 429 / 超时
+        max_attempts: 过载错误的最大尝试次数
+        backoff: 过载后重新排队的基础退避时间（秒），按尝试次数指数增长并加随机抖动
+    """
+
+    def __init__(
+        self,
+        initial_concurrency: int = 4,
+        max_concurrency: int = 64,
+        latency_target: float | None = None,
+        max_attempts: int = 6,
+        backoff: float = 0.5,
+    ) -> None:
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.limiter = self._new_limiter()
+        self.stats = BatchStats()
+
+    def _new_limiter(self) -> AIMDLimiter:
+        return AIMDLimiter(
+            initial=self.initial_concurrency,
+            max_limit=self.max_concurrency,
+            latency_target=self.latency_target,
+        )
+
+    def _retry_delay(self, attempt: int) -> float:
+        return self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random())
+
+    def _start(self, inputs: Sequence[Any], checkpoint: str | Path | None) -> _BatchRun:
+        self.limiter = self._new_limiter()
+        self.stats = BatchStats(total=len(inputs))
+        return _BatchRun(self, inputs, checkpoint)
+
+    def _finish(self, started: float) -> None:
+        self.stats.final_concurrency = self.limiter.limit
+        self.stats.elapsed = time.perf_counter() - started
+
+    def _call(self, runnable: Runnable, value: Any, config: RunnableConfig | None) -> tuple[Any, float]:
+        start = time.perf_counter()
+        output = runnable.invoke(value, config)
+        return output, time.perf_counter() - start
+
+    async def _acall(self, runnable: Runnable, value: Any, config: RunnableConfig | None) -> tuple[Any, float]:
+        start = time.perf_counter()
+        output = await runnable.ainvoke(value, config)
+        return output, time.perf_counter() - start
+
+    def batch_as_completed(
+        self,
+        runnable: Runnable,
+        inputs: Sequence[Any],
+        config: RunnableConfig | None = None,
+        *,
+        return_exceptions: bool = False,
+        checkpoint: str | Path | None = None,
+    ) -> Iterator[tuple[int, Any]]:
+        """按完成顺序返回 (输入下标, 结果)"""
+        started = time.perf_counter()
+        run = self._start(inputs, checkpoint)
+        yield from run.restored
+
+        in_flight: dict[Future, tuple[int, int]] = {}
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="adaptive-batch") as pool:
+            try:
+                while run.queue or in_flight:
+                    for index, attempt in run.ready(len(in_flight)):
+                        in_flight[pool.submit(self._call, runnable, inputs[index], config)] = (index, attempt)
+                    if not in_flight:
+                        time.sleep(run.idle_wait())
+                        continue
+                    finished, _ = wait(in_flight, timeout=0.05, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        index, attempt = in_flight.pop(future)
+                        error = future.exception()
+                        output, latency = future.result() if error is None else (None, 0.0)
+                        emit, value = run.complete(index, attempt, error, output, latency, return_exceptions)
+                        if emit:
+                            yield index, value
+            finally:
+                for future in in_flight:
+                    future.cancel()
+                self._finish(started)
+
+    async def abatch_as_completed(
+        self,
+        runnable: Runnable,
+        inputs: Sequence[Any],
+        config: RunnableConfig | None = None,
+        *,
+        return_exceptions: bool = False,
+        checkpoint: str | Path | None = None,
+    ) -> AsyncIterator[tuple[int, Any]]:
+        """batch_as_completed 的异步版本，使用 asyncio task 代替线程"""
+        started = time.perf_counter()
+        run = self._start(inputs, checkpoint)
+        for item in run.restored:
+            yield item
+
+        in_flight: dict[asyncio.Task, tuple[int, int]] = {}
+        try:
+            while run.queue or in_flight:
+                for index, attempt in run.ready(len(in_flight)):
+                    task = asyncio.create_task(self._acall(runnable, inputs[index], config))
+                    in_flight[task] = (index, attempt)
+                if not in_flight:
+                    await asyncio.sleep(run.idle_wait())
+                    continue
+                finished, _ = await asyncio.wait(in_flight, timeout=0.05, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    index, attempt = in_flight.pop(task)
+                    error = task.exception()
+                    output, latency = task.result() if error is None else (None, 0.0)
+                    emit, value = run.complete(index, attempt, error, output, latency, return_exceptions)
+                    if emit:
+                        yield index, value
+        finally:
+            for task in in_flight:
+                task.cancel()
+            self._finish(started)
+
+    def batch(
+        self,
+        runnable: Runnable,
+        inputs: Sequence[Any],
+        config: RunnableConfig | None = None,
+        *,
+        return_exceptions: bool = False,
+        checkpoint: str | Path | None = None,
+    ) -> list[Any]:
+        """保持输入顺序返回全部结果"""
+        results: list[Any] = [None] * len(inputs)
+        for index, output in self.batch_as_completed(
+            runnable, inputs, config, return_exceptions=return_exceptions, checkpoint=checkpoint
+        ):
+            results[index] = output
+        return results
+
+    async def abatch(
+        self,
+        runnable: Runnable,
+        inputs: Sequence[Any],
+        config: RunnableConfig | None = None,
+        *,
+        return_exceptions: bool = False,
+        checkpoint: str | Path | None = None,
+    ) -> list[Any]:
+        """batch 的异步版本"""
+        results: list[Any] = [None] * len(inputs)
+        async for index, output in self.abatch_as_completed(
+            runnable, inputs, config, return_exceptions=return_exceptions, checkpoint=checkpoint
+        ):
+            results[index] = output
+        return results
@@ -0,0 +1,362 @@
+import threading
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator, Sequence
+from dataclasses import dataclass
+from typing import Any
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from app.checkpoint_memory import DEPENDS_ON_KEY
+
+"""
+增量 checkpoint：agent 每一步都会保存一个 checkpoint，其中的 messages 是完整的、不断变长的列表，
+n 轮对话写入的总字节数和序列化耗时是 O(n²)。DeltaCheckpointSaver 包装任意 checkpointer（InMemorySaver、
+BoundedInMemorySaver、PooledSqliteSaver 等），保存时把列表类型的 channel（messages）和父 checkpoint 比较，
+只保存"保留前 keep 个元素 + 追加的元素"（中间的消息被修改、删除时 keep 会变小，例如 SummarizationMiddleware），
+其它 channel 原样保存；从快照开始每 snapshot_every 步保存一次完整的值，还原一个 checkpoint 最多回溯这么多步。
+get_tuple / list 返回的是还原后的完整 checkpoint，对调用方（包括 get_state / get_state_history）透明；
+已经保存的完整 checkpoint 照常读取，可以直接包装已有的数据库。
+
+- 父 checkpoint 的值取自最近一次 put / get_tuple 的缓存（按 thread 的 LRU），不需要再读一次；
+  缓存不命中（重启、分叉到更早的 checkpoint）时先读取父 checkpoint
+- 没有新版本的 channel 沿用父 checkpoint 保存的值（InMemorySaver 不会重新保存，两步之间复用同一个值），
+  所以增量引用的旧 checkpoint 可能比 snapshot_every 步更早。保存时把引用的 checkpoint_id 写入 metadata 的 depends_on，
+  BoundedInMemorySaver 不会删除仍被依赖的 checkpoint；会删除旧 checkpoint 的其它 checkpointer 也需要这样处理。
+  依赖的 checkpoint 仍然缺失时 get_tuple / list 抛出 MissingBaseError，而不是当作没有 checkpoint
+写入的增量 / 快照数、还原时回溯读取的次数见 stats。
+
+用法：
+    memory = DeltaCheckpointSaver(PooledSqliteSaver("checkpoints.sqlite"), snapshot_every=20)
+    agent = create_agent(model, checkpointer=memory)
+"""
+
+# 增量以普通 dict 保存，任何 serde 都能序列化：{_DELTA_KEY: 父 checkpoint_id, "keep": n, "append": [...]}
+_DELTA_KEY = "__checkpoint_delta__"
+
+
+@dataclass
+class DeltaStats:
+    deltas: int = 0  # 以增量保存的 channel 值
+    snapshots: int = 0  # 以完整值保存的列表 channel
+    base_reads: int = 0  # 还原时读取的旧 checkpoint 数
+    missing_base: int = 0  # 因依赖的 checkpoint 已删除而无法还原的次数
+
+
+@dataclass
+class _Last:
+    """
+    某个 thread / checkpoint_ns 最近的 checkpoint：完整的 channel 值、保存的值（可能是增量），
+    以及还原每个 channel 需要回溯的步数
+    """
+    checkpoint_id: str
+    values: dict[str, Any]
+    stored: dict[str, Any]
+    hops: dict[str, int]
+
+
+class MissingBaseError(LookupError):
+    """增量依赖的 checkpoint 已被删除，无法还原"""
+
+
+def _copy_lists(values: dict[str, Any]) -> dict[str, Any]:
+    # 调用方之后可能原地修改 channel 的列表，缓存里放一份浅拷贝
+    return {channel: list(value) if isinstance(value, list) else value for channel, value in values.items()}
+
+
+def _is_delta(value: Any) -> bool:
+    return isinstance(value, dict) and _DELTA_KEY in value
+
+
+def _common_prefix(old: list, new: list) -> int:
+    n = min(len(old), len(new))
+    i = 0
+    # 相邻两步的 messages 大多是同一批对象，先比较 is
+    while i < n and (old[i] is new[i] or old[i] == new[i]):
+        i += 1
+    return i
+
+
+class DeltaCheckpointSaver(BaseCheckpointSaver):
+    def __init__(self, inner: BaseCheckpointSaver, *, snapshot_every: int = 20, max_cached_threads: int = 1024) -> None:
+        super().__init__(serde=inner.serde)
+        self.inner = inner
+        self.snapshot_every = snapshot_every
+        self.max_cached_threads = max_cached_threads
+        self.stats = DeltaStats()
+        self._last: OrderedDict[tuple[str, str], _Last] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def config_specs(self) -> list:
+        return self.inner.config_specs
+
+    def get_next_version(self, current: Any, channel: None) -> Any:
+        return self.inner.get_next_version(current, channel)
+
+    def _count(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    # ---- 缓存 ----
+
+    def _remember(self, thread_id: str, checkpoint_ns: str, last: _Last) -> _Last:
+        last = _Last(last.checkpoint_id, _copy_lists(last.values), _copy_lists(last.stored), last.hops)
+        with self._lock:
+            self._last[(thread_id, checkpoint_ns)] = last
+            self._last.move_to_end((thread_id, checkpoint_ns))
+            while len(self._last) > self.max_cached_threads:
+                self._last.popitem(last=False)
+        return last
+
+    def _forget(self, thread_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._last if key[0] == thread_id]:
+                del self._last[key]
+
+    # ---- 编码 ----
+
+    def _cached_parent(self, config: RunnableConfig) -> _Last | None | bool:
+        """缓存中的父 checkpoint；没有父 checkpoint 时为 None，缓存不命中时为 False（需要读取）"""
+        configurable = config["configurable"]
+        parent_id = configurable.get("checkpoint_id")
+        if parent_id is None:
+            return None
+        with self._lock:
+            last = self._last.get((configurable["thread_id"], configurable["checkpoint_ns"]))
+        return last if last is not None and last.checkpoint_id == parent_id else False
+
+    def _parent(self, config: RunnableConfig) -> _Last | None:
+        last = self._cached_parent(config)
+        if last is False:
+            item = self.inner.get_tuple(config)
+            last = self._after_get(*self._resolve(item))[1] if item is not None else None
+        return last
+
+    async def _aparent(self, config: RunnableConfig) -> _Last | None:
+        last = self._cached_parent(config)
+        if last is False:
+            item = await self.inner.aget_tuple(config)
+            last = self._after_get(*await self._aresolve(item))[1] if item is not None else None
+        return last
+
+    def _encode(
+        self, parent: _Last | None, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions
+    ) -> tuple[Checkpoint, CheckpointMetadata, dict[str, int]]:
+        """返回要保存的 checkpoint 和 metadata，以及还原每个 channel 最多需要回溯的步数"""
+        values: dict[str, Any] = {}
+        hops: dict[str, int] = {}
+        deltas = snapshots = 0
+        for channel, value in checkpoint["channel_values"].items():
+            if parent is not None and channel not in new_versions and channel in parent.stored:
+                # 没有新版本：和父 checkpoint 保存的是同一个值（InMemorySaver 直接复用），引用的也是同一个旧 checkpoint
+                values[channel] = parent.stored[channel]
+                hops[channel] = parent.hops.get(channel, 0)
+                continue
+            parent_hops = parent.hops.get(channel, 0) if parent is not None else 0
+            old = parent.values.get(channel) if parent is not None else None
+            keep = 0
+            if isinstance(value, list) and isinstance(old, list) and parent_hops + 1 < self.snapshot_every:
+                keep = _common_prefix(old, value)
+            if keep:
+                values[channel] = {_DELTA_KEY: parent.checkpoint_id, "keep": keep, "append": value[keep:]}
+                hops[channel] = parent_hops + 1
+                deltas += 1
+            else:
+                values[channel] = value
+                hops[channel] = 0
+                snapshots += isinstance(value, list)
+        self._count(deltas=deltas, snapshots=snapshots)
+        depends_on = sorted({value[_DELTA_KEY] for value in values.values() if _is_delta(value)})
+        if depends_on:
+            metadata = {**metadata, DEPENDS_ON_KEY: depends_on}
+        return {**checkpoint, "channel_values": values}, metadata, hops
+
+    # ---- 还原 ----
+
+    @staticmethod
+    def _apply(base: Any, deltas: list[dict]) -> Any:
+        value = base if isinstance(base, list) else []
+        for delta in reversed(deltas):
+            value = value[: delta["keep"]] + delta["append"]
+        return value
+
+    def _base_config(self, item: CheckpointTuple, checkpoint_id: str) -> RunnableConfig:
+        configurable = item.config["configurable"]
+        return {
+            "configurable": {
+                "thread_id": configurable["thread_id"],
+                "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+                "checkpoint_id": checkpoint_id,
+            }
+        }
+
+    @staticmethod
+    def _missing(item: CheckpointTuple, base_id: str) -> MissingBaseError:
+        return MissingBaseError(
+            f"checkpoint {item.config['configurable'].get('checkpoint_id')} 依赖的 checkpoint {base_id} 已被删除，无法还原"
+        )
+
+    @staticmethod
+    def _public(item: CheckpointTuple, values: dict[str, Any]) -> CheckpointTuple:
+        """还原后的 checkpoint，metadata 中去掉 depends_on"""
+        metadata = item.metadata
+        if metadata and DEPENDS_ON_KEY in metadata:
+            metadata = {k: v for k, v in metadata.items() if k != DEPENDS_ON_KEY}
+        return item._replace(checkpoint={**item.checkpoint, "channel_values": values}, metadata=metadata)
+
+    def _resolve(self, item: CheckpointTuple) -> tuple[CheckpointTuple, dict[str, Any], dict[str, int]]:
+        """返回还原后的 checkpoint、保存的 channel 值，以及每个 channel 回溯的步数"""
+        values = item.checkpoint["channel_values"]
+        if not any(_is_delta(v) for v in values.values()):
+            return self._public(item, values), values, {}
+        # 本次还原中读过的旧 checkpoint：checkpoint_id -> channel 值（可能还是增量）
+        loaded: dict[str, dict[str, Any]] = {}
+        resolved, hops = {}, {}
+        for channel, value in values.items():
+            deltas = []
+            while _is_delta(value):
+                deltas.append(value)
+                base_id = value[_DELTA_KEY]
+                if base_id not in loaded:
+                    base = self.inner.get_tuple(self._base_config(item, base_id))
+                    if base is None:
+                        self._count(missing_base=1)
+                        raise self._missing(item, base_id)
+                    self._count(base_reads=1)
+                    loaded[base_id] = base.checkpoint["channel_values"]
+                value = loaded[base_id].get(channel)
+            resolved[channel] = self._apply(value, deltas) if deltas else value
+            hops[channel] = len(deltas)
+        return self._public(item, resolved), values, hops
+
+    async def _aresolve(self, item: CheckpointTuple) -> tuple[CheckpointTuple, dict[str, Any], dict[str, int]]:
+        values = item.checkpoint["channel_values"]
+        if not any(_is_delta(v) for v in values.values()):
+            return self._public(item, values), values, {}
+        loaded: dict[str, dict[str, Any]] = {}
+        resolved, hops = {}, {}
+        for channel, value in values.items():
+            deltas = []
+            while _is_delta(value):
+                deltas.append(value)
+                base_id = value[_DELTA_KEY]
+                if base_id not in loaded:
+                    base = await self.inner.aget_tuple(self._base_config(item, base_id))
+                    if base is None:
+                        self._count(missing_base=1)
+                        raise self._missing(item, base_id)
+                    self._count(base_reads=1)
+                    loaded[base_id] = base.checkpoint["channel_values"]
+                value = loaded[base_id].get(channel)
+            resolved[channel] = self._apply(value, deltas) if deltas else value
+            hops[channel] = len(deltas)
+        return self._public(item, resolved), values, hops
+
+    def _after_get(self, item: CheckpointTuple, stored: dict[str, Any], hops: dict[str, int]) -> tuple[CheckpointTuple, _Last]:
+        configurable = item.config["configurable"]
+        last = self._remember(
+            configurable["thread_id"],
+            configurable.get("checkpoint_ns", ""),
+            _Last(configurable["checkpoint_id"], item.checkpoint["channel_values"], stored, hops),
+        )
+        return item, last
+
+    # ---- BaseCheckpointSaver ----
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        item = self.inner.get_tuple(config)
+        if item is None:
+            return None
+        return self._after_get(*self._resolve(item))[0]
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        for item in self.inner.list(config, filter=filter, before=before, limit=limit):
+            yield self._resolve(item)[0]
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        encoded, metadata, hops = self._encode(self._parent(config), checkpoint, metadata, new_versions)
+        next_config = self.inner.put(config, encoded, metadata, new_versions)
+        self._remember(
+            config["configurable"]["thread_id"],
+            config["configurable"]["checkpoint_ns"],
+            _Last(checkpoint["id"], checkpoint["channel_values"], encoded["channel_values"], hops),
+        )
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.inner.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._forget(thread_id)
+        self.inner.delete_thread(thread_id)
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        item = await self.inner.aget_tuple(config)
+        if item is None:
+            return None
+        return self._after_get(*await self._aresolve(item))[0]
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async for item in self.inner.alist(config, filter=filter, before=before, limit=limit):
+            yield (await self._aresolve(item))[0]
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        encoded, metadata, hops = self._encode(await self._aparent(config), checkpoint, metadata, new_versions)
+        next_config = await self.inner.aput(config, encoded, metadata, new_versions)
+        self._remember(
+            config["configurable"]["thread_id"],
+            config["configurable"]["checkpoint_ns"],
+            _Last(checkpoint["id"], checkpoint["channel_values"], encoded["channel_values"], hops),
+        )
+        return next_config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await self.inner.aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self._forget(thread_id)
+        await self.inner.adelete_thread(thread_id)
@@ -0,0 +1,334 @@
+import threading
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable, Iterator, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from app.config import settings
+
+"""
+有上限的内存 checkpointer：InMemorySaver 会一直保留所有 thread 的所有 checkpoint，
+messages 每一步都会保存一份完整的新版本，长时间运行的服务内存只增不减。BoundedInMemorySaver 在它的基础上加了
+- max_threads：内存中最多保留的 thread 数，超出时按最近使用（get / list / put）淘汰最久未用的 thread（LRU）
+- max_checkpoints_per_thread：每个 thread（每个 checkpoint_ns）只保留最新的 N 个 checkpoint，
+  更早的 checkpoint、它的 pending writes 和不再被引用的 channel 值一起删除（get_state_history 只能看到这 N 个）。
+  保留的 checkpoint 在 metadata 的 depends_on 中列出的 checkpoint（如 DeltaCheckpointSaver 增量引用的旧 checkpoint）不删除，
+  直到依赖它的 checkpoint 都被删除
+- max_bytes：所有 thread 估算占用的总字节数上限，超出时同样按 LRU 淘汰
+- spill：可选的另一个 checkpointer（如 app.checkpoint_sqlite 的 PooledSqliteSaver），被淘汰的 thread 写到这里而不是直接丢弃，
+  之后再访问这个 thread 时读回内存并从 spill 中删除，对调用方透明
+每个 thread 的占用按序列化后的字节数加上固定的条目开销估算，见 memory_usage()；淘汰 / 写出 / 读回次数见 stats。
+以上限制为 0 表示不限制。
+
+用法：
+    agent = create_agent(model, checkpointer=default_checkpointer())  # 上限和 spill 路径来自 CHECKPOINT_* 配置
+    memory = BoundedInMemorySaver(max_threads=1000, spill=PooledSqliteSaver("spill.sqlite"))
+"""
+
+# 每个条目（dict 项、key tuple、bytes 对象头）的大致开销，加在序列化后的字节数上
+_ENTRY_OVERHEAD = 200
+# checkpoint metadata 中的这一项列出还原它需要读取的其它 checkpoint_id，这些 checkpoint 不会因 max_checkpoints_per_thread 被删除
+DEPENDS_ON_KEY = "depends_on"
+
+
+@dataclass
+class CheckpointMemoryStats:
+    evicted: int = 0  # 因超出上限被移出内存的 thread 数
+    spilled: int = 0  # 其中写入了 spill 的
+    restored: int = 0  # 从 spill 读回内存的 thread 数
+    pruned: int = 0  # 因超出每个 thread 的上限被删除的旧 checkpoint 数
+
+
+@dataclass
+class _ThreadUsage:
+    bytes: int = 0
+    # (checkpoint_ns, checkpoint_id) -> channel_versions，删除旧 checkpoint 时据此找出不再被引用的 blob
+    versions: dict[tuple[str, str], ChannelVersions] = field(default_factory=dict)
+    blobs: set[tuple[str, str, str, Any]] = field(default_factory=set)
+    # (checkpoint_ns, checkpoint_id) -> metadata 的 depends_on
+    depends_on: dict[tuple[str, str], tuple[str, ...]] = field(default_factory=dict)
+
+
+def _size(typed: tuple[str, bytes]) -> int:
+    return len(typed[1]) + _ENTRY_OVERHEAD
+
+
+def _copy_thread(
+    tuples: list[CheckpointTuple],
+    put: Callable[..., RunnableConfig],
+    put_writes: Callable[..., None],
+) -> None:
+    """按从旧到新的顺序写入 checkpoint 和它的 pending writes（tuples 为 list() 的结果，从新到旧）"""
+    for item in reversed(tuples):
+        configurable = item.config["configurable"]
+        parent = item.parent_config or {
+            "configurable": {"thread_id": configurable["thread_id"], "checkpoint_ns": configurable.get("checkpoint_ns", "")}
+        }
+        config = put(parent, item.checkpoint, item.metadata, item.checkpoint["channel_versions"])
+        by_task: dict[str, list[tuple[str, Any]]] = defaultdict(list)
+        for task_id, channel, value in item.pending_writes or []:
+            by_task[task_id].append((channel, value))
+        for task_id, writes in by_task.items():
+            put_writes(config, writes, task_id)
+
+
+class BoundedInMemorySaver(InMemorySaver):
+    def __init__(
+        self,
+        *,
+        max_threads: int = 10_000,
+        max_checkpoints_per_thread: int = 20,
+        max_bytes: int = 256 * 1024 * 1024,
+        spill: BaseCheckpointSaver | None = None,
+        serde: SerializerProtocol | None = None,
+    ) -> None:
+        super().__init__(serde=serde)
+        self.max_threads = max_threads
+        self.max_checkpoints_per_thread = max_checkpoints_per_thread
+        self.max_bytes = max_bytes
+        self.spill = spill
+        self.stats = CheckpointMemoryStats()
+        self.total_bytes = 0
+        # 按最近使用排序，最久未用的在前面
+        self._threads: OrderedDict[str, _ThreadUsage] = OrderedDict()
+        # 同一个 agent 的并行节点会从多个线程写入
+        self._lock = threading.RLock()
+
+    @property
+    def thread_count(self) -> int:
+        return len(self._threads)
+
+    def memory_usage(self) -> dict[str, int]:
+        """内存中每个 thread 估算占用的字节数，按最近使用从旧到新"""
+        with self._lock:
+            return {thread_id: usage.bytes for thread_id, usage in self._threads.items()}
+
+    # ---- BaseCheckpointSaver ----
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._load(thread_id)
+            # 不在内存里的 thread 直接返回，InMemorySaver 会在 defaultdict 里留下空条目
+            if thread_id not in self._threads:
+                return None
+            self._evict(keep=thread_id)
+            return super().get_tuple(config)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        # 在锁内取完，迭代期间其它线程的写入 / 淘汰不影响结果
+        with self._lock:
+            if config is not None:
+                thread_id = config["configurable"]["thread_id"]
+                self._load(thread_id)
+                if thread_id not in self._threads:
+                    return iter(())
+                self._evict(keep=thread_id)
+            return iter(list(super().list(config, filter=filter, before=before, limit=limit)))
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._load(thread_id)
+            next_config = self._put(config, checkpoint, metadata, new_versions)
+            self._prune(thread_id, config["configurable"]["checkpoint_ns"])
+            self._evict(keep=thread_id)
+            return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._load(thread_id)
+            self._put_writes(config, writes, task_id, task_path)
+            self._evict(keep=thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._delete(thread_id)
+            if self.spill is not None:
+                self.spill.delete_thread(thread_id)
+
+    # ---- 内存占用 ----
+
+    def _usage(self, thread_id: str) -> _ThreadUsage:
+        usage = self._threads.get(thread_id)
+        if usage is None:
+            usage = self._threads[thread_id] = _ThreadUsage()
+        return usage
+
+    def _add(self, usage: _ThreadUsage, size: int) -> None:
+        usage.bytes += size
+        self.total_bytes += size
+
+    def _put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        usage = self._usage(thread_id)
+        keys = [(thread_id, checkpoint_ns, k, v) for k, v in new_versions.items()]
+        # 覆盖已有的条目时先减去旧的大小
+        size = -sum(_size(self.blobs[key]) for key in keys if key in usage.blobs)
+        if saved := self.storage[thread_id][checkpoint_ns].get(checkpoint["id"]):
+            size -= _size(saved[0]) + _size(saved[1])
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        saved = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+        size += _size(saved[0]) + _size(saved[1]) + sum(_size(self.blobs[key]) for key in keys)
+        usage.blobs.update(keys)
+        usage.versions[(checkpoint_ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+        if depends_on := metadata.get(DEPENDS_ON_KEY):
+            usage.depends_on[(checkpoint_ns, checkpoint["id"])] = tuple(depends_on)
+        self._add(usage, size)
+        return next_config
+
+    def _put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        outer_key = (thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"])
+        before = sum(_size(w[2]) for w in self.writes.get(outer_key, {}).values())
+        super().put_writes(config, writes, task_id, task_path)
+        after = sum(_size(w[2]) for w in self.writes[outer_key].values())
+        self._add(self._usage(thread_id), after - before)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        """只保留最新的 max_checkpoints_per_thread 个 checkpoint，以及它们（直接或间接）依赖的 checkpoint"""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        excess = len(checkpoints) - self.max_checkpoints_per_thread
+        if self.max_checkpoints_per_thread <= 0 or excess <= 0:
+            return
+        usage = self._threads[thread_id]
+        ids = sorted(checkpoints)
+        keep = set(ids[excess:])
+        pending = list(keep)
+        while pending:
+            for base in usage.depends_on.get((checkpoint_ns, pending.pop()), ()):
+                if base in checkpoints and base not in keep:
+                    keep.add(base)
+                    pending.append(base)
+        removed = [checkpoint_id for checkpoint_id in ids[:excess] if checkpoint_id not in keep]
+        if not removed:
+            return
+        freed = 0
+        for checkpoint_id in removed:
+            saved = checkpoints.pop(checkpoint_id)
+            usage.versions.pop((checkpoint_ns, checkpoint_id), None)
+            usage.depends_on.pop((checkpoint_ns, checkpoint_id), None)
+            freed += _size(saved[0]) + _size(saved[1])
+            for w in self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), {}).values():
+                freed += _size(w[2])
+        referenced = {
+            (thread_id, ns, k, v)
+            for (ns, _), versions in usage.versions.items()
+            if ns == checkpoint_ns
+            for k, v in versions.items()
+        }
+        for key in [key for key in usage.blobs if key[1] == checkpoint_ns and key not in referenced]:
+            usage.blobs.discard(key)
+            freed += _size(self.blobs.pop(key))
+        self._add(usage, -freed)
+        self.stats.pruned += len(removed)
+
+    # ---- 淘汰 / spill ----
+
+    def _over_limit(self) -> bool:
+        return (0 < self.max_threads < len(self._threads)) or (0 < self.max_bytes < self.total_bytes)
+
+    def _evict(self, keep: str) -> None:
+        """按 LRU 淘汰 thread 直到不超过上限，正在使用的 thread 不淘汰"""
+        while self._over_limit() and len(self._threads) > 1:
+            thread_id = next(iter(self._threads))
+            if thread_id == keep:
+                self._threads.move_to_end(thread_id)
+                continue
+            if self.spill is not None:
+                tuples = list(super().list({"configurable": {"thread_id": thread_id}}))
+                _copy_thread(tuples, self.spill.put, self.spill.put_writes)
+                self.stats.spilled += 1
+            self._delete(thread_id)
+            self.stats.evicted += 1
+
+    def _load(self, thread_id: str) -> None:
+        """标记为最近使用；不在内存中时尝试从 spill 读回"""
+        if thread_id in self._threads:
+            self._threads.move_to_end(thread_id)
+            return
+        if self.spill is None:
+            return
+        tuples = list(self.spill.list({"configurable": {"thread_id": thread_id}}))
+        if not tuples:
+            return
+        _copy_thread(tuples, self._put, self._put_writes)
+        self.spill.delete_thread(thread_id)
+        self.stats.restored += 1
+
+    def _delete(self, thread_id: str) -> None:
+        usage = self._threads.pop(thread_id, None)
+        if usage is None:
+            return
+        # InMemorySaver.delete_thread 会扫描所有 thread 的 writes 和 blobs，这里只删记录下来的 key
+        for checkpoint_ns, checkpoints in self.storage.pop(thread_id, {}).items():
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        for key in usage.blobs:
+            self.blobs.pop(key, None)
+        self.total_bytes -= usage.bytes
+
+
+def default_checkpointer() -> BoundedInMemorySaver:
+    """按 CHECKPOINT_* 配置创建；配置了 CHECKPOINT_SPILL_PATH 时被淘汰的 thread 写入该 SQLite 文件"""
+    from app.checkpoint_serde import default_serde
+
+    # 内存中和 spill 中的值都按 CHECKPOINT_COMPRESSION 压缩，max_bytes 按压缩后的大小计算
+    serde = default_serde()
+    spill = None
+    if settings.checkpoint_spill_path:
+        from app.checkpoint_sqlite import PooledSqliteSaver
+
+        # 只在淘汰 / 读回时访问，用较小的页缓存、不做 mmap，避免 spill 本身让 RSS 随文件增长
+        spill = PooledSqliteSaver(
+            settings.checkpoint_spill_path, readers=1, mmap_size=0, cache_size_kb=8 * 1024, serde=serde
+        )
+    return BoundedInMemorySaver(
+        max_threads=settings.checkpoint_max_threads,
+        max_checkpoints_per_thread=settings.checkpoint_max_per_thread,
+        max_bytes=settings.checkpoint_max_bytes,
+        spill=spill,
+        serde=serde,
+    )
@@ -0,0 +1,187 @@
+import hashlib
+import threading
+import zlib
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+import zstandard
+from langgraph.checkpoint.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from app.config import settings
+
+"""
+压缩的 checkpoint 序列化：checkpointer 默认的 JsonPlusSerializer 已经用 msgpack（ormsgpack）编码，
+但不压缩，而中文对话历史里重复的内容很多（消息的类名、字段名、相同的系统提示和工具输出），压缩后通常只有几分之一。
+CompressedSerializer 包装 JsonPlusSerializer，在 msgpack 的结果上再做一次压缩：
+- codec："zstd"（默认）、"zlib" 或 "none"
+- dictionary：可选的共享字典（train_dictionary() 用对话语料训练），单条 checkpoint 很小时也能压缩得很好
+- min_size：小于这个字节数的值不压缩；压缩后没有变小的值也按原样保存
+
+压缩后的值的 type 记为 "cz1:<codec>:<字典 id>:<原来的 type>"（例如 "cz1:zstd:3f2a9c1b:msgpack"），
+读取时按 type 选择解码方式：没有 cz1 前缀的值（未压缩的、以及加入压缩之前保存的 checkpoint）交给 JsonPlusSerializer，
+已有的数据库可以直接使用。字典 id 是字典内容的哈希，更换字典后旧的 checkpoint 需要旧字典才能读取，
+把旧字典放在 dictionaries 的后面即可（只有第一个用于写入）。
+
+用法：
+    serde = default_serde()  # 按 CHECKPOINT_COMPRESSION / CHECKPOINT_DICTIONARY_PATH 配置创建
+    memory = PooledSqliteSaver("checkpoints.sqlite", serde=serde)
+    serde = CompressedSerializer(codec="zstd", dictionaries=[train_dictionary(samples)])
+"""
+
+FORMAT = "cz1"
+CODECS = ("zstd", "zlib", "none")
+
+# zlib 的预设字典只使用最后 32KB（窗口大小）
+_ZLIB_WINDOW = 32 * 1024
+_NO_DICTIONARY = "-"
+
+
+def dictionary_id(dictionary: bytes) -> str:
+    return hashlib.sha256(dictionary).hexdigest()[:8]
+
+
+def train_dictionary(samples: Sequence[bytes], size: int = 32 * 1024) -> bytes:
+    """
+    用序列化后的 checkpoint（JsonPlusSerializer.dumps_typed 的字节）训练共享字典。
+    使用 zstd 的字典训练（zlib 也可以使用它的内容部分），样本太少无法训练时退化为按出现次数挑选的样本片段。
+    """
+    samples = [sample for sample in samples if sample]
+    if not samples:
+        raise ValueError("训练字典至少需要一个非空样本")
+    try:
+        return zstandard.train_dictionary(size, samples).as_bytes()
+    except zstandard.ZstdError:
+        pass  # 样本太少时 zstd 无法训练，用下面的方式
+    # 出现次数多的 64 字节片段优先；zlib 对靠近字典末尾的内容编码更短，最常见的放在最后
+    counts: dict[bytes, int] = {}
+    for sample in samples:
+        for start in range(0, len(sample), 64):
+            chunk = sample[start:start + 64]
+            counts[chunk] = counts.get(chunk, 0) + 1
+    chosen, total = [], 0
+    for chunk, _ in sorted(counts.items(), key=lambda item: -item[1]):
+        if total + len(chunk) > size:
+            break
+        chosen.append(chunk)
+        total += len(chunk)
+    return b"".join(reversed(chosen))
+
+
+@dataclass
+class SerdeStats:
+    encoded: int = 0  # dumps_typed 次数
+    compressed: int = 0  # 其中压缩保存的
+    raw_bytes: int = 0  # 压缩前的总字节数（只统计压缩保存的值）
+    stored_bytes: int = 0  # 压缩后的总字节数
+    decoded: int = 0  # loads_typed 次数
+    legacy: int = 0  # 其中没有 cz1 前缀、直接交给内层 serde 的
+
+    @property
+    def ratio(self) -> float:
+        return self.stored_bytes / self.raw_bytes if self.raw_bytes else 1.0
+
+
+class CompressedSerializer(SerializerProtocol):
+    def __init__(
+        self,
+        inner: SerializerProtocol | None = None,
+        *,
+        codec: str = "zstd",
+        level: int | None = None,
+        dictionaries: Iterable[bytes] = (),
+        min_size: int = 128,
+    ) -> None:
+        if codec not in CODECS:
+            raise ValueError(f"不支持的压缩方式：{codec}，可选 {', '.join(CODECS)}")
+        self.inner = inner or JsonPlusSerializer()
+        self.codec = codec
+        self.level = level if level is not None else (3 if codec == "zstd" else 6)
+        self.min_size = min_size
+        # 字典 id -> 字典；第一个用于写入，其余的只用于读取旧数据
+        self.dictionaries: dict[str, bytes] = {}
+        for dictionary in dictionaries:
+            self.dictionaries.setdefault(dictionary_id(dictionary), dictionary)
+        self.dictionary_id = next(iter(self.dictionaries), _NO_DICTIONARY)
+        self.stats = SerdeStats()
+        self._lock = threading.Lock()
+        # zstandard 的 (de)compressor 不能在多个线程间同时使用，每个线程各建一份
+        self._local = threading.local()
+
+    def _count(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def _dictionary(self, dict_id: str) -> bytes | None:
+        if dict_id == _NO_DICTIONARY:
+            return None
+        try:
+            return self.dictionaries[dict_id]
+        except KeyError:
+            raise ValueError(f"checkpoint 使用了 id 为 {dict_id} 的压缩字典，但没有加载这个字典（dictionaries）") from None
+
+    def _zstd(self, kind: str, dict_id: str) -> Any:
+        cache = self._local.__dict__.setdefault("zstd", {})
+        key = (kind, dict_id)
+        if key not in cache:
+            dictionary = self._dictionary(dict_id)
+            zdict = zstandard.ZstdCompressionDict(dictionary) if dictionary is not None else None
+            if kind == "compress":
+                cache[key] = zstandard.ZstdCompressor(level=self.level, dict_data=zdict)
+            else:
+                cache[key] = zstandard.ZstdDecompressor(dict_data=zdict)
+        return cache[key]
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == "zstd":
+            return self._zstd("compress", self.dictionary_id).compress(data)
+        dictionary = self._dictionary(self.dictionary_id)
+        # raw deflate（wbits=-15），不要 zlib 头和校验和，每个值省 6 字节
+        if dictionary is None:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=dictionary[-_ZLIB_WINDOW:])
+        return compressor.compress(data) + compressor.flush()
+
+    def _decompress(self, codec: str, dict_id: str, data: bytes) -> bytes:
+        if codec == "zstd":
+            return self._zstd("decompress", dict_id).decompress(data)
+        if codec == "zlib":
+            dictionary = self._dictionary(dict_id)
+            if dictionary is None:
+                decompressor = zlib.decompressobj(-15)
+            else:
+                decompressor = zlib.decompressobj(-15, zdict=dictionary[-_ZLIB_WINDOW:])
+            return decompressor.decompress(data) + decompressor.flush()
+        raise ValueError(f"未知的 checkpoint 压缩方式：{codec}")
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        type_, data = self.inner.dumps_typed(obj)
+        self._count(encoded=1)
+        if self.codec == "none" or len(data) < self.min_size:
+            return type_, data
+        compressed = self._compress(data)
+        if len(compressed) >= len(data):
+            return type_, data
+        self._count(compressed=1, raw_bytes=len(data), stored_bytes=len(compressed))
+        return f"{FORMAT}:{self.codec}:{self.dictionary_id}:{type_}", compressed
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if not type_.startswith(FORMAT + ":"):
+            self._count(decoded=1, legacy=1)
+            return self.inner.loads_typed(data)
+        _, codec, dict_id, inner_type = type_.split(":", 3)
+        self._count(decoded=1)
+        return self.inner.loads_typed((inner_type, self._decompress(codec, dict_id, payload)))
+
+
+def default_serde() -> CompressedSerializer | None:
+    """按 CHECKPOINT_COMPRESSION / CHECKPOINT_DICTIONARY_PATH 配置创建；CHECKPOINT_COMPRESSION=none 时返回 None（默认的 serde）"""
+    if settings.checkpoint_compression == "none":
+        return None
+    # 多个字典用逗号分隔，第一个用于写入；不存在的文件跳过（还没有训练字典时照常压缩）
+    paths = [Path(path.strip()) for path in settings.checkpoint_dictionary_path.split(",") if path.strip()]
+    dictionaries = [path.read_bytes() for path in paths if path.is_file()]
+    return CompressedSerializer(codec=settings.checkpoint_compression, dictionaries=dictionaries)
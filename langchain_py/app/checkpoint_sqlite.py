@@ -0,0 +1,388 @@
+import asyncio
+import json
+import queue
+import sqlite3
+import threading
+from collections.abc import AsyncIterator, Iterator, Sequence
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.utils import search_where
+
+"""
+高并发的 SQLite checkpointer。SqliteSaver(sqlite3.connect(...)) 所有读写共用一个连接和一把锁，每次写入单独提交；
+PooledSqliteSaver 的表结构和序列化格式与 SqliteSaver 相同（已有的 checkpoints.sqlite 可以直接使用），改为
+- WAL + synchronous=NORMAL（提交时不 fsync，断电最多丢失最近的几次提交，不会损坏数据库）、mmap_size、cache_size、busy_timeout
+- 读：readers 个只读连接组成的连接池，get_tuple / list 在一个读事务里完成（同一快照），多个会话可以同时读，不等写入
+- 写：只有一个写连接，由后台线程执行。put / put_writes / delete_thread 放入队列后等待提交，
+  后台线程把队列中已有的写入（最多 max_batch 个）放在一个事务里提交（group commit），并发越高每次提交的写入越多；
+  一批中某个写入出错时回滚，逐个重新提交，只有出错的那个调用收到异常
+- 语句都是固定的 SQL 文本，sqlite3 按连接缓存编译好的语句（cached_statements），不会每次重新编译
+- 支持异步方法（aput / aget_tuple 等），写入直接等待后台线程的 Future，不需要 AsyncSqliteSaver / aiosqlite
+读写次数、提交次数和平均每次提交的写入数见 stats。需要文件数据库（":memory:" 无法在多个连接间共享）。
+
+用法：
+    memory = PooledSqliteSaver("checkpoints.sqlite")
+    agent = create_agent(model, checkpointer=memory)
+    ...
+    memory.close()
+"""
+
+_SELECT_WRITES = (
+    "SELECT task_id, channel, type, value FROM writes "
+    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx"
+)
+_INSERT_CHECKPOINT = (
+    "INSERT OR REPLACE INTO checkpoints "
+    "(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+_UPSERT_WRITES = (
+    "INSERT OR REPLACE INTO writes "
+    "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_INSERT_WRITES = _UPSERT_WRITES.replace("OR REPLACE", "OR IGNORE")
+
+# 一次写入：[(sql, 参数, 是否 executemany)]
+_Statements = list[tuple[str, Sequence[Any], bool]]
+
+
+@dataclass
+class SqliteCheckpointStats:
+    reads: int = 0  # get_tuple / list 次数
+    writes: int = 0  # put / put_writes / delete_thread 次数
+    commits: int = 0  # 实际提交的事务数
+    failed: int = 0  # 出错的写入数
+    max_batch: int = 0  # 一次提交的最多写入数
+
+    @property
+    def writes_per_commit(self) -> float:
+        return self.writes / self.commits if self.commits else 0.0
+
+
+class PooledSqliteSaver(SqliteSaver):
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        readers: int = 4,
+        synchronous: str = "NORMAL",
+        mmap_size: int = 256 * 1024 * 1024,
+        cache_size_kb: int = 64 * 1024,
+        busy_timeout: float = 30.0,
+        max_batch: int = 256,
+        serde: SerializerProtocol | None = None,
+    ) -> None:
+        self.path = str(path)
+        if self.path == ":memory:":
+            raise ValueError("PooledSqliteSaver 需要文件数据库，内存数据库无法在多个连接间共享")
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self.busy_timeout = busy_timeout
+        self.max_batch = max_batch
+        super().__init__(self._connect(), serde=serde)
+        # 先在写连接上建表，之后才能打开只读连接
+        self.setup()
+        self.stats = SqliteCheckpointStats()
+        self._stats_lock = threading.Lock()
+        self._readers: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        for _ in range(readers):
+            self._readers.put(self._connect(readonly=True))
+        self._queue: queue.SimpleQueue[tuple[_Statements, Future] | None] = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._run_writer, name="checkpoint-writer", daemon=True)
+        self._writer.start()
+        self._closed = False
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        # isolation_level=None：由这里显式 BEGIN / COMMIT，sqlite3 模块不再隐式开启事务
+        conn = sqlite3.connect(
+            self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False, cached_statements=256
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size={-int(self.cache_size_kb)}")  # 负数表示 KB
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _count(self, **counts: int) -> None:
+        with self._stats_lock:
+            for name, value in counts.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def close(self) -> None:
+        """提交队列中剩余的写入，关闭所有连接"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+        self.conn.close()
+
+    def __enter__(self) -> "PooledSqliteSaver":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    # ---- 读 ----
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        conn = self._readers.get()
+        try:
+            # 一次读取的几条 SELECT 在同一个读事务里，看到的是同一个快照
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            finally:
+                conn.execute("COMMIT")
+        finally:
+            self._readers.put(conn)
+            self._count(reads=1)
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        # SqliteSaver.get_tuple 通过 cursor(transaction=False) 读取，这里换成连接池中的只读连接；
+        # 需要写事务时仍用写连接（后台线程提交时持有同一把锁）
+        if transaction:
+            with super().cursor(transaction=True) as cur:
+                yield cur
+            return
+        with self._reader() as conn:
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        # SqliteSaver.list 在写连接上开第二个游标读 writes，这里改为在只读连接上一次取完再反序列化
+        where, params = search_where(config, filter, before)
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata "
+            f"FROM checkpoints {where} ORDER BY checkpoint_id DESC"
+        )
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (*params, limit)
+        with self._reader() as conn:
+            rows = [
+                (row, conn.execute(_SELECT_WRITES, (row[0], row[1], row[2])).fetchall())
+                for row in conn.execute(query, params).fetchall()
+            ]
+        for (thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, checkpoint, metadata), writes in rows:
+            yield CheckpointTuple(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+                self.serde.loads_typed((type_, checkpoint)),
+                json.loads(metadata) if metadata is not None else {},
+                (
+                    {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                    if parent_id
+                    else None
+                ),
+                [(task_id, channel, self.serde.loads_typed((t, value))) for task_id, channel, t, value in writes],
+            )
+
+    # ---- 写 ----
+
+    def _submit(self, statements: _Statements) -> Future:
+        if self._closed:
+            raise RuntimeError("PooledSqliteSaver 已关闭")
+        future: Future = Future()
+        self._queue.put((statements, future))
+        return future
+
+    def _run_writer(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            # 等待上一次提交期间到达的写入一起提交
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch: Sequence[tuple[_Statements, Future]]) -> None:
+        try:
+            with self.lock:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for statements, _ in batch:
+                        for sql, params, many in statements:
+                            if many:
+                                self.conn.executemany(sql, params)
+                            else:
+                                self.conn.execute(sql, params)
+                    self.conn.execute("COMMIT")
+                except BaseException:
+                    if self.conn.in_transaction:
+                        self.conn.execute("ROLLBACK")
+                    raise
+        except Exception as e:
+            if len(batch) == 1:
+                self._count(failed=1)
+                batch[0][1].set_exception(e)
+                return
+            # 逐个重新提交，找出出错的那个
+            for item in batch:
+                self._commit([item])
+            return
+        self._count(writes=len(batch), commits=1)
+        with self._stats_lock:
+            self.stats.max_batch = max(self.stats.max_batch, len(batch))
+        for _, future in batch:
+            future.set_result(None)
+
+    def _put_statements(
+        self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata
+    ) -> _Statements:
+        # 与 SqliteSaver.put 的序列化方式相同
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        serialized_metadata = json.dumps(
+            get_checkpoint_metadata(config, metadata), ensure_ascii=False
+        ).encode("utf-8", "ignore")
+        params = (
+            str(config["configurable"]["thread_id"]),
+            config["configurable"]["checkpoint_ns"],
+            checkpoint["id"],
+            config["configurable"].get("checkpoint_id"),
+            type_,
+            serialized_checkpoint,
+            serialized_metadata,
+        )
+        return [(_INSERT_CHECKPOINT, params, False)]
+
+    def _put_writes_statements(
+        self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str
+    ) -> _Statements:
+        sql = _UPSERT_WRITES if all(w[0] in WRITES_IDX_MAP for w in writes) else _INSERT_WRITES
+        rows = [
+            (
+                str(config["configurable"]["thread_id"]),
+                str(config["configurable"]["checkpoint_ns"]),
+                str(config["configurable"]["checkpoint_id"]),
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self.serde.dumps_typed(value),
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        return [(sql, rows, True)]
+
+    @staticmethod
+    def _delete_statements(thread_id: str) -> _Statements:
+        return [
+            ("DELETE FROM checkpoints WHERE thread_id = ?", (str(thread_id),), False),
+            ("DELETE FROM writes WHERE thread_id = ?", (str(thread_id),), False),
+        ]
+
+    @staticmethod
+    def _next_config(config: RunnableConfig, checkpoint: Checkpoint) -> RunnableConfig:
+        return {
+            "configurable": {
+                "thread_id": config["configurable"]["thread_id"],
+                "checkpoint_ns": config["configurable"]["checkpoint_ns"],
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        self._submit(self._put_statements(config, checkpoint, metadata)).result()
+        return self._next_config(config, checkpoint)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self._submit(self._put_writes_statements(config, writes, task_id)).result()
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._submit(self._delete_statements(thread_id)).result()
+
+    # ---- 异步：写入等待同一个后台线程，读在线程池中执行 ----
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        await asyncio.wrap_future(self._submit(self._put_statements(config, checkpoint, metadata)))
+        return self._next_config(config, checkpoint)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.wrap_future(self._submit(self._put_writes_statements(config, writes, task_id)))
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.wrap_future(self._submit(self._delete_statements(thread_id)))
@@ -0,0 +1,287 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Literal
+import numpy as np
+from langgraph.config import get_config
+from app.config import settings
+from app.text_features import DEFAULT_DIM, DEFAULT_NGRAM_RANGE, hash_matrix, hash_vector
+
+"""
+问题复杂度路由（app/3/agent.py 的 dynamic_model_selection）：决定用便宜的模型还是强模型回答。
+原来每次模型调用都要先请 LLM 分类一次，工具循环中的每一步都会重复分类同一个问题。ComplexityRouter：
+1. 缓存：按 (thread_id, 最新的用户消息) 缓存结果，同一轮对话中工具循环的后续步骤直接复用，LRU 淘汰
+2. 预分类：依次调用 pre_classifiers（文本 -> "simple" / "complex" / None），能判断时不调用 LLM，
+   默认是 heuristic_complexity（长度 / 关键词规则），可以加上本地模型 ComplexityModel
+3. 回退：调用 judge（LLM 分类），结果可以记录到 decision_log（JSON Lines）用来训练本地模型
+stats 为全部会话的统计，thread_stats(thread_id) 为单个会话的统计，saved 即省下的 LLM 分类次数。
+
+ComplexityModel：字符 n-gram 哈希特征（app.text_features）+ NumPy 实现的逻辑回归，
+用记录下来的 LLM 分类结果离线训练，保存为 .npy（只有一个权重向量，加载和每次判断都在微秒级）。
+
+用法：
+    router = ComplexityRouter(_judge_complexity, _ajudge_complexity, decision_log="decisions.jsonl")
+    complexity = router.decide(user_text, current_thread_id())
+
+    model = ComplexityModel.train(*read_decision_log("decisions.jsonl"))
+    model.save(".cache/complexity_model.npy")
+    router = ComplexityRouter(..., pre_classifiers=(heuristic_complexity, ComplexityModel.load(path).classifier(0.8)))
+"""
+
+Complexity = Literal["simple", "complex"]
+PreClassifier = Callable[[str], Complexity | None]
+
+# 寒暄 / 致谢 / 确认之类的短消息
+_SMALL_TALK = re.compile(
+    r"^(谢谢|多谢|感谢|thanks?( you)?|thx|好的?|嗯|ok|okay|你好|您好|hi|hello|hey|再见|拜拜|bye|在吗)[\s!！.。~～?？]*$",
+    re.IGNORECASE,
+)
+# 与 agent.py 中分类 prompt 的 complex 定义对应（方案设计 / 复杂代码 / 调试 / 推导 / 对比权衡），只收录不容易误判的词
+_COMPLEX_KEYWORDS = (
+    "设计", "架构", "方案", "实现一个", "写一个", "代码", "调试", "debug", "报错", "推导", "证明",
+    "对比", "权衡", "优缺点", "重构",
+)
+
+
+def heuristic_complexity(text: str, max_simple_length: int = 12, min_complex_length: int = 300) -> Complexity | None:
+    """长度 / 关键词规则：寒暄和很短的消息为 simple，很长、带代码或命中复杂任务关键词的为 complex，其它返回 None"""
+    stripped = text.strip()
+    if _SMALL_TALK.match(stripped):
+        return "simple"
+    if "```" in stripped or len(stripped) >= min_complex_length:
+        return "complex"
+    lowered = stripped.lower()
+    if any(keyword in lowered for keyword in _COMPLEX_KEYWORDS):
+        return "complex"
+    if len(stripped) <= max_simple_length and not any(c.isdigit() for c in stripped):
+        return "simple"
+    return None
+
+
+def current_thread_id() -> str | None:
+    """在 agent / 图的节点中调用时返回当前的 thread_id，不在运行上下文中时返回 None"""
+    try:
+        config = get_config()
+    except RuntimeError:
+        return None
+    thread_id = config.get("configurable", {}).get("thread_id")
+    return None if thread_id is None else str(thread_id)
+
+
+@dataclass
+class RouterStats:
+    decisions: int = 0  # 需要路由的次数（每次模型调用一次）
+    cached: int = 0
+    pre_classified: int = 0
+    llm: int = 0
+
+    @property
+    def saved(self) -> int:
+        """省下的 LLM 分类次数"""
+        return self.decisions - self.llm
+
+
+class ComplexityRouter:
+    """
+    Args:
+        judge / ajudge: LLM 分类（同步 / 异步），ajudge 为 None 时异步调用也使用 judge
+        pre_classifiers: 依次尝试的本地分类器，返回 None 表示无法判断
+        max_size: 缓存的决策数，0 表示不缓存；也是保留统计的会话数
+        decision_log: 记录 LLM 分类结果的 JSON Lines 文件（{"text": ..., "label": ...}），None 表示不记录
+    """
+
+    def __init__(
+        self,
+        judge: Callable[[str], Complexity],
+        ajudge: Callable[[str], Awaitable[Complexity]] | None = None,
+        pre_classifiers: Sequence[PreClassifier] = (heuristic_complexity,),
+        max_size: int = 4096,
+        decision_log: str | os.PathLike | None = None,
+    ) -> None:
+        self.judge = judge
+        self.ajudge = ajudge
+        self.pre_classifiers = list(pre_classifiers)
+        self.max_size = max_size
+        self.decision_log = Path(decision_log) if decision_log else None
+        self.stats = RouterStats()
+        self._threads: OrderedDict[str | None, RouterStats] = OrderedDict()
+        self._cache: OrderedDict[tuple[str | None, str], Complexity] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def thread_stats(self, thread_id: str | None) -> RouterStats:
+        with self._lock:
+            return self._threads.get(thread_id) or RouterStats()
+
+    def _record(self, thread_id: str | None, name: str) -> None:
+        with self._lock:
+            thread = self._threads.get(thread_id)
+            if thread is None:
+                thread = self._threads[thread_id] = RouterStats()
+                while len(self._threads) > max(self.max_size, 1):
+                    self._threads.popitem(last=False)
+            for stats in (self.stats, thread):
+                stats.decisions += 1
+                setattr(stats, name, getattr(stats, name) + 1)
+
+    def _lookup(self, thread_id: str | None, user_text: str) -> Complexity | None:
+        with self._lock:
+            found = self._cache.get((thread_id, user_text))
+            if found is not None:
+                self._cache.move_to_end((thread_id, user_text))
+        if found is not None:
+            self._record(thread_id, "cached")
+            return found
+        for classify in self.pre_classifiers:
+            found = classify(user_text)
+            if found is not None:
+                self._store(thread_id, user_text, found)
+                self._record(thread_id, "pre_classified")
+                return found
+        return None
+
+    def _store(self, thread_id: str | None, user_text: str, complexity: Complexity) -> None:
+        if not self.max_size:
+            return
+        with self._lock:
+            self._cache[(thread_id, user_text)] = complexity
+            self._cache.move_to_end((thread_id, user_text))
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def _log(self, user_text: str, complexity: Complexity) -> None:
+        if self.decision_log is None:
+            return
+        line = json.dumps({"text": user_text, "label": complexity, "time": time.time()}, ensure_ascii=False)
+        with self._lock:
+            self.decision_log.parent.mkdir(parents=True, exist_ok=True)
+            with self.decision_log.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def decide(self, user_text: str, thread_id: str | None = None) -> Complexity:
+        found = self._lookup(thread_id, user_text)
+        if found is not None:
+            return found
+        complexity = self.judge(user_text)
+        self._log(user_text, complexity)
+        self._store(thread_id, user_text, complexity)
+        self._record(thread_id, "llm")
+        return complexity
+
+    async def adecide(self, user_text: str, thread_id: str | None = None) -> Complexity:
+        found = self._lookup(thread_id, user_text)
+        if found is not None:
+            return found
+        complexity = await self.ajudge(user_text) if self.ajudge is not None else self.judge(user_text)
+        self._log(user_text, complexity)
+        self._store(thread_id, user_text, complexity)
+        self._record(thread_id, "llm")
+        return complexity
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+# ---------------- 本地模型 ----------------
+
+def read_decision_log(path: str | os.PathLike) -> tuple[list[str], list[Complexity]]:
+    """读取 decision_log，同一个问题以最后一次的结果为准"""
+    decisions: dict[str, Complexity] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                decisions[record["text"]] = record["label"]
+    return list(decisions), list(decisions.values())
+
+
+class ComplexityModel:
+    """字符 n-gram 哈希特征上的逻辑回归，predict_proba 返回 complex 的概率"""
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: float,
+        dim: int = DEFAULT_DIM,
+        ngram_range: tuple[int, int] = DEFAULT_NGRAM_RANGE,
+    ) -> None:
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.dim = dim
+        self.ngram_range = tuple(ngram_range)
+
+    @classmethod
+    def train(
+        cls,
+        texts: Sequence[str],
+        labels: Sequence[Complexity],
+        dim: int = DEFAULT_DIM,
+        ngram_range: tuple[int, int] = DEFAULT_NGRAM_RANGE,
+        epochs: int = 500,
+        learning_rate: float = 2.0,
+        l2: float = 1e-3,
+    ) -> "ComplexityModel":
+        """全量梯度下降；两个类别按样本数加权，避免 simple 占多数时全部判成 simple"""
+        x = hash_matrix(list(texts), dim, ngram_range)
+        y = np.array([label == "complex" for label in labels], dtype=np.float32)
+        if len(set(y.tolist())) < 2:
+            raise ValueError("training data needs both simple and complex examples")
+        positives = y.sum()
+        sample_weight = np.where(y == 1, len(y) / (2 * positives), len(y) / (2 * (len(y) - positives))).astype(np.float32)
+        weights = np.zeros(dim, dtype=np.float32)
+        bias = 0.0
+        for _ in range(epochs):
+            p = 1 / (1 + np.exp(-(x @ weights + bias)))
+            error = (p - y) * sample_weight / len(y)
+            weights -= learning_rate * (x.T @ error + l2 * weights)
+            bias -= learning_rate * float(error.sum())
+        return cls(weights, bias, dim, ngram_range)
+
+    def predict_proba(self, text: str) -> float:
+        z = float(hash_vector(text, self.dim, self.ngram_range) @ self.weights) + self.bias
+        return float(1 / (1 + np.exp(-z)))
+
+    def predict(self, text: str) -> Complexity:
+        return "complex" if self.predict_proba(text) >= 0.5 else "simple"
+
+    def classifier(self, threshold: float = 0.8) -> PreClassifier:
+        """作为 ComplexityRouter 的预分类器：概率不够确定（在 1 - threshold 和 threshold 之间）时返回 None"""
+
+        def classify(text: str) -> Complexity | None:
+            p = self.predict_proba(text)
+            if p >= threshold:
+                return "complex"
+            if p <= 1 - threshold:
+                return "simple"
+            return None
+
+        return classify
+
+    def save(self, path: str | os.PathLike) -> None:
+        """保存为单个 .npy 数组：[ngram 下限, ngram 上限, bias, *weights]（比 .npz 少了 zip 解析，加载更快）"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header = np.array([*self.ngram_range, self.bias], dtype=np.float32)
+        with path.open("wb") as f:
+            np.save(f, np.concatenate([header, self.weights]))
+
+    @classmethod
+    def load(cls, path: str | os.PathLike) -> "ComplexityModel":
+        data = np.load(path)
+        lo, hi, bias = data[:3]
+        return cls(data[3:], float(bias), len(data) - 3, (int(lo), int(hi)))
+
+
+def default_pre_classifiers() -> list[PreClassifier]:
+    """heuristic_complexity，以及 COMPLEXITY_MODEL_PATH 存在时的本地模型"""
+    classifiers: list[PreClassifier] = [heuristic_complexity]
+    path = settings.complexity_model_path
+    if path and os.path.exists(path):
+        classifiers.append(ComplexityModel.load(path).classifier(settings.complexity_model_threshold))
+    return classifiers
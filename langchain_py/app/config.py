@@ -1,19 +1,43 @@
+import threading
+from typing import TypeVar
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
 load_dotenv()
 
-class AppSettings(BaseSettings):
+T = TypeVar("T", bound=BaseSettings)
 
+_ENV_CONFIG = SettingsConfigDict(
+    env_file=".env",               # 指定 .env 文件路径
+    env_file_encoding="utf-8",
+    case_sensitive=False,          # 环境变量不区分大小写（推荐）
+    extra="ignore"                 # 忽略未定义的变量
+)
+
+
+class TavilySettings(BaseSettings):
     # Tavily Configuration
     tavily_api_key: str = Field(..., alias='TAVILY_API_KEY')
 
+    model_config = _ENV_CONFIG
+
+
+class SiliconFlowSettings(BaseSettings):
     # SiliconFlow Configuration
     siliconflow_base_url: str = Field(..., alias='SILICONFLOW_BASE_URL')
     siliconflow_api_key: str = Field(..., alias='SILICONFLOW_API_KEY')
+
+    model_config = _ENV_CONFIG
+
+
+class DeepSeekSettings(BaseSettings):
     deepseek_api_key: str = Field(..., alias='DEEPSEEK_API_KEY')
 
+    model_config = _ENV_CONFIG
+
+
+class ModelNameSettings(BaseSettings):
     # Model Names
     ds_model: str = Field(..., alias='DS_MODEL')
     dsr1_model: str = Field(..., alias='DSR1_MODEL')
@@ -22,6 +46,10 @@ class AppSettings(BaseSettings):
 
     embedding_model: str = Field(..., alias='EMBEDDING_MODEL')
 
+    model_config = _ENV_CONFIG
+
+
+class MilvusSettings(BaseSettings):
     # Milvus Configuration
     milvus_address: str = Field(..., alias='MILVUS_ADDRESS')
     milvus_username: str = Field(..., alias='MILVUS_USERNAME')
@@ -30,22 +58,157 @@ class AppSettings(BaseSettings):
     milvus_metric_type: str = Field(..., alias='MILVUS_METRIC_TYPE')
     milvus_index_type: str = Field(..., alias='MILVUS_INDEX_TYPE')
 
+    model_config = _ENV_CONFIG
 
 
-    # langsmith 
+class LangSmithSettings(BaseSettings):
+    # langsmith
     LANGSMITH_TRACING: bool = Field(..., alias='LANGSMITH_TRACING')
     LANGCHAIN_TRACING_V2: bool = Field(..., alias='LANGCHAIN_TRACING_V2')
     LANGSMITH_ENDPOINT: str = Field(..., alias='LANGSMITH_ENDPOINT')
     LANGSMITH_API_KEY: str = Field(..., alias='LANGSMITH_API_KEY')
     LANGSMITH_PROJECT: str = Field(..., alias='LANGSMITH_PROJECT')
 
+    model_config = _ENV_CONFIG
+
+
+class HttpPoolSettings(BaseSettings):
+    # 所有模型客户端共享的 HTTP 连接池（均有默认值，可不配置）
+    http_max_connections: int = Field(100, alias='HTTP_MAX_CONNECTIONS')
+    http_max_keepalive_connections: int = Field(100, alias='HTTP_MAX_KEEPALIVE_CONNECTIONS')
+    http_keepalive_expiry: float = Field(30.0, alias='HTTP_KEEPALIVE_EXPIRY')
+    http2: bool = Field(True, alias='HTTP2')
+
+    model_config = _ENV_CONFIG
+
+
+class LLMCacheSettings(BaseSettings):
+    # LLM 响应缓存（默认关闭；temperature 较高、需要多样输出的场景不要开启）
+    llm_cache_enabled: bool = Field(False, alias='LLM_CACHE_ENABLED')
+    llm_cache_path: str = Field('.cache/llm_cache.sqlite', alias='LLM_CACHE_PATH')
+    llm_cache_ttl: float = Field(7 * 24 * 3600, alias='LLM_CACHE_TTL')  # 秒，0 表示不过期
+    llm_cache_max_entries: int = Field(10_000, alias='LLM_CACHE_MAX_ENTRIES')
+    llm_cache_max_bytes: int = Field(256 * 1024 * 1024, alias='LLM_CACHE_MAX_BYTES')
+    # 语义缓存（进程内，按最后一条用户消息的 embedding 相似度匹配；开启后代替上面的精确匹配缓存）
+    llm_semantic_cache_enabled: bool = Field(False, alias='LLM_SEMANTIC_CACHE_ENABLED')
+    llm_semantic_cache_threshold: float = Field(0.9, alias='LLM_SEMANTIC_CACHE_THRESHOLD')
+    # registry 中的 embedding 逻辑名，或 "hashing"（本地字符 n-gram，见 app/text_features.py）
+    llm_semantic_cache_embedding: str = Field('embedding', alias='LLM_SEMANTIC_CACHE_EMBEDDING')
+    # 分区数、所有分区合计条数的上限，超出时按 LRU 淘汰整个分区
+    llm_semantic_cache_max_partitions: int = Field(1000, alias='LLM_SEMANTIC_CACHE_MAX_PARTITIONS')
+    llm_semantic_cache_max_entries: int = Field(100_000, alias='LLM_SEMANTIC_CACHE_MAX_ENTRIES')
+
+    model_config = _ENV_CONFIG
+
+
+class LLMCoalesceSettings(BaseSettings):
+    # 合并并发的相同请求（single-flight），默认关闭。开启后也只合并 temperature=0 的调用，
+    # 采样（temperature > 0）的调用各自得到独立的回答
+    llm_coalesce_enabled: bool = Field(False, alias='LLM_COALESCE_ENABLED')
 
+    model_config = _ENV_CONFIG
 
-    model_config = SettingsConfigDict(
-        env_file=".env",               # 指定 .env 文件路径
-        env_file_encoding="utf-8",
-        case_sensitive=False,          # 环境变量不区分大小写（推荐）
-        extra="ignore"                 # 忽略未定义的变量
+
+class ComplexityRouterSettings(BaseSettings):
+    # dynamic_model_selection 的本地复杂度分类器（app/complexity.py），模型文件不存在时只用启发式规则 + LLM
+    complexity_model_path: str = Field('.cache/complexity_model.npy', alias='COMPLEXITY_MODEL_PATH')
+    # 本地模型的概率达到该值（或低于 1 - 该值）时直接采用，否则交给 LLM；0.5 表示完全替代 LLM
+    complexity_model_threshold: float = Field(0.8, alias='COMPLEXITY_MODEL_THRESHOLD')
+    # 记录 LLM 的分类结果（JSON Lines），用于训练本地分类器；为空表示不记录
+    complexity_decision_log: str = Field('', alias='COMPLEXITY_DECISION_LOG')
+
+    model_config = _ENV_CONFIG
+
+
+class LLMResilienceSettings(BaseSettings):
+    # app/resilience.py 的 ResilientModelMiddleware：单次模型调用的超时、一轮对话的总时限（秒）
+    llm_call_timeout: float = Field(30.0, alias='LLM_CALL_TIMEOUT')
+    agent_turn_timeout: float = Field(120.0, alias='AGENT_TURN_TIMEOUT')
+    # 可重试的错误（超时、连接错误、429、5xx）的重试次数
+    llm_max_retries: int = Field(2, alias='LLM_MAX_RETRIES')
+    # 连续失败该次数后熔断，熔断期间改用备用模型，LLM_CIRCUIT_RESET_TIMEOUT 秒后放行一次探测请求
+    llm_circuit_failure_threshold: int = Field(5, alias='LLM_CIRCUIT_FAILURE_THRESHOLD')
+    llm_circuit_reset_timeout: float = Field(30.0, alias='LLM_CIRCUIT_RESET_TIMEOUT')
+
+    model_config = _ENV_CONFIG
+
+
+class TracingSettings(BaseSettings):
+    # app/tracing.py：示例模块的跟踪（代替 set_debug(True)），off / summary / full / debug（原来的同步打印）
+    trace_verbosity: str = Field('summary', alias='TRACE_VERBOSITY')
+    # 按模块覆盖，如 "app.3.agent=full,app.2.tool_calling=off"
+    trace_module_verbosity: str = Field('', alias='TRACE_MODULE_VERBOSITY')
+    # 头部采样的比例；耗时超过 TRACE_SLOW_THRESHOLD 秒（0 表示不按耗时保留）或出错的对话总是保留
+    trace_sample_rate: float = Field(0.01, alias='TRACE_SAMPLE_RATE')
+    trace_slow_threshold: float = Field(10.0, alias='TRACE_SLOW_THRESHOLD')
+    trace_path: str = Field('.cache/traces.jsonl', alias='TRACE_PATH')
+    trace_buffer_size: int = Field(10_000, alias='TRACE_BUFFER_SIZE')
+    trace_flush_interval: float = Field(1.0, alias='TRACE_FLUSH_INTERVAL')
+
+    model_config = _ENV_CONFIG
+
+
+class CheckpointSettings(BaseSettings):
+    # app/checkpoint_memory.py 的 default_checkpointer()：内存中最多保留的 thread 数、每个 thread 的 checkpoint 数、
+    # 估算的总字节数，超出时按 LRU 淘汰 thread（0 表示不限制）
+    checkpoint_max_threads: int = Field(10_000, alias='CHECKPOINT_MAX_THREADS')
+    checkpoint_max_per_thread: int = Field(20, alias='CHECKPOINT_MAX_PER_THREAD')
+    checkpoint_max_bytes: int = Field(256 * 1024 * 1024, alias='CHECKPOINT_MAX_BYTES')
+    # 被淘汰的 thread 写入这个 SQLite 文件，再次访问时读回；为空表示直接丢弃
+    checkpoint_spill_path: str = Field('', alias='CHECKPOINT_SPILL_PATH')
+    # app/checkpoint_serde.py 的 default_serde()：checkpoint 的压缩方式（zstd / zlib / none），
+    # 以及 train_dictionary() 训练的共享字典文件（多个用逗号分隔，第一个用于写入，其余的用于读取旧数据）
+    checkpoint_compression: str = Field('zstd', alias='CHECKPOINT_COMPRESSION')
+    checkpoint_dictionary_path: str = Field('', alias='CHECKPOINT_DICTIONARY_PATH')
+
+    model_config = _ENV_CONFIG
+
+
+class AppSettings:
+    """
+    按分组懒加载的配置。
+    首次访问某个字段时才读取并校验它所在的分组，例如只用到模型的 worker 不需要配置 Milvus、LangSmith。
+    """
+
+    sections: tuple[type[BaseSettings], ...] = (
+        TavilySettings,
+        SiliconFlowSettings,
+        DeepSeekSettings,
+        ModelNameSettings,
+        MilvusSettings,
+        LangSmithSettings,
+        HttpPoolSettings,
+        LLMCacheSettings,
+        LLMCoalesceSettings,
+        ComplexityRouterSettings,
+        LLMResilienceSettings,
+        TracingSettings,
+        CheckpointSettings,
     )
 
+    def __init__(self) -> None:
+        self._loaded: dict[type[BaseSettings], BaseSettings] = {}
+        self._lock = threading.Lock()
+        # 字段名 -> 所在分组
+        self._field_to_section = {
+            name: section for section in self.sections for name in section.model_fields
+        }
+
+    def section(self, section: type[T]) -> T:
+        """获取（并在首次访问时校验）某个配置分组"""
+        loaded = self._loaded.get(section)
+        if loaded is None:
+            with self._lock:
+                loaded = self._loaded.get(section)
+                if loaded is None:
+                    loaded = self._loaded[section] = section()
+        return loaded  # type: ignore[return-value]
+
+    def __getattr__(self, name: str):
+        section = self.__dict__.get("_field_to_section", {}).get(name)
+        if section is None:
+            raise AttributeError(f"'AppSettings' object has no attribute '{name}'")
+        return getattr(self.section(section), name)
+
+
 settings = AppSettings()
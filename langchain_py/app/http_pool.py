@@ -0,0 +1,91 @@
+import asyncio
+import importlib.util
+import threading
+import weakref
+import httpx
+from app.config import settings
+
+"""
+共享 HTTP 连接池：项目中创建的所有 ChatOpenAI / OpenAIEmbeddings 共用同一组 httpx 客户端，
+避免每个客户端各自维护连接池、重复 TLS 握手。
+参数见 app.config.HttpPoolSettings（HTTP_MAX_CONNECTIONS 等环境变量）。
+"""
+
+_sync_client: httpx.Client | None = None
+_async_client: httpx.AsyncClient | None = None
+_lock = threading.Lock()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+
+
+def _http2_enabled() -> bool:
+    # HTTP/2 需要安装 h2（uv add "httpx[http2]"），没有安装时回退到 HTTP/1.1
+    return settings.http2 and importlib.util.find_spec("h2") is not None
+
+
+class _PerLoopTransport(httpx.AsyncBaseTransport):
+    """
+    异步连接与事件循环绑定，每个事件循环使用独立的连接池，
+    这样同一个 AsyncClient 可以在多次 asyncio.run() 之间安全复用。
+    """
+
+    def __init__(self, **transport_kwargs) -> None:
+        self._transport_kwargs = transport_kwargs
+        self._transports: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            transport = self._transports[loop] = httpx.AsyncHTTPTransport(**self._transport_kwargs)
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+def get_http_client() -> httpx.Client:
+    """全局共享的同步客户端"""
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(
+                    transport=httpx.HTTPTransport(limits=_limits(), http2=_http2_enabled()),
+                )
+    return _sync_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """全局共享的异步客户端"""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = httpx.AsyncClient(
+                    transport=_PerLoopTransport(limits=_limits(), http2=_http2_enabled()),
+                )
+    return _async_client
+
+
+def close() -> None:
+    """关闭同步连接池（异步连接池随事件循环一起释放）。之后需要调用 app.registry.clear() 重新创建模型"""
+    global _sync_client, _async_client
+    with _lock:
+        if _sync_client is not None:
+            _sync_client.close()
+        _sync_client = None
+        _async_client = None
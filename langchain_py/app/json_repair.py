@@ -0,0 +1,239 @@
+import re
+import threading
+import typing
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Generic, TypeVar
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import BaseOutputParser, PydanticOutputParser
+from pydantic import BaseModel, PrivateAttr, RootModel, ValidationError
+from app.structured_stream import PartialJSONParser
+
+"""
+本地修复格式有问题的结构化输出，修不好时才重新调用 LLM（原来一次解析失败就要多一次完整的模型调用）。
+repair_json 依次处理：
+- code_fence：```json ... ``` 代码块
+- leading_prose / trailing_prose：JSON 前后的说明文字
+- single_quotes：单引号字符串（Python repr 风格）
+- python_literals：True / False / None
+- trailing_commas：} 或 ] 前多余的逗号
+- truncated：输出被截断（max_tokens），丢掉最后一个不完整的值并补全括号
+- unwrap_object：目标是列表但输出是只有一个列表字段的对象（{"steps": [...]}）
+- list_lines：目标是列表但输出是逐行 / 编号列表（"1. 需求分析"），去掉编号和引导语后组成列表
+修复后的结果仍要通过目标 Pydantic schema 的校验，不会编造缺失的字段。
+
+用法：
+    parser = RepairingOutputParser(pydantic_object=DevProcessList, retry_model=model)
+    chain = prompt | model | parser
+    parser.stats   # strict / repaired / retries / failed，repaired 即省下的重试次数
+"""
+
+T = TypeVar("T", bound=BaseModel)
+
+_FENCE = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)(?:```|$)", re.S)
+_LIST_ITEM = re.compile(r"^\s*(?:\d+\s*[.、)）]|[-*•·])\s*")
+_LIST_SPLIT = re.compile(r"[,，、;；]")
+
+
+def _normalize(text: str) -> tuple[str, list[str]]:
+    """单引号字符串转双引号、Python 字面量转 JSON、去掉多余的逗号（只处理字符串之外的部分）"""
+    out: list[str] = []
+    fixes: set[str] = set()
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if c == '"':
+            j = i + 1
+            while j < n and text[j] != '"':
+                j += 2 if text[j] == "\\" else 1
+            out.append(text[i:j + 1])
+            i = j + 1
+        elif c == "'":
+            j, chars = i + 1, []
+            while j < n and text[j] != "'":
+                if text[j] == "\\" and j + 1 < n:
+                    chars.append(text[j + 1] if text[j + 1] == "'" else text[j:j + 2])
+                    j += 2
+                    continue
+                chars.append('\\"' if text[j] == '"' else text[j])
+                j += 1
+            out.append('"' + "".join(chars) + ('"' if j < n else ""))
+            fixes.add("single_quotes")
+            i = j + 1
+        elif c == ",":
+            j = i + 1
+            while j < n and text[j] in " \t\r\n":
+                j += 1
+            if j < n and text[j] in "}]":
+                fixes.add("trailing_commas")
+            else:
+                out.append(c)
+            i += 1
+        elif c.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            literal = {"True": "true", "False": "false", "None": "null"}.get(word)
+            if literal:
+                fixes.add("python_literals")
+            out.append(literal or word)
+            i = j
+        else:
+            out.append(c)
+            i += 1
+    return "".join(out), sorted(fixes)
+
+
+def _list_lines(text: str) -> list[str] | None:
+    """逐行 / 编号列表转成字符串列表，去掉编号和以冒号结尾的引导语"""
+    lines = [line.strip() for line in text.strip().splitlines() if line.strip()]
+    if len(lines) == 1:
+        lines = [part.strip() for part in _LIST_SPLIT.split(lines[0]) if part.strip()]
+    numbered = [line for line in lines if _LIST_ITEM.match(line)]
+    if numbered:
+        lines = numbered
+    items = [_LIST_ITEM.sub("", line).strip().strip("\"'") for line in lines if not line.endswith((":", "："))]
+    return [item for item in items if item] or None
+
+
+def repair_json(text: str, expect_list: bool = False) -> tuple[Any, list[str]]:
+    """
+    尽量从 text 中取出 JSON 值，返回 (值, 用到的修复)；取不出时抛出 ValueError。
+    expect_list：目标是列表，找不到 JSON 时按逐行 / 编号列表处理
+    """
+    fixes: list[str] = []
+    # 末尾的空白不去掉：被截断时数字 / 字面量之后有空白才说明它是完整的
+    body = text.lstrip()
+    fence = _FENCE.search(body)
+    if fence:
+        body = fence.group(1).lstrip()
+        fixes.append("code_fence")
+    start = min((i for i in (body.find("{"), body.find("[")) if i >= 0), default=-1)
+    if start >= 0:
+        if body[:start].strip():
+            fixes.append("leading_prose")
+        # 先按原文解析，失败时再替换字符串之外的单引号 / 字面量 / 逗号（避免 JSON 之后的说明文字影响判断）
+        json_text, normalize_fixes = body[start:], []
+        parser = _feed(json_text)
+        if parser is None:
+            json_text, normalize_fixes = _normalize(json_text)
+            parser = _feed(json_text)
+        if parser is not None:
+            fixes += normalize_fixes
+            if not parser.done:
+                fixes.append("truncated")
+            elif json_text[parser.consumed:].strip():
+                fixes.append("trailing_prose")
+            value = parser.value
+            if expect_list and isinstance(value, dict) and len(value) == 1 and isinstance([*value.values()][0], list):
+                value = [*value.values()][0]
+                fixes.append("unwrap_object")
+            return value, fixes
+    if expect_list:
+        items = _list_lines(body)
+        if items:
+            return items, [*fixes, "list_lines"]
+    raise ValueError("no JSON value found")
+
+
+def _feed(text: str) -> PartialJSONParser | None:
+    parser = PartialJSONParser()
+    try:
+        parser.feed(text)
+    except ValueError:
+        return None
+    return parser
+
+
+def _is_list_schema(schema: type[BaseModel]) -> bool:
+    return issubclass(schema, RootModel) and typing.get_origin(schema.model_fields["root"].annotation) is list
+
+
+@dataclass
+class RepairStats:
+    strict: int = 0  # 原样就能解析
+    repaired: int = 0  # 本地修复成功（即省下的重试次数）
+    retries: int = 0  # 本地修复失败，重新调用 LLM 的次数
+    failed: int = 0
+    fixes: Counter = field(default_factory=Counter)  # 各种修复被用到的次数
+
+    @property
+    def saved_ratio(self) -> float:
+        """需要修复的输出中，不用重试的比例"""
+        broken = self.repaired + self.retries + self.failed
+        return self.repaired / broken if broken else 0.0
+
+
+_RETRY_PROMPT = """下面的输出不符合要求的格式，请修正后只返回符合格式的内容。
+格式要求：
+{instructions}
+
+原输出：
+{completion}
+
+错误：
+{error}"""
+
+
+class RepairingOutputParser(BaseOutputParser[T], Generic[T]):
+    """
+    解析为 pydantic_object：先严格解析，失败时本地修复，仍失败且提供了 retry_model 时才请 LLM 修正
+    Args:
+        pydantic_object: 目标 schema
+        retry_model: 本地修复失败时用来修正输出的模型，None 表示直接抛出 OutputParserException
+        max_retries: 最多重试次数
+    """
+
+    pydantic_object: type[T]
+    retry_model: BaseChatModel | None = None
+    max_retries: int = 1
+    _stats: RepairStats = PrivateAttr(default_factory=RepairStats)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def stats(self) -> RepairStats:
+        return self._stats
+
+    @property
+    def _type(self) -> str:
+        return "repairing_pydantic"
+
+    def get_format_instructions(self) -> str:
+        return PydanticOutputParser(pydantic_object=self.pydantic_object).get_format_instructions()
+
+    def record(self, name: str, fixes: list[str] = ()) -> None:
+        """计入 stats（自己处理重试的调用方用，如 app.structured_response）"""
+        with self._lock:
+            setattr(self._stats, name, getattr(self._stats, name) + 1)
+            self._stats.fixes.update(fixes)
+
+    def try_parse(self, text: str) -> tuple[T | None, list[str] | None, Exception | None]:
+        """(结果, 用到的修复, 错误)；严格解析成功时修复为空列表，失败时结果为 None"""
+        try:
+            return self.pydantic_object.model_validate_json(text), [], None
+        except ValidationError:
+            pass
+        try:
+            value, fixes = repair_json(text, expect_list=_is_list_schema(self.pydantic_object))
+            return self.pydantic_object.model_validate(value), fixes, None
+        except (ValueError, ValidationError) as e:
+            return None, None, e
+
+    def parse(self, text: str) -> T:
+        result, fixes, error = self.try_parse(text)
+        if result is not None:
+            self.record("repaired" if fixes else "strict", fixes)
+            return result
+        for _ in range(self.max_retries if self.retry_model is not None else 0):
+            self.record("retries")
+            prompt = _RETRY_PROMPT.format(instructions=self.get_format_instructions(), completion=text, error=error)
+            text = self.retry_model.invoke(prompt).text
+            result, fixes, error = self.try_parse(text)
+            if result is not None:
+                with self._lock:
+                    self._stats.fixes.update(fixes)
+                return result
+        self.record("failed")
+        raise OutputParserException(f"Failed to parse {self.pydantic_object.__name__}: {error}", llm_output=text)
@@ -0,0 +1,301 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass, field
+from typing import Any
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from app.singleflight import bypass
+
+"""
+按延迟选择模型 + 对冲请求（hedged request）：
+- ModelHealth 按模型记录延迟和错误率的 EWMA，以及最近的延迟样本（用于 p95）
+- LatencyRoutingMiddleware 在可选的模型（eligible(request) 给出，按偏好排序）中选最健康的：
+  score = 延迟 EWMA × (1 + error_penalty × 错误率 EWMA)，还没有样本或样本已经过期（stale_after）的模型排在前面重新探测，
+  分数相同时保持 eligible 的顺序
+- 对冲：首选模型超过它的 p95 延迟（限制在 [min_hedge_delay, max_hedge_delay] 内）还没返回时，
+  向第二个模型（只有一个可选模型时就是同一个模型）再发一次相同的请求，先返回的结果生效，另一个取消；
+  首选模型报错时立即改用第二个模型
+取消：异步（ainvoke / astream）时取消 task，进行中的 HTTP 请求立即断开；
+同步时请求在线程中执行，无法强制停止，落后的请求仍会在后台执行完（结果丢弃，但计入该模型的延迟统计）；
+对冲的等待时间从首选请求开始执行时算起，并发的对话数超过 max_workers 时在线程池里排队的时间不计入。
+
+用法：
+    routing = LatencyRoutingMiddleware(lambda request: [ds_model(), glm_model()])
+    agent = create_agent(glm_model(), middleware=[routing])
+    routing.health.snapshot()   # 各模型的延迟 / 错误率 / p95
+"""
+
+
+def model_key(model: BaseChatModel) -> str:
+    return getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__
+
+
+def submit_started(pool: ContextThreadPoolExecutor, fn: Callable, *args: Any) -> tuple[Future, threading.Event]:
+    """提交到线程池，返回 (future, fn 开始执行时 set 的 Event)，用于从开始执行而不是提交时开始计时"""
+    started = threading.Event()
+
+    def run() -> Any:
+        started.set()
+        return fn(*args)
+
+    return pool.submit(run), started
+
+
+@dataclass
+class _ModelStats:
+    latency: float | None = None  # EWMA，秒
+    error_rate: float = 0.0  # EWMA
+    calls: int = 0
+    errors: int = 0
+    last_seen: float = 0.0
+    samples: deque = field(default_factory=lambda: deque(maxlen=200))
+
+
+class ModelHealth:
+    """
+    Args:
+        alpha: EWMA 的平滑系数，越大越看重最近的调用
+        window: 计算 p95 的最近样本数
+    """
+
+    def __init__(self, alpha: float = 0.2, window: int = 200) -> None:
+        self.alpha = alpha
+        self.window = window
+        self._models: dict[str, _ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> _ModelStats:
+        stats = self._models.get(key)
+        if stats is None:
+            stats = self._models[key] = _ModelStats(samples=deque(maxlen=self.window))
+        return stats
+
+    def record(self, key: str, latency: float, error: bool = False) -> None:
+        with self._lock:
+            stats = self._get(key)
+            stats.calls += 1
+            stats.errors += error
+            stats.last_seen = time.monotonic()
+            stats.error_rate += self.alpha * (float(error) - stats.error_rate)
+            if not error:
+                stats.samples.append(latency)
+                stats.latency = latency if stats.latency is None else stats.latency + self.alpha * (latency - stats.latency)
+
+    def score(self, key: str, error_penalty: float = 4.0, stale_after: float | None = None) -> float:
+        """越小越好；没有延迟样本或样本过期时为 0（优先探测）"""
+        with self._lock:
+            stats = self._models.get(key)
+            if stats is None or stats.latency is None:
+                return 0.0
+            if stale_after is not None and time.monotonic() - stats.last_seen > stale_after:
+                return 0.0
+            return stats.latency * (1 + error_penalty * stats.error_rate)
+
+    def quantile(self, key: str, q: float = 0.95, min_samples: int = 20) -> float | None:
+        """最近样本的分位数，样本不足时返回 None"""
+        with self._lock:
+            stats = self._models.get(key)
+            if stats is None or len(stats.samples) < min_samples:
+                return None
+            ordered = sorted(stats.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> dict[str, dict[str, float | int | None]]:
+        with self._lock:
+            keys = list(self._models)
+        result = {}
+        for key in keys:
+            with self._lock:
+                stats = self._models[key]
+                row = {"calls": stats.calls, "errors": stats.errors, "latency_ewma": stats.latency, "error_rate": stats.error_rate}
+            row["p95"] = self.quantile(key, min_samples=1)
+            result[key] = row
+        return result
+
+
+@dataclass
+class RoutingStats:
+    calls: int = 0
+    hedged: int = 0  # 发出了对冲请求的调用
+    hedge_wins: int = 0  # 最终使用了对冲 / 故障转移请求的结果
+    failovers: int = 0  # 首选模型报错后改用第二个模型
+    cancelled: int = 0  # 被取消（异步）或丢弃（同步）的落后请求
+
+
+class LatencyRoutingMiddleware(AgentMiddleware):
+    """
+    Args:
+        eligible: request -> 可以回答该请求的模型（按偏好排序），如简单问题 [ds, glm]、复杂问题 [glm]；返回空时使用 request.model
+        aeligible: eligible 的异步版本（如需要请 LLM 判断复杂度），为 None 时异步调用也使用 eligible
+        hedge: 是否发出对冲请求
+        hedge_quantile: 对冲的等待时间取首选模型延迟的该分位数
+        min_hedge_delay / max_hedge_delay: 对冲等待时间的范围（秒）
+        default_hedge_delay: 首选模型的延迟样本少于 min_samples 时的对冲等待时间（秒）
+        error_penalty: 错误率对分数的放大系数
+        stale_after: 超过该时间（秒）没有调用的模型重新探测，None 表示不过期
+        health: 共享的 ModelHealth（多个 agent 共用同一份统计）
+        max_workers: 同步调用时同时执行的请求数（线程池大小）
+    """
+
+    def __init__(
+        self,
+        eligible: Callable[[ModelRequest], Sequence[BaseChatModel]],
+        aeligible: Callable[[ModelRequest], Awaitable[Sequence[BaseChatModel]]] | None = None,
+        hedge: bool = True,
+        hedge_quantile: float = 0.95,
+        min_hedge_delay: float = 0.2,
+        max_hedge_delay: float = 10.0,
+        default_hedge_delay: float = 2.0,
+        min_samples: int = 20,
+        error_penalty: float = 4.0,
+        stale_after: float | None = 60.0,
+        health: ModelHealth | None = None,
+        max_workers: int = 64,
+    ) -> None:
+        super().__init__()
+        self.eligible = eligible
+        self.aeligible = aeligible
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.error_penalty = error_penalty
+        self.stale_after = stale_after
+        self.health = health or ModelHealth()
+        self.stats = RoutingStats()
+        self._pool = ContextThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedged-model")
+        self._lock = threading.Lock()
+
+    def _count(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def rank(self, models: Sequence[BaseChatModel]) -> list[BaseChatModel]:
+        """按分数从好到差排序（稳定排序，分数相同时保持原来的偏好顺序）"""
+        return sorted(models, key=lambda m: self.health.score(model_key(m), self.error_penalty, self.stale_after))
+
+    def _plan(
+        self, request: ModelRequest, eligible: Sequence[BaseChatModel]
+    ) -> tuple[BaseChatModel, BaseChatModel | None, float]:
+        """(首选模型, 对冲 / 故障转移的模型, 对冲前等待的秒数)"""
+        models = self.rank(eligible or [request.model])
+        primary = models[0]
+        backup = models[1] if len(models) > 1 else (primary if self.hedge else None)
+        p = self.health.quantile(model_key(primary), self.hedge_quantile, self.min_samples)
+        delay = self.default_hedge_delay if p is None else min(max(p, self.min_hedge_delay), self.max_hedge_delay)
+        return primary, backup, delay
+
+    def _settle(self, done, running: dict) -> tuple[ModelResponse | None, BaseException | None]:
+        """处理已完成的请求：(先成功的结果, 最近的错误)"""
+        error = None
+        for future in done:
+            is_backup = running.pop(future)
+            if future.exception() is None:
+                self._count(hedge_wins=int(is_backup))
+                return future.result(), None
+            error = future.exception()
+        return None, error
+
+    def _timed(self, handler: Callable[[ModelRequest], ModelResponse], request: ModelRequest) -> ModelResponse:
+        key, start = model_key(request.model), time.perf_counter()
+        try:
+            response = handler(request)
+        except Exception:
+            self.health.record(key, time.perf_counter() - start, error=True)
+            raise
+        self.health.record(key, time.perf_counter() - start)
+        return response
+
+    async def _atimed(
+        self, handler: Callable[[ModelRequest], Awaitable[ModelResponse]], request: ModelRequest
+    ) -> ModelResponse:
+        key, start = model_key(request.model), time.perf_counter()
+        try:
+            response = await handler(request)
+        except asyncio.CancelledError:
+            # 被对冲请求取消：已经等待的时间是该次延迟的下限，也记入统计，否则总是输掉的慢模型看起来并不慢
+            self.health.record(key, time.perf_counter() - start)
+            raise
+        except Exception:
+            self.health.record(key, time.perf_counter() - start, error=True)
+            raise
+        self.health.record(key, time.perf_counter() - start)
+        return response
+
+    def wrap_model_call(
+        self, request: ModelRequest, handler: Callable[[ModelRequest], ModelResponse]
+    ) -> ModelResponse:
+        self._count(calls=1)
+        primary, backup, delay = self._plan(request, self.eligible(request))
+        if backup is None:
+            return self._timed(handler, request.override(model=primary))
+
+        future, started = submit_started(self._pool, self._timed, handler, request.override(model=primary))
+        running: dict[Future, bool] = {future: False}
+        sent_backup, error = False, None
+        try:
+            # 对冲计时从首选请求开始执行时算起，线程池里排队的时间不算（否则并发高时会误发对冲请求）
+            started.wait()
+            deadline = time.monotonic() + delay if self.hedge else None
+            while running:
+                timeout = None if sent_backup or deadline is None else max(deadline - time.monotonic(), 0.0)
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                response, failed = self._settle(done, running)
+                if response is not None:
+                    return response
+                error = failed or error
+                if not sent_backup and (failed is not None or not done):
+                    # 首选模型报错（故障转移），或超过对冲时间还没返回（对冲）：向第二个模型发出同样的请求
+                    self._count(**({"failovers": 1} if failed is not None else {"hedged": 1}))
+                    # 对冲请求不能合并到进行中的首选请求上（app.singleflight），只有一个可选模型时两者完全相同
+                    with bypass():
+                        running[self._pool.submit(self._timed, handler, request.override(model=backup))] = True
+                    sent_backup = True
+        finally:
+            # 线程中的请求无法强制停止，只能丢弃结果
+            self._count(cancelled=len(running))
+            for future in running:
+                future.cancel()
+        raise error
+
+    async def awrap_model_call(
+        self, request: ModelRequest, handler: Callable[[ModelRequest], Awaitable[ModelResponse]]
+    ) -> ModelResponse:
+        self._count(calls=1)
+        eligible = await self.aeligible(request) if self.aeligible is not None else self.eligible(request)
+        primary, backup, delay = self._plan(request, eligible)
+        if backup is None:
+            return await self._atimed(handler, request.override(model=primary))
+
+        running: dict[asyncio.Task, bool] = {asyncio.ensure_future(self._atimed(handler, request.override(model=primary))): False}
+        deadline = time.monotonic() + delay if self.hedge else None
+        sent_backup, error = False, None
+        try:
+            while running:
+                timeout = None if sent_backup or deadline is None else max(deadline - time.monotonic(), 0.0)
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                response, failed = self._settle(done, running)
+                if response is not None:
+                    return response
+                error = failed or error
+                if not sent_backup and (failed is not None or not done):
+                    self._count(**({"failovers": 1} if failed is not None else {"hedged": 1}))
+                    with bypass():
+                        running[asyncio.ensure_future(self._atimed(handler, request.override(model=backup)))] = True
+                    sent_backup = True
+        finally:
+            # 取消落后的请求，进行中的 HTTP 请求随之断开
+            self._count(cancelled=len(running))
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        raise error
@@ -0,0 +1,340 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import warnings
+from collections.abc import AsyncIterator, Iterator, Sequence
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.globals import get_llm_cache
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage, AIMessageChunk, message_chunk_to_message
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, Generation
+from langchain_core.outputs.chat_generation import merge_chat_generation_chunks
+
+"""
+持久化的精确匹配 LLM 响应缓存（SQLite）。
+- key = sha256(llm_string + 归一化后的 messages)，llm_string 由 langchain 生成，包含模型名和采样参数（temperature、max_tokens 等）
+- 归一化时去掉消息的 id、response_metadata、usage_metadata，多轮对话里历史 AIMessage 的元数据不同也能命中
+- 淘汰：TTL 过期；条数或总字节数超限时按最近访问时间（LRU）淘汰
+- 统计：命中 / 未命中 / 过期 / 淘汰次数，见 SQLiteLLMCache.stats
+
+langchain 只在 invoke / batch 时查缓存，stream 不经过缓存。StreamingCacheMixin 补上这一块：
+命中时把缓存的响应切成 chunk 回放，未命中时边流式输出边收集，结束后写入缓存，调用方不需要区分两条路径。
+
+用法：
+    配置 LLM_CACHE_ENABLED=true 后，app.registry 创建的所有 chat model 都会使用 default_cache()
+    也可以单独使用：ChatOpenAI(..., cache=SQLiteLLMCache("llm_cache.sqlite"))
+"""
+
+# 流式回放时每个 chunk 的字符数
+REPLAY_CHUNK_CHARS = 20
+
+# 归一化 prompt 时从消息里去掉的字段（每次调用都不同，和响应内容无关）
+_VOLATILE_MESSAGE_FIELDS = ("id", "response_metadata", "usage_metadata")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evictions: int = 0
+    writes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def _strip_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        if value.get("lc") == 1 and value.get("type") == "constructor" and isinstance(value.get("kwargs"), dict):
+            kwargs = {k: v for k, v in value["kwargs"].items() if k not in _VOLATILE_MESSAGE_FIELDS}
+            return {**value, "kwargs": _strip_volatile(kwargs)}
+        return {k: _strip_volatile(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def normalize_prompt(prompt: str) -> str:
+    """把 langchain 序列化后的 messages 归一化成稳定的字符串"""
+    try:
+        data = json.loads(prompt)
+    except ValueError:
+        return prompt
+    return json.dumps(_strip_volatile(data), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    data = f"{llm_string}\x00{normalize_prompt(prompt)}"
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    基于 SQLite 的 LLM 响应缓存，支持 TTL 和 LRU（条数 / 字节数）淘汰，可以在多个进程之间共享同一个文件
+    Args:
+        path: 数据库文件路径，":memory:" 表示只在内存中
+        ttl: 过期时间（秒），None 或 0 表示不过期
+        max_entries: 最多保存的条数
+        max_bytes: 最多保存的字节数（按序列化后的响应大小计算）
+    """
+
+    def __init__(
+        self,
+        path: str | Path = ".cache/llm_cache.sqlite",
+        ttl: float | None = 7 * 24 * 3600,
+        max_entries: int = 10_000,
+        max_bytes: int = 256 * 1024 * 1024,
+    ) -> None:
+        self.path = str(path)
+        self.ttl = ttl or None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # INSERT OR REPLACE 覆盖已有条目时，需要这个选项才会触发 DELETE 触发器
+        self._conn.execute("PRAGMA recursive_triggers=ON")
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, llm_string TEXT NOT NULL, value TEXT NOT NULL,"
+                " size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache (created)")
+            # 条数和总字节数由触发器在同一个事务里维护，写入后判断是否超限不需要扫描整张表；
+            # 没有统计行的旧数据库在这里统计一次
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache_totals ("
+                " id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER NOT NULL, bytes INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO llm_cache_totals"
+                " SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS llm_cache_insert AFTER INSERT ON llm_cache BEGIN"
+                " UPDATE llm_cache_totals SET entries = entries + 1, bytes = bytes + new.size WHERE id = 0; END"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS llm_cache_delete AFTER DELETE ON llm_cache BEGIN"
+                " UPDATE llm_cache_totals SET entries = entries - 1, bytes = bytes - old.size WHERE id = 0; END"
+            )
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._expired(row[1], now):
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.stats.expired += 1
+                row = None
+            if row is None:
+                self.stats.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+            self.stats.hits += 1
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", LangChainBetaWarning)
+            return loads(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        value = dumps(list(return_val))
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, llm_string, value, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, llm_string, value, len(value.encode()), now, now),
+            )
+            self.stats.writes += 1
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        if self.ttl is not None:
+            expired = self._conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,)).rowcount
+            self.stats.expired += expired
+        count, size = self._conn.execute("SELECT entries, bytes FROM llm_cache_totals WHERE id = 0").fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+        victims = []
+        for key, entry_size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed"):
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            victims.append((key,))
+            count -= 1
+            size -= entry_size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+        self.stats.evictions += len(victims)
+
+    def clear(self, **kwargs: Any) -> None:
+        """清空缓存；传入 llm_string 时只清除这个模型配置的条目"""
+        with self._lock:
+            if "llm_string" in kwargs:
+                self._conn.execute("DELETE FROM llm_cache WHERE llm_string = ?", (kwargs["llm_string"],))
+            else:
+                self._conn.execute("DELETE FROM llm_cache")
+
+    # 注意不要定义 __len__：langchain 用 `if llm_cache` 判断是否启用缓存，空缓存会被当成 False
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT entries FROM llm_cache_totals WHERE id = 0").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def info(self) -> dict:
+        return {**asdict(self.stats), "hit_rate": self.stats.hit_rate, "entries": self.count()}
+
+
+_default_cache: SQLiteLLMCache | None = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> SQLiteLLMCache:
+    """按 settings（LLM_CACHE_*）创建的进程级共享缓存"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                from app.config import settings
+
+                _default_cache = SQLiteLLMCache(
+                    settings.llm_cache_path,
+                    ttl=settings.llm_cache_ttl,
+                    max_entries=settings.llm_cache_max_entries,
+                    max_bytes=settings.llm_cache_max_bytes,
+                )
+    return _default_cache
+
+
+# invoke 走 langchain 自己的缓存逻辑（_generate_with_cache），此时 _stream 不能再查一遍缓存
+_in_generate: ContextVar[bool] = ContextVar("llm_cache_in_generate", default=False)
+
+
+def _replay(generation: Generation) -> Iterator[ChatGenerationChunk]:
+    """把缓存的响应切成 chunk"""
+    message = getattr(generation, "message", None)
+    if not isinstance(message, AIMessage):
+        message = AIMessage(content=generation.text)
+    content = message.content
+    if isinstance(content, str):
+        for start in range(0, len(content), REPLAY_CHUNK_CHARS):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=content[start:start + REPLAY_CHUNK_CHARS]))
+    elif content:
+        yield ChatGenerationChunk(message=AIMessageChunk(content=content))
+    yield ChatGenerationChunk(
+        message=AIMessageChunk(
+            content="",
+            tool_call_chunks=[
+                {"name": tc["name"], "args": json.dumps(tc["args"], ensure_ascii=False), "id": tc["id"], "index": i}
+                for i, tc in enumerate(message.tool_calls)
+            ],
+            additional_kwargs=message.additional_kwargs,
+            response_metadata=message.response_metadata,
+            # 和 langchain 的 invoke 一致，命中缓存时费用记为 0
+            usage_metadata={**message.usage_metadata, "total_cost": 0} if message.usage_metadata else None,
+            chunk_position="last",
+        ),
+        generation_info=generation.generation_info,
+    )
+
+
+def _to_generation(chunks: Sequence[ChatGenerationChunk]) -> ChatGeneration | None:
+    merged = merge_chat_generation_chunks(list(chunks))
+    if merged is None:
+        return None
+    return ChatGeneration(message=message_chunk_to_message(merged.message), generation_info=merged.generation_info)
+
+
+class StreamingCacheMixin:
+    """
+    给 chat model 的流式输出加上缓存（和 invoke 共用同一份缓存条目），需要放在 ChatOpenAI 之前：
+        class CachedChatOpenAI(StreamingCacheMixin, ChatOpenAI): ...
+    """
+
+    def _stream_cache(self) -> BaseCache | None:
+        # 与 BaseChatModel._generate_with_cache 相同：cache=False 不用缓存，None / True 用全局缓存
+        if self.cache is False:
+            return None
+        return self.cache if isinstance(self.cache, BaseCache) else get_llm_cache()
+
+    def _cache_args(self, messages: list, stop: list[str] | None, kwargs: dict) -> tuple[str, str]:
+        llm_string = self._get_llm_string(stop=stop, **kwargs)
+        prompt = dumps([m.model_copy(update={"id": None}) if getattr(m, "id", None) else m for m in messages])
+        return prompt, llm_string
+
+    def _generate_with_cache(self, *args: Any, **kwargs: Any):
+        token = _in_generate.set(True)
+        try:
+            return super()._generate_with_cache(*args, **kwargs)
+        finally:
+            _in_generate.reset(token)
+
+    async def _agenerate_with_cache(self, *args: Any, **kwargs: Any):
+        token = _in_generate.set(True)
+        try:
+            return await super()._agenerate_with_cache(*args, **kwargs)
+        finally:
+            _in_generate.reset(token)
+
+    def _stream(self, messages: list, stop: list[str] | None = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        cache = self._stream_cache()
+        if cache is None or _in_generate.get():
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return
+        prompt, llm_string = self._cache_args(messages, stop, kwargs)
+        cached = cache.lookup(prompt, llm_string)
+        if cached:
+            yield from _replay(cached[0])
+            return
+        chunks = []
+        for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        # 调用方中途停止迭代时不会执行到这里，不完整的响应不会被缓存
+        generation = _to_generation(chunks)
+        if generation is not None:
+            cache.update(prompt, llm_string, [generation])
+
+    async def _astream(self, messages: list, stop: list[str] | None = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        cache = self._stream_cache()
+        if cache is None or _in_generate.get():
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+            return
+        prompt, llm_string = self._cache_args(messages, stop, kwargs)
+        cached = await cache.alookup(prompt, llm_string)
+        if cached:
+            for chunk in _replay(cached[0]):
+                yield chunk
+            return
+        chunks = []
+        async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        generation = _to_generation(chunks)
+        if generation is not None:
+            await cache.aupdate(prompt, llm_string, [generation])
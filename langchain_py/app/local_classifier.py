@@ -0,0 +1,214 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Mapping, Sequence
+from dataclasses import dataclass, field
+from typing import Literal
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import RunnableLambda
+from app.text_features import HashingEmbeddings, normalize_text
+
+"""
+本地分类器：在调用 LLM 分类之前先在本地判断，足够有把握时直接返回，不确定时才回退到 LLM。
+1. 记忆：同一个问题（归一化后）只分类一次，LRU 淘汰
+2. 关键词规则：只有一个类别的关键词命中（或命中数明显更多）时直接采用
+3. 最近质心：示例问题的向量按类别求平均得到质心，与问题的余弦相似度最高且领先第二名足够多时采用
+   默认用 app.text_features 的字符 n-gram 向量（本地计算，亚毫秒级），也可以传入任意 Embeddings
+4. 回退：调用 fallback（通常是 LLM 分类），结果可以加入质心（learn_from_fallback），相似的问题下次在本地就能判断
+
+用法：
+    classifier = LocalClassifier(examples, keywords, fallback=lambda text: llm_classify(text))
+    classifier.classify("鲸鱼是哺乳动物吗？")  # Classification(label='科普', confidence=..., source='centroid')
+"""
+
+Source = Literal["memo", "keyword", "centroid", "fallback", "default"]
+
+
+@dataclass
+class Classification:
+    label: str
+    confidence: float
+    source: Source
+
+
+@dataclass
+class ClassifierStats:
+    counts: dict[str, int] = field(default_factory=dict)  # 按来源统计
+
+    def add(self, source: str) -> None:
+        self.counts[source] = self.counts.get(source, 0) + 1
+
+    @property
+    def local_ratio(self) -> float:
+        """没有调用 fallback 的比例"""
+        total = sum(self.counts.values())
+        return 1 - self.counts.get("fallback", 0) / total if total else 0.0
+
+
+class LocalClassifier:
+    """
+    Args:
+        examples: 类别 -> 示例问题，用于计算质心
+        keywords: 类别 -> 关键词（小写匹配）
+        fallback / afallback: 本地不确定时调用，返回类别名；都不提供时返回 default_label
+        min_similarity: 质心相似度的下限
+        min_margin: 第一名需要领先第二名的相似度
+        embeddings: 计算向量的模型，默认本地的 HashingEmbeddings
+    """
+
+    def __init__(
+        self,
+        examples: Mapping[str, Sequence[str]],
+        keywords: Mapping[str, Sequence[str]] | None = None,
+        fallback: Callable[[str], str] | None = None,
+        afallback: Callable[[str], Awaitable[str]] | None = None,
+        default_label: str | None = None,
+        min_similarity: float = 0.1,
+        min_margin: float = 0.1,
+        embeddings: Embeddings | None = None,
+        learn_from_fallback: bool = True,
+        memo_size: int = 4096,
+    ) -> None:
+        self.labels = list(examples)
+        self.examples = {label: list(texts) for label, texts in examples.items()}
+        self.keywords = {label: [k.lower() for k in words] for label, words in (keywords or {}).items()}
+        self.fallback = fallback
+        self.afallback = afallback
+        self.default_label = default_label or self.labels[-1]
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.embeddings = embeddings or HashingEmbeddings()
+        self.learn_from_fallback = learn_from_fallback
+        self.memo_size = memo_size
+        self.stats = ClassifierStats()
+        self._memo: OrderedDict[str, Classification] = OrderedDict()
+        self._sums: np.ndarray | None = None  # 每个类别的向量之和，质心 = 归一化(sum)
+        self._centroids: np.ndarray | None = None
+        self._lock = threading.Lock()
+
+    # ---------------- 各个阶段 ----------------
+
+    def _by_keywords(self, text: str) -> Classification | None:
+        text = text.lower()
+        hits = sorted(
+            ((sum(k in text for k in self.keywords.get(label, ())), label) for label in self.labels),
+            reverse=True,
+        )
+        (top, label), second = hits[0], hits[1][0] if len(hits) > 1 else 0
+        if top and top >= 2 * second:
+            return Classification(label, top / (top + second), "keyword")
+        return None
+
+    def _ensure_centroids(self) -> np.ndarray:
+        if self._centroids is None:
+            sums = np.stack([
+                np.sum(np.asarray(self.embeddings.embed_documents(self.examples[label]), dtype=np.float32), axis=0)
+                for label in self.labels
+            ])
+            with self._lock:
+                if self._centroids is None:
+                    self._sums = sums
+                    self._centroids = self._normalize(sums)
+        return self._centroids
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def _by_centroid(self, vector: np.ndarray) -> Classification | None:
+        scores = self._ensure_centroids() @ vector
+        order = np.argsort(scores)[::-1]
+        top = float(scores[order[0]])
+        second = float(scores[order[1]]) if len(order) > 1 else 0.0
+        if top >= self.min_similarity and top - second >= self.min_margin:
+            return Classification(self.labels[int(order[0])], top, "centroid")
+        return None
+
+    def _learn(self, label: str, vector: np.ndarray) -> None:
+        if not self.learn_from_fallback or label not in self.labels:
+            return
+        with self._lock:
+            i = self.labels.index(label)
+            self._sums[i] += vector
+            self._centroids = self._normalize(self._sums)
+
+    def _vector(self, text: str) -> np.ndarray:
+        vec = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _remember(self, key: str, result: Classification) -> Classification:
+        self.stats.add(result.source)
+        with self._lock:
+            self._memo[key] = Classification(result.label, result.confidence, "memo")
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return result
+
+    def _recall(self, key: str) -> Classification | None:
+        with self._lock:
+            found = self._memo.get(key)
+            if found is not None:
+                self._memo.move_to_end(key)
+                self.stats.add("memo")
+            return found
+
+    # ---------------- 对外接口 ----------------
+
+    def classify_local(self, text: str) -> tuple[Classification | None, np.ndarray | None]:
+        """只在本地判断，不确定时返回 (None, 向量)"""
+        result = self._by_keywords(text)
+        if result is not None:
+            return result, None
+        vector = self._vector(text)
+        return self._by_centroid(vector), vector
+
+    def rank(self, text: str) -> list[str]:
+        """按可能性从高到低排列所有类别（不调用 fallback），可用于选择投机执行的分支"""
+        found = self._recall(normalize_text(text))
+        if found is not None:
+            return [found.label] + [label for label in self.labels if label != found.label]
+        scores = self._ensure_centroids() @ self._vector(text)
+        ranked = [self.labels[int(i)] for i in scores.argsort()[::-1]]
+        by_keywords = self._by_keywords(text)
+        if by_keywords is not None:
+            ranked.remove(by_keywords.label)
+            ranked.insert(0, by_keywords.label)
+        return ranked
+
+    def classify(self, text: str) -> Classification:
+        key = normalize_text(text)
+        found = self._recall(key)
+        if found is not None:
+            return found
+        result, vector = self.classify_local(text)
+        if result is None:
+            if self.fallback is None:
+                result = Classification(self.default_label, 0.0, "default")
+            else:
+                result = Classification(self.fallback(text), 1.0, "fallback")
+                self._learn(result.label, vector)
+        return self._remember(key, result)
+
+    async def aclassify(self, text: str) -> Classification:
+        key = normalize_text(text)
+        found = self._recall(key)
+        if found is not None:
+            return found
+        result, vector = self.classify_local(text)
+        if result is None:
+            if self.afallback is not None:
+                result = Classification(await self.afallback(text), 1.0, "fallback")
+            elif self.fallback is not None:
+                result = Classification(self.fallback(text), 1.0, "fallback")
+            else:
+                result = Classification(self.default_label, 0.0, "default")
+            if result.source == "fallback":
+                self._learn(result.label, vector)
+        return self._remember(key, result)
+
+    def as_runnable(self) -> RunnableLambda:
+        """文本 -> Classification 的 Runnable，可以直接放进 LCEL 链"""
+        return RunnableLambda(self.classify, afunc=self.aclassify, name="LocalClassifier")
@@ -0,0 +1,288 @@
+import json
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+from langchain_core.prompt_values import PromptValue
+from pydantic import BaseModel
+from app.stream_metrics import Histogram
+
+"""
+按阶段统计 Runnable 链的耗时：RunnableProfiler 是一个 callback handler，记录每个阶段（链中的每个 Runnable，
+包括嵌套的子链、模型、工具、检索器）的
+    墙钟时间（总时间 / 自身时间 = 总时间 - 子阶段时间）、CPU 时间（阶段所在线程）、
+    内存分配（净增加的内存块数；开启 trace_memory 时为 tracemalloc 统计的字节数）、输入 / 输出大小（近似字节数）
+按调用路径（RunnableSequence;classifier、RunnableSequence;ChatOpenAI ...）聚合多次调用的结果，
+导出为 JSON 或 collapsed stack 格式（flamegraph.pl、speedscope 可以直接打开）。
+
+开销：每个阶段只在开始 / 结束时各记一次计时，不像 set_debug(True) 那样同步打印所有输入输出；
+线上可以用 sample_rate 只统计一部分调用。tracemalloc 本身会让内存分配变慢数倍，只在排查内存问题时开启。
+异步调用时同一线程上交错执行的其它协程的 CPU 时间也会算进来；内存分配按进程统计，并发调用时会互相计入。
+
+用法：
+    profiler = RunnableProfiler()
+    for _ in range(100):
+        chain.invoke(input, config={"callbacks": [profiler]})
+    print(profiler.format_table())
+    profiler.write_collapsed("profile.folded")    # flamegraph.pl profile.folded > profile.svg
+    profiler.write_json("profile.json")
+"""
+
+WALL_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+@dataclass
+class StageStats:
+    """同一调用路径上的一个阶段，多次调用的累计值"""
+    calls: int = 0
+    errors: int = 0
+    wall: Histogram = field(default_factory=lambda: Histogram(WALL_BUCKETS))
+    self_wall: float = 0.0
+    cpu: float = 0.0
+    self_cpu: float = 0.0
+    alloc_blocks: int = 0
+    alloc_bytes: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "wall_seconds": self.wall.to_dict(),
+            "self_wall_seconds": self.self_wall,
+            "cpu_seconds": self.cpu,
+            "self_cpu_seconds": self.self_cpu,
+            "alloc_blocks": self.alloc_blocks,
+            "alloc_bytes": self.alloc_bytes,
+            "input_bytes": self.input_bytes,
+            "output_bytes": self.output_bytes,
+        }
+
+
+@dataclass
+class _Run:
+    path: tuple[str, ...]
+    parent: UUID | None
+    thread: int
+    start: float
+    cpu_start: float
+    blocks_start: int
+    bytes_start: int
+    input_bytes: int
+    child_wall: float = 0.0
+    child_cpu: float = 0.0
+
+
+def payload_size(obj: Any, depth: int = 0) -> int:
+    """输入 / 输出的近似大小（字符串按 UTF-8 字节数），只用于比较各阶段的数据量，不追求精确"""
+    if obj is None or depth > 8:
+        return 0
+    if isinstance(obj, str):
+        return len(obj.encode("utf-8", "replace"))
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, (int, float, bool)):
+        return 8
+    if isinstance(obj, BaseMessage):
+        return payload_size(obj.content, depth + 1) + payload_size(getattr(obj, "tool_calls", None), depth + 1)
+    if isinstance(obj, PromptValue):
+        return payload_size(obj.to_messages(), depth + 1)
+    if isinstance(obj, LLMResult):
+        return sum(payload_size(getattr(g, "message", None) or g.text, depth + 1) for gs in obj.generations for g in gs)
+    if isinstance(obj, BaseModel):
+        return payload_size(obj.model_dump(), depth + 1)
+    if isinstance(obj, Mapping):
+        return sum(payload_size(k, depth + 1) + payload_size(v, depth + 1) for k, v in obj.items())
+    if isinstance(obj, Sequence):
+        return sum(payload_size(item, depth + 1) for item in obj)
+    return len(str(obj))
+
+
+class RunnableProfiler(BaseCallbackHandler):
+    """
+    Args:
+        sample_rate: 统计的调用比例（按最外层的调用抽样，子阶段跟随）
+        trace_memory: 开启 tracemalloc，记录每个阶段分配的字节数
+        measure_payload: 记录输入 / 输出大小
+    """
+
+    # 在事件循环里直接执行回调，不切到线程池，计时才准确
+    run_inline = True
+
+    def __init__(self, sample_rate: float = 1.0, trace_memory: bool = False, measure_payload: bool = True) -> None:
+        self.sample_rate = sample_rate
+        self.trace_memory = trace_memory
+        self.measure_payload = measure_payload
+        self.stages: dict[tuple[str, ...], StageStats] = {}
+        self._runs: dict[UUID, _Run] = {}
+        self._skipped: set[UUID] = set()  # 没有被抽中的调用
+        self._lock = threading.Lock()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # ---------------- 记录 ----------------
+
+    def _start(self, serialized: dict[str, Any] | None, payload: Any, run_id: UUID, parent_run_id: UUID | None, name: str | None) -> None:
+        name = name or (serialized or {}).get("name") or ((serialized or {}).get("id") or ["unknown"])[-1]
+        with self._lock:
+            if parent_run_id in self._skipped or (
+                parent_run_id is None and self.sample_rate < 1.0 and random.random() >= self.sample_rate
+            ):
+                self._skipped.add(run_id)
+                return
+            # 父阶段不在记录中：handler 只挂在了这个阶段上（如 model.with_config(callbacks=...)），当作最外层
+            parent = self._runs.get(parent_run_id) if parent_run_id is not None else None
+            path = (*parent.path, name) if parent is not None else (name,)
+        run = _Run(
+            path=path,
+            parent=parent_run_id,
+            thread=threading.get_ident(),
+            start=0.0,
+            cpu_start=time.thread_time(),
+            blocks_start=sys.getallocatedblocks(),
+            bytes_start=tracemalloc.get_traced_memory()[0] if self.trace_memory else 0,
+            input_bytes=payload_size(payload) if self.measure_payload else 0,
+        )
+        run.start = time.perf_counter()
+        with self._lock:
+            self._runs[run_id] = run
+
+    def _end(self, output: Any, run_id: UUID, error: bool = False) -> None:
+        now = time.perf_counter()
+        cpu_now = time.thread_time()
+        blocks = sys.getallocatedblocks()
+        traced = tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if run is None:
+                self._skipped.discard(run_id)
+        if run is None:
+            return
+        wall = now - run.start
+        # 开始和结束不在同一个线程时（比如被 ContextThreadPoolExecutor 调度）无法得到该阶段的 CPU 时间
+        cpu = cpu_now - run.cpu_start if run.thread == threading.get_ident() else 0.0
+        output_bytes = payload_size(output) if self.measure_payload and not error else 0
+        with self._lock:
+            parent = self._runs.get(run.parent) if run.parent is not None else None
+            if parent is not None:
+                parent.child_wall += wall
+                parent.child_cpu += cpu
+            stats = self.stages.get(run.path)
+            if stats is None:
+                stats = self.stages[run.path] = StageStats()
+            stats.calls += 1
+            stats.errors += error
+            stats.wall.observe(wall)
+            # 并行的子阶段时间之和可能超过父阶段
+            stats.self_wall += max(wall - run.child_wall, 0.0)
+            stats.cpu += cpu
+            stats.self_cpu += max(cpu - run.child_cpu, 0.0)
+            stats.alloc_blocks += max(blocks - run.blocks_start, 0)
+            stats.alloc_bytes += max(traced - run.bytes_start, 0)
+            stats.input_bytes += run.input_bytes
+            stats.output_bytes += output_bytes
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, name=None, **kwargs: Any) -> None:
+        self._start(serialized, inputs, run_id, parent_run_id, name)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs: Any) -> None:
+        self._end(outputs, run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._end(None, run_id, error=True)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, name=None, **kwargs: Any) -> None:
+        self._start(serialized, messages, run_id, parent_run_id, name)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, name=None, **kwargs: Any) -> None:
+        self._start(serialized, prompts, run_id, parent_run_id, name)
+
+    def on_llm_end(self, response, *, run_id, **kwargs: Any) -> None:
+        self._end(response, run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._end(None, run_id, error=True)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, name=None, **kwargs: Any) -> None:
+        self._start(serialized, input_str, run_id, parent_run_id, name)
+
+    def on_tool_end(self, output, *, run_id, **kwargs: Any) -> None:
+        self._end(output, run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._end(None, run_id, error=True)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, name=None, **kwargs: Any) -> None:
+        self._start(serialized, query, run_id, parent_run_id, name)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs: Any) -> None:
+        self._end([d.page_content for d in documents], run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._end(None, run_id, error=True)
+
+    # ---------------- 导出 ----------------
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages.clear()
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [
+                {"path": list(path), **stats.to_dict()}
+                for path, stats in sorted(self.stages.items())
+            ]
+
+    def to_json(self, **kwargs: Any) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, **kwargs)
+
+    def to_collapsed(self, metric: str = "self_wall") -> str:
+        """
+        collapsed stack 格式：每行 "外层;内层;... 数值"，数值为自身时间（微秒），
+        metric 可选 self_wall / self_cpu / alloc_blocks / alloc_bytes
+        """
+        scale = 1e6 if metric in ("self_wall", "self_cpu") else 1
+        with self._lock:
+            lines = [
+                f"{';'.join(_frame(name) for name in path)} {round(getattr(stats, metric) * scale)}"
+                for path, stats in sorted(self.stages.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: str | Path) -> None:
+        Path(path).write_text(self.to_json(indent=2), encoding="utf-8")
+
+    def write_collapsed(self, path: str | Path, metric: str = "self_wall") -> None:
+        Path(path).write_text(self.to_collapsed(metric), encoding="utf-8")
+
+    def format_table(self, limit: int = 20) -> str:
+        """按自身时间从高到低列出各阶段"""
+        with self._lock:
+            rows = sorted(self.stages.items(), key=lambda item: item[1].self_wall, reverse=True)[:limit]
+        lines = [f"{'stage':<48}{'calls':>7}{'p50(ms)':>10}{'self(ms)':>10}{'cpu(ms)':>9}{'blocks':>9}{'in(B)':>9}{'out(B)':>9}"]
+        for path, s in rows:
+            name = " > ".join(path)
+            name = name if len(name) <= 46 else "…" + name[-45:]
+            p50 = s.wall.quantile(0.5) or 0.0
+            lines.append(
+                f"{name:<48}{s.calls:>7}{p50 * 1e3:>10.2f}{s.self_wall / s.calls * 1e3:>10.2f}"
+                f"{s.self_cpu / s.calls * 1e3:>9.2f}{s.alloc_blocks // s.calls:>9}"
+                f"{s.input_bytes // s.calls:>9}{s.output_bytes // s.calls:>9}"
+            )
+        return "\n".join(lines)
+
+
+def _frame(name: str) -> str:
+    # collapsed stack 格式中 ";" 分隔调用栈，空格分隔数值
+    return name.replace(";", ":").replace(" ", "_")
@@ -0,0 +1,174 @@
+import threading
+from typing import TYPE_CHECKING, Any
+from app.config import settings
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+"""
+模型注册表：按逻辑名（glm、ds、qwen3_32b、embedding）懒加载并缓存模型实例。
+模块导入时不再创建 ChatOpenAI / OpenAIEmbeddings，第一次用到某个模型时才创建，
+只用到一个模型的 worker 只需付出这一个模型的启动成本。
+所有实例共用 app.http_pool 中的连接池。
+开启 LLM_CACHE_ENABLED 后，chat model 使用 app.llm_cache 的持久化响应缓存（invoke 和 stream 都会命中），
+开启 LLM_SEMANTIC_CACHE_ENABLED 后使用 app.semantic_cache 的语义缓存。
+配置 LLM_COALESCE_ENABLED=true 后合并并发的相同请求（app.singleflight，只合并 temperature=0 的调用）。
+
+用法：
+    model = get_chat_model("glm", max_tokens=3000)
+    embeddings = get_embeddings()
+"""
+
+# 逻辑名 -> settings 中的模型名字段
+CHAT_MODELS: dict[str, str] = {
+    "glm": "glm_model",
+    "ds": "ds_model",
+    "dsr1": "dsr1_model",
+    "qwen3_32b": "qwen3_32b_model",
+}
+EMBEDDING_MODELS: dict[str, str] = {
+    "embedding": "embedding_model",
+}
+
+# 所有 chat model 共用的默认参数，调用方传入的参数会覆盖它们
+CHAT_MODEL_DEFAULTS: dict[str, Any] = {
+    "temperature": 0.9,
+    "timeout": 60,
+}
+
+_instances: dict[tuple, Any] = {}
+_lock = threading.Lock()
+
+
+def _freeze(value: Any) -> Any:
+    """把参数转换成可哈希的形式，用作缓存 key"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _http_clients() -> dict[str, Any]:
+    from app.http_pool import get_async_http_client, get_http_client
+
+    return {"http_client": get_http_client(), "http_async_client": get_async_http_client()}
+
+
+def _chat_model_class() -> type:
+    """按配置组合 ChatOpenAI 的子类（mixin 放在 ChatOpenAI 之前）"""
+    from langchain_openai import ChatOpenAI
+
+    mixins: list[type] = []
+    if settings.llm_cache_enabled or settings.llm_semantic_cache_enabled:
+        from app.llm_cache import StreamingCacheMixin
+
+        mixins.append(StreamingCacheMixin)
+    # 放在缓存之后：先查缓存，未命中的请求再合并
+    if settings.llm_coalesce_enabled:
+        from app.singleflight import CoalescingMixin
+
+        mixins.append(CoalescingMixin)
+    if not mixins:
+        return ChatOpenAI
+    return _compose(ChatOpenAI, tuple(mixins))
+
+
+_composed: dict[tuple, type] = {}
+
+
+def _compose(base: type, mixins: tuple[type, ...]) -> type:
+    # 类名保持 ChatOpenAI，序列化结果（以及缓存 key 中的 llm_string）与原生 ChatOpenAI 一致
+    key = (base, mixins)
+    if key not in _composed:
+        _composed[key] = type(base.__name__, (*mixins, base), {"__module__": __name__})
+    return _composed[key]
+
+
+_semantic_cache = None
+
+
+def _get_semantic_cache():
+    global _semantic_cache
+    if _semantic_cache is None:
+        from app.semantic_cache import SemanticCache
+
+        if settings.llm_semantic_cache_embedding == "hashing":
+            from app.text_features import HashingEmbeddings
+
+            embeddings = HashingEmbeddings()
+        else:
+            embeddings = get_embeddings(settings.llm_semantic_cache_embedding)
+        _semantic_cache = SemanticCache(
+            embeddings,
+            threshold=settings.llm_semantic_cache_threshold,
+            max_partitions=settings.llm_semantic_cache_max_partitions,
+            max_total_entries=settings.llm_semantic_cache_max_entries,
+        )
+    return _semantic_cache
+
+
+def _chat_model_extras() -> dict[str, Any]:
+    if settings.llm_semantic_cache_enabled:
+        return {"cache": _get_semantic_cache()}
+    if settings.llm_cache_enabled:
+        from app.llm_cache import default_cache
+
+        return {"cache": default_cache()}
+    return {}
+
+
+def _get_or_create(key: tuple, factory):
+    instance = _instances.get(key)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(key)
+            if instance is None:
+                instance = _instances[key] = factory()
+    return instance
+
+
+def get_chat_model(name: str, **overrides: Any) -> "ChatOpenAI":
+    """
+    按逻辑名获取 chat model，同一组参数只创建一次
+    Args:
+        name: 逻辑名，见 CHAT_MODELS
+        overrides: 覆盖默认参数，如 temperature、max_tokens
+    """
+    if name not in CHAT_MODELS:
+        raise ValueError(f"Unknown chat model: {name}")
+
+    def factory() -> "ChatOpenAI":
+        kwargs = {**CHAT_MODEL_DEFAULTS, **_http_clients(), **_chat_model_extras(), **overrides}
+        return _chat_model_class()(
+            model=getattr(settings, CHAT_MODELS[name]),
+            base_url=settings.siliconflow_base_url,
+            api_key=settings.siliconflow_api_key,
+            **kwargs,
+        )
+
+    return _get_or_create(("chat", name, _freeze(overrides)), factory)
+
+
+def get_embeddings(name: str = "embedding", **overrides: Any) -> "OpenAIEmbeddings":
+    """按逻辑名获取 embedding 模型，同一组参数只创建一次"""
+    if name not in EMBEDDING_MODELS:
+        raise ValueError(f"Unknown embedding model: {name}")
+
+    def factory() -> "OpenAIEmbeddings":
+        from langchain_openai import OpenAIEmbeddings
+
+        return OpenAIEmbeddings(
+            model=getattr(settings, EMBEDDING_MODELS[name]),
+            base_url=settings.siliconflow_base_url,
+            api_key=settings.siliconflow_api_key,
+            **{**_http_clients(), **overrides},
+        )
+
+    return _get_or_create(("embedding", name, _freeze(overrides)), factory)
+
+
+def clear() -> None:
+    """清空已创建的实例（测试或切换配置时使用）"""
+    with _lock:
+        _instances.clear()
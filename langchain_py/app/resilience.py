@@ -0,0 +1,331 @@
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from concurrent.futures import Future
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Annotated, Any, Literal, NotRequired
+import openai
+from langchain.agents.middleware import AgentMiddleware, AgentState, ModelRequest, ModelResponse
+from langchain.agents.middleware.types import PrivateStateAttr
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from app.latency_routing import model_key, submit_started
+from app.singleflight import bypass
+
+"""
+模型调用的容错中间件：上游变慢或出错时，agent 的一轮对话不会被一次卡住的调用拖上 60 秒（ChatOpenAI 的 timeout）。
+ResilientModelMiddleware 包在每次模型调用外面：
+- 截止时间：每轮对话（一次 invoke）开始时记下 turn_timeout 后的截止时间，工具循环中的每次模型调用共用它，
+  单次调用的超时为 min(call_timeout, 剩余时间)，剩余时间不够时直接抛出 TimeoutError
+- 重试：超时、连接错误、429、5xx 按带抖动的指数退避重试（full jitter），429 带 Retry-After 时至少等待该时间，
+  其它错误（如 400）直接抛出
+- 熔断：每个模型一个 CircuitBreaker，连续 failure_threshold 次可重试的错误后打开，reset_timeout 秒内直接跳过该模型，
+  之后放行一次探测请求，成功则恢复；跳过或重试用完时依次改用 fallbacks(request) 中的模型，都不可用时抛出最后的错误
+取消：异步（ainvoke / astream）时超时会取消请求；同步时请求在线程中执行，超时后不再等待，但请求仍会在后台执行完。
+同步时 call_timeout 从请求开始执行时算起：并发的对话数超过 max_workers 时，在线程池里排队的时间不算作上游超时
+（不重试、不计入熔断），排队超过本轮对话的剩余时间时按整轮超时（deadline_exceeded）处理。
+模型自己的重试（max_retries）与这里的重试会叠加，使用时建议把模型的 max_retries 设为 0。
+
+用法：
+    resilience = ResilientModelMiddleware(fallbacks=lambda request: [glm_model()], call_timeout=20, turn_timeout=90)
+    agent = create_agent(ds_model(), tools=[...], middleware=[resilience, handle_tool_errors])
+    resilience.stats, resilience.breaker_states()
+"""
+
+# 可以重试的 HTTP 状态码
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(RuntimeError):
+    """模型的熔断器处于打开状态，没有发出请求"""
+
+    def __init__(self, model: str, retry_after: float) -> None:
+        super().__init__(f"circuit open for model {model}, retry after {retry_after:.1f}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """超时、连接错误、429、5xx"""
+    if isinstance(error, (TimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+
+def retry_after(error: BaseException) -> float | None:
+    """429 / 503 响应的 Retry-After（秒）"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class CircuitBreaker:
+    """
+    closed：正常放行；连续 failure_threshold 次失败后 open：直接拒绝；
+    reset_timeout 秒后 half_open：放行一次探测请求，成功回到 closed，失败重新计时
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opens = 0  # 打开的次数
+        self._opened_at: float | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> Literal["closed", "open", "half_open"]:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "open" if time.monotonic() - self._opened_at < self.reset_timeout else "half_open"
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_timeout:
+                return False
+            # half_open：只放行这一次探测，重新计时，探测期间其它调用仍被拒绝
+            self._opened_at = now
+            return True
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            if success:
+                self.failures = 0
+                self._opened_at = None
+                return
+            self.failures += 1
+            if self._opened_at is not None or self.failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    self.opens += 1
+                self._opened_at = time.monotonic()
+
+
+@dataclass
+class ResilienceStats:
+    calls: int = 0
+    retries: int = 0
+    timeouts: int = 0  # 单次调用超时
+    short_circuits: int = 0  # 熔断器打开，跳过了该模型
+    fallbacks: int = 0  # 由 fallbacks 中的模型完成的调用
+    deadline_exceeded: int = 0  # 整轮对话的截止时间已到
+    failures: int = 0  # 最终抛出错误的调用
+
+
+class ResilienceState(AgentState):
+    # 本轮对话的截止时间（time.time()），只在中间件内部使用
+    turn_deadline: NotRequired[Annotated[float, PrivateStateAttr]]
+
+
+class ResilientModelMiddleware(AgentMiddleware):
+    """
+    Args:
+        fallbacks: request -> 按顺序尝试的备用模型（与 request.model 相同的会被跳过），None 表示没有备用模型
+        call_timeout: 单次模型调用的超时（秒）
+        turn_timeout: 一轮对话中所有模型调用的总时限（秒），None 表示不限
+        max_retries: 每个模型的重试次数
+        backoff_base / backoff_max: 第 n 次重试前等待 uniform(0, min(backoff_max, backoff_base * 2^n)) 秒
+        failure_threshold / reset_timeout: 熔断器参数
+        max_workers: 同步调用时同时执行的模型请求数（线程池大小）
+    """
+
+    state_schema = ResilienceState
+
+    def __init__(
+        self,
+        fallbacks: Callable[[ModelRequest], Sequence[BaseChatModel]] | None = None,
+        call_timeout: float = 30.0,
+        turn_timeout: float | None = 120.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_workers: int = 64,
+    ) -> None:
+        super().__init__()
+        self.fallbacks = fallbacks
+        self.call_timeout = call_timeout
+        self.turn_timeout = turn_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.stats = ResilienceStats()
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._pool = ContextThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="resilient-model")
+        self._lock = threading.Lock()
+
+    def _count(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def breaker(self, model: BaseChatModel | str) -> CircuitBreaker:
+        key = model if isinstance(model, str) else model_key(model)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return breaker
+
+    def breaker_states(self) -> dict[str, str]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {key: breaker.state for key, breaker in breakers.items()}
+
+    def before_agent(self, state: ResilienceState, runtime: Any) -> dict[str, Any] | None:
+        if self.turn_timeout is None:
+            return None
+        return {"turn_deadline": time.time() + self.turn_timeout}
+
+    def _candidates(self, request: ModelRequest) -> list[BaseChatModel]:
+        models = [request.model, *(self.fallbacks(request) if self.fallbacks else ())]
+        seen, result = set(), []
+        for model in models:
+            if model_key(model) not in seen:
+                seen.add(model_key(model))
+                result.append(model)
+        return result
+
+    def _remaining(self, request: ModelRequest) -> float | None:
+        deadline = request.state.get("turn_deadline")
+        return None if deadline is None else deadline - time.time()
+
+    def _timeout(self, request: ModelRequest) -> float:
+        """本次调用的超时；整轮对话的截止时间已到时抛出 TimeoutError"""
+        remaining = self._remaining(request)
+        if remaining is None:
+            return self.call_timeout
+        if remaining <= 0:
+            self._count(deadline_exceeded=1, failures=1)
+            raise TimeoutError(f"agent turn exceeded {self.turn_timeout}s")
+        return min(self.call_timeout, remaining)
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, retry_after(error) or 0.0)
+
+    def _allow(self, model: BaseChatModel) -> CircuitBreaker | None:
+        """熔断器允许调用时返回它，否则返回 None"""
+        breaker = self.breaker(model)
+        if breaker.allow():
+            return breaker
+        self._count(short_circuits=1)
+        return None
+
+    def _on_success(self, request: ModelRequest, model: BaseChatModel, breaker: CircuitBreaker) -> None:
+        breaker.record(True)
+        self._count(fallbacks=int(model is not request.model))
+
+    def _on_error(self, request: ModelRequest, breaker: CircuitBreaker, attempt: int, error: Exception) -> float | None:
+        """重试前等待的秒数；None 表示不再重试这个模型（改用下一个），不可重试的错误直接抛出"""
+        if not is_retryable(error):
+            # 上游能正常响应（如 400），不计入熔断
+            breaker.record(True)
+            self._count(failures=1)
+            raise error
+        breaker.record(False)
+        self._count(timeouts=int(isinstance(error, TimeoutError)))
+        if attempt == self.max_retries or breaker.state != "closed":
+            return None
+        delay = self._backoff(attempt, error)
+        remaining = self._remaining(request)
+        if remaining is not None and delay >= remaining:
+            return None
+        self._count(retries=1)
+        return delay
+
+    def _start(self, handler: Callable[[ModelRequest], ModelResponse], request: ModelRequest, retry: bool) -> Future:
+        """提交到线程池，等到请求开始执行才返回；排队超过本轮对话的剩余时间时抛出 TimeoutError"""
+        # 重试不能合并到进行中的相同请求上（app.singleflight），那次请求可能正卡着
+        with bypass() if retry else nullcontext():
+            future, started = submit_started(self._pool, handler, request)
+        remaining = self._remaining(request)
+        if not started.wait(remaining) and future.cancel():
+            self._count(deadline_exceeded=1, failures=1)
+            raise TimeoutError(f"agent turn exceeded {self.turn_timeout}s")
+        return future
+
+    @staticmethod
+    def _result(future: Future, request: ModelRequest, timeout: float) -> ModelResponse:
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            if not future.done():
+                # 线程无法被强制停止，只是不再等待它的结果
+                future.cancel()
+                raise TimeoutError(f"model {model_key(request.model)} timed out after {timeout:.1f}s") from None
+            raise
+
+    def wrap_model_call(
+        self, request: ModelRequest, handler: Callable[[ModelRequest], ModelResponse]
+    ) -> ModelResponse:
+        self._count(calls=1)
+        last_error: Exception | None = None
+        for model in self._candidates(request):
+            breaker = self._allow(model)
+            if breaker is None:
+                last_error = last_error or CircuitOpenError(model_key(model), self.breaker(model).retry_after())
+                continue
+            for attempt in range(self.max_retries + 1):
+                call = request.override(model=model)
+                future = self._start(handler, call, retry=attempt > 0)
+                timeout = self._timeout(request)
+                try:
+                    response = self._result(future, call, timeout)
+                except Exception as e:
+                    last_error = e
+                    delay = self._on_error(request, breaker, attempt, e)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+                    continue
+                self._on_success(request, model, breaker)
+                return response
+        self._count(failures=1)
+        raise last_error
+
+    async def awrap_model_call(
+        self, request: ModelRequest, handler: Callable[[ModelRequest], Awaitable[ModelResponse]]
+    ) -> ModelResponse:
+        self._count(calls=1)
+        last_error: Exception | None = None
+        for model in self._candidates(request):
+            breaker = self._allow(model)
+            if breaker is None:
+                last_error = last_error or CircuitOpenError(model_key(model), self.breaker(model).retry_after())
+                continue
+            for attempt in range(self.max_retries + 1):
+                timeout = self._timeout(request)
+                try:
+                    # 超时会取消请求，进行中的 HTTP 请求随之断开；重试不合并到进行中的相同请求上
+                    with bypass() if attempt > 0 else nullcontext():
+                        response = await asyncio.wait_for(handler(request.override(model=model)), timeout)
+                except Exception as e:
+                    last_error = e
+                    delay = self._on_error(request, breaker, attempt, e)
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+                    continue
+                self._on_success(request, model, breaker)
+                return response
+        self._count(failures=1)
+        raise last_error
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any
+import numpy as np
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.embeddings import Embeddings
+from app.llm_cache import CacheStats, normalize_prompt
+
+"""
+语义缓存：按最后一条用户消息的语义（embedding 余弦相似度）匹配，换个说法问同一个问题也能命中。
+- 分区：llm_string（模型 + 采样参数）和除最后一条用户消息外的所有消息（system prompt、历史对话）必须完全一致，
+  只在同一个分区内做相似度匹配，避免不同 system prompt / 上下文之间串答案
+- 索引：每个分区一个 numpy 矩阵（向量已归一化，一次矩阵乘法得到所有相似度），超过 max_entries 后覆盖最旧的条目
+- 上限：每轮对话、工具循环的每一步上下文都不同，会不断产生只有一两条的新分区；分区数超过 max_partitions
+  或所有分区的条数超过 max_total_entries 时，按最近使用（LRU）整个淘汰最久未用的分区
+- threshold：相似度阈值，越高越保守；不同 embedding 模型的分布不同，先用 benchmarks/semantic_cache.py 调好再上线
+
+实现了 langchain 的 BaseCache 接口，可以直接传给 chat model 的 cache 参数；
+通过 app.registry 使用时（LLM_SEMANTIC_CACHE_ENABLED=true），stream 也会命中（见 app.llm_cache.StreamingCacheMixin）。
+
+用法：
+    cache = SemanticCache(get_embeddings(), threshold=0.9)
+    model = ChatOpenAI(..., cache=cache)
+"""
+
+
+class VectorIndex:
+    """固定容量的向量索引（环形缓冲区，满了之后覆盖最旧的条目）"""
+
+    def __init__(self, max_entries: int = 10_000, initial_capacity: int = 64) -> None:
+        self.max_entries = max_entries
+        self._initial_capacity = initial_capacity
+        self._vectors: np.ndarray | None = None
+        self._payloads: list[Any] = []
+        self._size = 0
+        self._next = 0  # 下一个写入位置
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, vector: np.ndarray, payload: Any) -> bool:
+        """写入一条，返回是否覆盖了旧条目"""
+        if self._vectors is None:
+            capacity = min(self._initial_capacity, self.max_entries)
+            self._vectors = np.zeros((capacity, vector.shape[0]), dtype=np.float32)
+        if self._size < self.max_entries and self._size == len(self._vectors):
+            grown = np.zeros((min(len(self._vectors) * 2, self.max_entries), self._vectors.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._vectors
+            self._vectors = grown
+        slot = self._next
+        self._vectors[slot] = vector
+        evicted = slot < len(self._payloads)
+        if evicted:
+            self._payloads[slot] = payload
+        else:
+            self._payloads.append(payload)
+            self._size += 1
+        self._next = (slot + 1) % self.max_entries
+        return evicted
+
+    def search(self, vector: np.ndarray) -> tuple[float, Any] | None:
+        """返回最相似的一条 (相似度, payload)"""
+        if not self._size:
+            return None
+        scores = self._vectors[:self._size] @ vector
+        best = int(np.argmax(scores))
+        return float(scores[best]), self._payloads[best]
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("kwargs", {}).get("content", "")
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+
+def split_prompt(prompt: str) -> tuple[str, str]:
+    """
+    把 langchain 序列化后的 messages 拆成 (上下文, 最后一条用户消息)
+    没有用户消息时返回 (prompt, "")，这类调用不缓存
+    """
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return prompt, ""
+    for i in range(len(messages) - 1, -1, -1):
+        message = messages[i]
+        if isinstance(message, dict) and message.get("kwargs", {}).get("type") == "human":
+            context = messages[:i] + messages[i + 1:]
+            return json.dumps(context, ensure_ascii=False), _message_text(message)
+    return prompt, ""
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class SemanticCache(BaseCache):
+    """
+    基于 embedding 相似度的 LLM 响应缓存（进程内）
+    Args:
+        embeddings: 任意 langchain Embeddings，如 get_embeddings() 或本地的 HashingEmbeddings
+        threshold: 余弦相似度阈值，>= threshold 视为命中
+        max_entries: 每个分区最多保存的条数
+        max_partitions: 最多保留的分区数
+        max_total_entries: 所有分区合计最多保存的条数
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        threshold: float = 0.9,
+        max_entries: int = 10_000,
+        max_partitions: int = 1000,
+        max_total_entries: int = 100_000,
+    ) -> None:
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_partitions = max_partitions
+        self.max_total_entries = max_total_entries
+        self.stats = CacheStats()
+        self.last_score: float | None = None  # 最近一次查找的最高相似度，调阈值时用
+        # 按最近使用排序，最久未用的在最前面
+        self._partitions: OrderedDict[str, VectorIndex] = OrderedDict()
+        self._total = 0
+        # 未命中时查找用过的向量，紧接着的 update 直接复用，避免同一段文本调用两次 embedding
+        self._pending: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _partition(context: str, llm_string: str) -> str:
+        data = f"{llm_string}\x00{normalize_prompt(context)}"
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _search(self, partition: str, text: str, vector: np.ndarray) -> RETURN_VAL_TYPE | None:
+        with self._lock:
+            index = self._partitions.get(partition)
+            if index is not None:
+                self._partitions.move_to_end(partition)
+            found = index.search(vector) if index is not None else None
+            self.last_score = found[0] if found else None
+            if found is None or found[0] < self.threshold:
+                self.stats.misses += 1
+                self._pending[(partition, text)] = vector
+                while len(self._pending) > 1024:
+                    self._pending.popitem(last=False)
+                return None
+            self.stats.hits += 1
+            return found[1]
+
+    def _insert(self, partition: str, vector: np.ndarray, return_val: RETURN_VAL_TYPE) -> None:
+        with self._lock:
+            index = self._partitions.get(partition)
+            if index is None:
+                # 大部分分区只有几条，从很小的矩阵开始按需扩容
+                index = self._partitions[partition] = VectorIndex(self.max_entries, initial_capacity=4)
+            self._partitions.move_to_end(partition)
+            if index.add(vector, list(return_val)):
+                self.stats.evictions += 1
+            else:
+                self._total += 1
+            self.stats.writes += 1
+            self._evict_partitions(keep=partition)
+
+    def _evict_partitions(self, keep: str) -> None:
+        while len(self._partitions) > self.max_partitions or self._total > self.max_total_entries:
+            oldest = next(iter(self._partitions))
+            if oldest == keep:
+                break
+            index = self._partitions.pop(oldest)
+            self._total -= len(index)
+            self.stats.evictions += len(index)
+
+    def _take_pending(self, partition: str, text: str) -> np.ndarray | None:
+        with self._lock:
+            return self._pending.pop((partition, text), None)
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        context, text = split_prompt(prompt)
+        if not text:  # 没有用户消息，不缓存
+            return None
+        partition = self._partition(context, llm_string)
+        return self._search(partition, text, _unit(self.embeddings.embed_query(text)))
+
+    async def alookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        context, text = split_prompt(prompt)
+        if not text:
+            return None
+        partition = self._partition(context, llm_string)
+        return self._search(partition, text, _unit(await self.embeddings.aembed_query(text)))
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        context, text = split_prompt(prompt)
+        if not text:
+            return
+        partition = self._partition(context, llm_string)
+        vector = self._take_pending(partition, text)
+        if vector is None:
+            vector = _unit(self.embeddings.embed_query(text))
+        self._insert(partition, vector, return_val)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        context, text = split_prompt(prompt)
+        if not text:
+            return
+        partition = self._partition(context, llm_string)
+        vector = self._take_pending(partition, text)
+        if vector is None:
+            vector = _unit(await self.embeddings.aembed_query(text))
+        self._insert(partition, vector, return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._partitions.clear()
+            self._pending.clear()
+            self._total = 0
+
+    def count(self) -> int:
+        with self._lock:
+            return self._total
+
+    def partition_count(self) -> int:
+        with self._lock:
+            return len(self._partitions)
@@ -0,0 +1,323 @@
+import asyncio
+import contextvars
+import threading
+from collections.abc import AsyncIterator, Awaitable, Callable, Hashable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, TypeVar
+from langchain_core.load import dumps
+from app.llm_cache import cache_key
+
+T = TypeVar("T")
+
+"""
+Single-flight：相同 key 的并发调用只执行一次，结果分发给所有等待者（类似 Go 的 singleflight）。
+- do / ado：同步（线程）和异步（asyncio）版本
+- stream / astream：流式版本，上游在后台线程 / task 中读取，每个订阅者从头回放已有的 chunk 再继续接收新的；
+  某个订阅者提前停止迭代不影响其它订阅者，所有订阅者都离开后才取消上游
+- 只合并"正在进行中"的调用，完成后再来的调用会重新执行（需要复用结果请用 app.llm_cache）
+
+CoalescingMixin 把它接到 chat model 上，key 与 app.llm_cache 相同（模型、采样参数、归一化后的 messages）。
+只合并 temperature=0 的调用：采样的调用即使 prompt 相同，也应该各自得到独立的回答（如 chain.batch 同一个问题多次）。
+配置 LLM_COALESCE_ENABLED=true 后 app.registry 创建的 chat model 才会使用，合并次数见 default_group().stats。
+重试、对冲请求要放在 with bypass(): 中发起，否则会合并到进行中（可能已经卡住）的那次调用上。
+"""
+
+
+@dataclass
+class FlightStats:
+    calls: int = 0  # 实际执行（发往上游）的次数
+    coalesced: int = 0  # 被合并、没有单独执行的次数
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class _Broadcast:
+    """一次流式调用的所有 chunk，供多个订阅者读取"""
+
+    def __init__(self) -> None:
+        self.items: list[Any] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.cancelled = False
+        self.subscribers = 0
+        self.cond = threading.Condition()
+
+
+class _AsyncBroadcast:
+    def __init__(self) -> None:
+        self.items: list[Any] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def notify(self) -> None:
+        # 唤醒当前所有等待者，之后的等待使用新的 Event
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self.stats = FlightStats()
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self._streams: dict[Hashable, _Broadcast] = {}
+        # asyncio 对象只能在创建它的事件循环里使用，按事件循环区分
+        self._async_calls: dict[tuple[int, Hashable], tuple[asyncio.Task, list[int]]] = {}
+        self._async_streams: dict[tuple[int, Hashable], _AsyncBroadcast] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats.calls += 1
+            else:
+                self.stats.coalesced += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            entry = self._async_calls.get(loop_key)
+            if entry is None:
+                # 在独立的 task 中执行，发起者被取消时其它等待者不受影响
+                task = asyncio.ensure_future(fn())
+                entry = self._async_calls[loop_key] = (task, [0])
+                task.add_done_callback(lambda _: self._forget(self._async_calls, loop_key, task))
+                self.stats.calls += 1
+            else:
+                self.stats.coalesced += 1
+            task, waiters = entry
+            waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done():
+                with self._lock:
+                    waiters[0] -= 1
+                    if waiters[0] == 0:
+                        task.cancel()
+            raise
+
+    def _forget(self, table: dict, key: Hashable, value: Any) -> None:
+        with self._lock:
+            current = table.get(key)
+            if current is value or (isinstance(current, tuple) and current[0] is value):
+                del table[key]
+
+    def stream(self, key: Hashable, fn: Callable[[], Iterator[T]], copy: Callable[[T], T] | None = None) -> Iterator[T]:
+        """
+        Args:
+            copy: 分发给每个订阅者之前复制 chunk（chunk 会被调用方修改时需要）
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is None:
+                broadcast = self._streams[key] = _Broadcast()
+                self.stats.calls += 1
+                context = contextvars.copy_context()
+                threading.Thread(target=context.run, args=(self._pump, key, broadcast, fn), daemon=True).start()
+            else:
+                self.stats.coalesced += 1
+            broadcast.subscribers += 1
+        return self._subscribe(key, broadcast, copy)
+
+    def _pump(self, key: Hashable, broadcast: _Broadcast, fn: Callable[[], Iterator[Any]]) -> None:
+        iterator = fn()
+        try:
+            for item in iterator:
+                with broadcast.cond:
+                    if broadcast.cancelled:
+                        break
+                    broadcast.items.append(item)
+                    broadcast.cond.notify_all()
+        except BaseException as e:
+            broadcast.error = e
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            self._forget(self._streams, key, broadcast)
+            with broadcast.cond:
+                broadcast.done = True
+                broadcast.cond.notify_all()
+
+    def _subscribe(self, key: Hashable, broadcast: _Broadcast, copy: Callable | None) -> Iterator[Any]:
+        index = 0
+        try:
+            while True:
+                with broadcast.cond:
+                    while index >= len(broadcast.items) and not broadcast.done:
+                        broadcast.cond.wait()
+                    if index < len(broadcast.items):
+                        item = broadcast.items[index]
+                        index += 1
+                    elif broadcast.error is not None:
+                        raise broadcast.error
+                    else:
+                        return
+                yield copy(item) if copy else item
+        finally:
+            with self._lock:
+                broadcast.subscribers -= 1
+                if broadcast.subscribers == 0 and not broadcast.done:
+                    # 所有订阅者都离开了，取消上游；之后相同的调用重新发起
+                    broadcast.cancelled = True
+                    if self._streams.get(key) is broadcast:
+                        del self._streams[key]
+
+    def astream(self, key: Hashable, fn: Callable[[], AsyncIterator[T]], copy: Callable[[T], T] | None = None) -> AsyncIterator[T]:
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            broadcast = self._async_streams.get(loop_key)
+            if broadcast is None:
+                broadcast = self._async_streams[loop_key] = _AsyncBroadcast()
+                broadcast.task = asyncio.ensure_future(self._apump(broadcast, fn))
+                broadcast.task.add_done_callback(lambda _: self._forget(self._async_streams, loop_key, broadcast))
+                self.stats.calls += 1
+            else:
+                self.stats.coalesced += 1
+            broadcast.subscribers += 1
+        return self._asubscribe(loop_key, broadcast, copy)
+
+    @staticmethod
+    async def _apump(broadcast: _AsyncBroadcast, fn: Callable[[], AsyncIterator[Any]]) -> None:
+        try:
+            async for item in fn():
+                broadcast.items.append(item)
+                broadcast.notify()
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            broadcast.error = e
+        finally:
+            broadcast.done = True
+            broadcast.notify()
+
+    async def _asubscribe(self, loop_key: tuple, broadcast: _AsyncBroadcast, copy: Callable | None) -> AsyncIterator[Any]:
+        index = 0
+        try:
+            while True:
+                if index < len(broadcast.items):
+                    item = broadcast.items[index]
+                    index += 1
+                    yield copy(item) if copy else item
+                elif broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                else:
+                    await broadcast.changed.wait()
+        finally:
+            with self._lock:
+                broadcast.subscribers -= 1
+                if broadcast.subscribers == 0 and not broadcast.done:
+                    broadcast.task.cancel()
+                    if self._async_streams.get(loop_key) is broadcast:
+                        del self._async_streams[loop_key]
+
+
+_default_group = SingleFlight()
+
+
+def default_group() -> SingleFlight:
+    """registry 创建的 chat model 共用的 SingleFlight"""
+    return _default_group
+
+
+_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("singleflight_bypass", default=False)
+
+
+@contextmanager
+def bypass() -> Iterator[None]:
+    """其中发起的调用（包括复制了当前 context 的线程 / task）不与进行中的相同调用合并"""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def _copy_chunk(chunk: Any) -> Any:
+    return chunk.model_copy(deep=True)
+
+
+class CoalescingMixin:
+    """
+    合并 chat model 的并发相同请求（invoke / ainvoke / stream / astream），需要放在 ChatOpenAI 之前：
+        class CoalescingChatOpenAI(CoalescingMixin, ChatOpenAI): ...
+    注意：合并后只有发起请求的调用能收到 on_llm_new_token 等底层回调（invoke 时）；stream 时每个调用方都能收到完整的 chunk
+    """
+
+    def _coalesce(self, kwargs: dict) -> bool:
+        if _bypass.get():
+            return False
+        # temperature 为 None 时使用服务端的默认值（通常是 1），同样是采样
+        return kwargs.get("temperature", getattr(self, "temperature", None)) == 0
+
+    def _flight_key(self, messages: list, stop: list[str] | None, kwargs: dict) -> str:
+        prompt = dumps([m.model_copy(update={"id": None}) if getattr(m, "id", None) else m for m in messages])
+        return cache_key(prompt, self._get_llm_string(stop=stop, **kwargs))
+
+    def _generate(self, messages: list, stop: list[str] | None = None, run_manager: Any = None, **kwargs: Any):
+        if not self._coalesce(kwargs):
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        key = ("generate", self._flight_key(messages, stop, kwargs))
+        result = default_group().do(
+            key, lambda: super(CoalescingMixin, self)._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        )
+        # langchain 会修改返回的 message（id、response_metadata），每个调用方拿到独立的副本
+        return result.model_copy(deep=True)
+
+    async def _agenerate(self, messages: list, stop: list[str] | None = None, run_manager: Any = None, **kwargs: Any):
+        if not self._coalesce(kwargs):
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        key = ("generate", self._flight_key(messages, stop, kwargs))
+        result = await default_group().ado(
+            key, lambda: super(CoalescingMixin, self)._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        )
+        return result.model_copy(deep=True)
+
+    def _stream(self, messages: list, stop: list[str] | None = None, run_manager: Any = None, **kwargs: Any):
+        if not self._coalesce(kwargs):
+            return super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        key = ("stream", self._flight_key(messages, stop, kwargs))
+        return default_group().stream(
+            key,
+            lambda: super(CoalescingMixin, self)._stream(messages, stop=stop, run_manager=run_manager, **kwargs),
+            copy=_copy_chunk,
+        )
+
+    def _astream(self, messages: list, stop: list[str] | None = None, run_manager: Any = None, **kwargs: Any):
+        if not self._coalesce(kwargs):
+            return super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        key = ("stream", self._flight_key(messages, stop, kwargs))
+        return default_group().astream(
+            key,
+            lambda: super(CoalescingMixin, self)._astream(messages, stop=stop, run_manager=run_manager, **kwargs),
+            copy=_copy_chunk,
+        )
@@ -0,0 +1,280 @@
+import asyncio
+import queue
+import threading
+from collections import Counter
+from collections.abc import AsyncIterator, Callable, Iterator, Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableBinding, RunnableConfig, RunnableSequence
+from langchain_core.runnables.config import ContextThreadPoolExecutor, patch_config
+
+"""
+投机执行的分支：分类器和最可能的 top_k 个分支同时开始执行，分类结果出来后
+- 命中：直接输出该分支已经缓冲的 chunk，然后继续流式输出，其它分支取消
+- 未命中：取消所有投机分支，再执行分类结果对应的分支（与 RunnableBranch 一样慢，但多花了投机的成本）
+top_k 越大命中率越高、浪费的请求也越多；top_k=0 等价于先分类再执行（RunnableBranch 的行为）。
+
+"最可能"的分支由 predict(input) 给出排序（例如本地分类器的相似度排序），不提供时按历史分类结果的频率排序。
+取消：异步（ainvoke / astream）时直接取消 task，进行中的 HTTP 请求立即断开；
+同步时分支在线程中执行，收到下一个 chunk 时检查取消标记后关闭流，调用方不再等待它。
+RunnableSequence 的流被关闭时会把上游读完（_transform_stream_with_config 要拿到完整输入做 tracing），
+所以形如 prompt | model | parser 的分支在同步模式下拆开执行：模型之前的步骤 invoke，模型直接 stream，
+之后的步骤 transform 模型的输出；取消时先关闭模型自己的流，HTTP 响应随之关闭，不会在后台读完。
+其它形式的分支同步取消时仍会在后台执行完，只有异步模式能节省它们的上游 token。
+
+用法：
+    branch = SpeculativeBranch(
+        classifier,                       # Runnable，输出类别（或用 label_of 从输出中取出类别）
+        {"科普": science_expert, "编程": code_expert, "其他": general_expert},
+        default="其他",
+        top_k=1,
+    )
+    for chunk in branch.stream({"question": "..."}):
+        ...
+"""
+
+
+@dataclass
+class SpeculativeStats:
+    runs: int = 0
+    hits: int = 0  # 分类结果在投机执行的分支中
+    misses: int = 0
+    cancelled: int = 0  # 被取消的投机分支数（浪费的请求）
+
+
+class _Speculation:
+    """同步模式下一个投机分支的输出缓冲"""
+
+    def __init__(self) -> None:
+        self.queue: queue.Queue = queue.Queue()
+        self.cancelled = threading.Event()
+
+
+def _is_chat_model(step: Runnable) -> bool:
+    while isinstance(step, RunnableBinding):
+        step = step.bound
+    return isinstance(step, BaseChatModel)
+
+
+def _split_at_model(branch: Runnable) -> tuple[list[Runnable], Runnable, list[Runnable]] | None:
+    """把 RunnableSequence 拆成 (模型之前的步骤, 模型, 模型之后的步骤)；没有 chat model 时返回 None"""
+    if not isinstance(branch, RunnableSequence):
+        return None
+    steps = branch.steps
+    for i, step in enumerate(steps):
+        if _is_chat_model(step):
+            return steps[:i], step, steps[i + 1:]
+    return None
+
+
+def _branch_stream(branch: Runnable, input: Any, config: RunnableConfig) -> tuple[Iterator[Any], Iterator[Any]]:
+    """返回 (输出的迭代器, 取消时要先关闭的模型流)"""
+    parts = _split_at_model(branch)
+    if parts is None:
+        iterator = branch.stream(input, config)
+        return iterator, iterator
+    head, model, tail = parts
+    for step in head:
+        input = step.invoke(input, config)
+    source = model.stream(input, config)
+    iterator = source
+    for step in tail:
+        iterator = step.transform(iterator, config)
+    return iterator, source
+
+
+def _run_branch(branch: Runnable, input: Any, config: RunnableConfig, spec: _Speculation) -> None:
+    iterator = source = None
+    try:
+        iterator, source = _branch_stream(branch, input, config)
+        for chunk in iterator:
+            if spec.cancelled.is_set():
+                return
+            spec.queue.put(("chunk", chunk))
+        spec.queue.put(("done", None))
+    except BaseException as e:
+        spec.queue.put(("error", e))
+    finally:
+        # 先关闭模型的流（断开 HTTP 响应），后面的 transform 被关闭时就没有剩余的输入可读
+        if source is not None:
+            source.close()
+        if iterator is not None and iterator is not source:
+            iterator.close()
+
+
+def _drain(spec: _Speculation) -> Iterator[Any]:
+    while True:
+        kind, value = spec.queue.get()
+        if kind == "chunk":
+            yield value
+        elif kind == "error":
+            raise value
+        else:
+            return
+
+
+class SpeculativeBranch(Runnable[Any, Any]):
+    """
+    Args:
+        classifier: 输入 -> 分类结果的 Runnable
+        branches: 类别 -> 分支
+        default: 分类结果不在 branches 中时使用的类别
+        top_k: 投机执行的分支数
+        predict: 输入 -> 类别排序（最可能的在前），用于选择投机分支
+        label_of: 从分类器输出中取出类别，默认输出本身就是类别
+    """
+
+    def __init__(
+        self,
+        classifier: Runnable,
+        branches: Mapping[str, Runnable],
+        default: str,
+        top_k: int = 1,
+        predict: Callable[[Any], Sequence[str]] | None = None,
+        label_of: Callable[[Any], str] | None = None,
+        name: str | None = None,
+    ) -> None:
+        if default not in branches:
+            raise ValueError(f"default branch {default!r} not in branches")
+        self.classifier = classifier
+        self.branches = dict(branches)
+        self.default = default
+        self.top_k = top_k
+        self.predict = predict
+        self.label_of = label_of or (lambda output: output)
+        self.name = name or "SpeculativeBranch"
+        self.stats = SpeculativeStats()
+        self._history: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _candidates(self, input: Any) -> list[str]:
+        if self.top_k <= 0:
+            return []
+        if self.predict is not None:
+            ranked = [label for label in self.predict(input) if label in self.branches]
+        else:
+            with self._lock:
+                ranked = [label for label, _ in self._history.most_common()]
+            ranked += [label for label in self.branches if label not in ranked]
+        return ranked[:self.top_k]
+
+    def _resolve(self, output: Any, candidates: list[str]) -> str:
+        label = self.label_of(output)
+        if label not in self.branches:
+            label = self.default
+        with self._lock:
+            self._history[label] += 1
+            self.stats.runs += 1
+            if label in candidates:
+                self.stats.hits += 1
+            elif candidates:
+                self.stats.misses += 1
+            self.stats.cancelled += len(candidates) - (label in candidates)
+        return label
+
+    @staticmethod
+    def _child(config: RunnableConfig, run_manager, tag: str) -> RunnableConfig:
+        return patch_config(config, callbacks=run_manager.get_child(tag))
+
+    # ---------------- 同步 ----------------
+
+    def _transform(self, inputs: Iterator[Any], run_manager: CallbackManagerForChainRun, config: RunnableConfig) -> Iterator[Any]:
+        input = None
+        for input in inputs:
+            pass
+        candidates = self._candidates(input)
+        specs = {label: _Speculation() for label in candidates}
+        pool = ContextThreadPoolExecutor(max_workers=max(len(specs), 1))
+        try:
+            for label, spec in specs.items():
+                pool.submit(_run_branch, self.branches[label], input, self._child(config, run_manager, f"speculative:{label}"), spec)
+            output = self.classifier.invoke(input, self._child(config, run_manager, "classifier"))
+            label = self._resolve(output, candidates)
+            for other, spec in specs.items():
+                if other != label:
+                    spec.cancelled.set()
+            if label in specs:
+                yield from _drain(specs[label])
+            else:
+                yield from self.branches[label].stream(input, self._child(config, run_manager, f"branch:{label}"))
+        finally:
+            # 调用方提前停止迭代或出错时，取消所有仍在执行的分支
+            for spec in specs.values():
+                spec.cancelled.set()
+            pool.shutdown(wait=False)
+
+    def stream(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Iterator[Any]:
+        yield from self._transform_stream_with_config(iter([input]), self._transform, config, **kwargs)
+
+    def transform(self, input: Iterator[Any], config: RunnableConfig | None = None, **kwargs: Any) -> Iterator[Any]:
+        yield from self._transform_stream_with_config(input, self._transform, config, **kwargs)
+
+    def invoke(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Any:
+        final = None
+        for chunk in self.stream(input, config, **kwargs):
+            final = chunk if final is None else final + chunk
+        return final
+
+    # ---------------- 异步 ----------------
+
+    async def _atransform(
+        self, inputs: AsyncIterator[Any], run_manager: AsyncCallbackManagerForChainRun, config: RunnableConfig
+    ) -> AsyncIterator[Any]:
+        input = None
+        async for input in inputs:
+            pass
+        candidates = self._candidates(input)
+        queues: dict[str, asyncio.Queue] = {label: asyncio.Queue() for label in candidates}
+
+        async def run(label: str) -> None:
+            try:
+                child = self._child(config, run_manager, f"speculative:{label}")
+                async for chunk in self.branches[label].astream(input, child):
+                    queues[label].put_nowait(("chunk", chunk))
+                queues[label].put_nowait(("done", None))
+            except asyncio.CancelledError:
+                raise
+            except BaseException as e:
+                queues[label].put_nowait(("error", e))
+
+        tasks = {label: asyncio.create_task(run(label)) for label in candidates}
+        try:
+            output = await self.classifier.ainvoke(input, self._child(config, run_manager, "classifier"))
+            label = self._resolve(output, candidates)
+            for other, task in tasks.items():
+                if other != label:
+                    task.cancel()
+            if label in tasks:
+                while True:
+                    kind, value = await queues[label].get()
+                    if kind == "chunk":
+                        yield value
+                    elif kind == "error":
+                        raise value
+                    else:
+                        break
+            else:
+                async for chunk in self.branches[label].astream(input, self._child(config, run_manager, f"branch:{label}")):
+                    yield chunk
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    async def astream(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> AsyncIterator[Any]:
+        async def input_aiter() -> AsyncIterator[Any]:
+            yield input
+
+        async for chunk in self._atransform_stream_with_config(input_aiter(), self._atransform, config, **kwargs):
+            yield chunk
+
+    async def atransform(self, input: AsyncIterator[Any], config: RunnableConfig | None = None, **kwargs: Any) -> AsyncIterator[Any]:
+        async for chunk in self._atransform_stream_with_config(input, self._atransform, config, **kwargs):
+            yield chunk
+
+    async def ainvoke(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Any:
+        final = None
+        async for chunk in self.astream(input, config, **kwargs):
+            final = chunk if final is None else final + chunk
+        return final
@@ -0,0 +1,270 @@
+import bisect
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from typing import Any
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+"""
+流式输出的延迟指标：首 token 延迟（TTFT）、chunk 间隔、总体 tokens/s、每次流式输出的 chunk 数，按模型分别统计成直方图。
+StreamingMetricsHandler 是一个 callback handler，可以挂到任何 Runnable 上（model | StrOutputParser()、agent.stream 等），
+只统计真正流式输出的调用（invoke 不会触发 on_llm_new_token）。
+
+用法：
+    metrics = StreamingMetricsHandler()
+    for chunk in chain.stream(messages, config={"callbacks": [metrics]}):
+        ...
+    print(metrics.to_json())        # 或 metrics.to_prometheus()
+"""
+
+TTFT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+GAP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+TPS_BUCKETS = (1, 5, 10, 20, 50, 100, 200, 500)
+CHUNK_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class Histogram:
+    """固定桶的累积直方图（与 Prometheus histogram 语义一致）"""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        total, out = 0, []
+        for le, c in zip([*map(_fmt, self.buckets), "+Inf"], self.counts, strict=True):
+            total += c
+            out.append((le, total))
+        return out
+
+    def quantile(self, q: float) -> float | None:
+        """按桶线性插值估算分位数，与 Prometheus 的 histogram_quantile 一致"""
+        if not self.count:
+            return None
+        rank, seen, lower = q * self.count, 0, 0.0
+        # 落在 +Inf 桶里时没有上界，返回最大的有限桶边界
+        for upper, c in zip(self.buckets, self.counts[:-1], strict=True):
+            if c and seen + c >= rank:
+                return lower + (upper - lower) * (rank - seen) / c
+            seen += c
+            lower = upper
+        return self.buckets[-1] if self.buckets else None
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": dict(self.cumulative()),
+        }
+
+
+def _fmt(value: float) -> str:
+    return format(value, "g")
+
+
+@dataclass
+class ModelStreamMetrics:
+    """单个模型的统计"""
+    ttft: Histogram = field(default_factory=lambda: Histogram(TTFT_BUCKETS))
+    inter_chunk_gap: Histogram = field(default_factory=lambda: Histogram(GAP_BUCKETS))
+    tokens_per_second: Histogram = field(default_factory=lambda: Histogram(TPS_BUCKETS))
+    chunks: Histogram = field(default_factory=lambda: Histogram(CHUNK_BUCKETS))
+    streams: int = 0
+    errors: int = 0
+    stalls: int = 0  # chunk 间隔超过 stall_threshold 的次数
+    abandoned: int = 0  # 既没有 end 也没有 error、超时后被清理的调用
+
+    def histograms(self) -> dict[str, Histogram]:
+        return {
+            "ttft_seconds": self.ttft,
+            "inter_chunk_gap_seconds": self.inter_chunk_gap,
+            "tokens_per_second": self.tokens_per_second,
+            "chunks": self.chunks,
+        }
+
+
+@dataclass
+class _Run:
+    model: str
+    start: float
+    first: float | None = None
+    last: float | None = None
+    chunks: int = 0
+
+
+_HELP = {
+    "ttft_seconds": "Time from request start to the first streamed token",
+    "inter_chunk_gap_seconds": "Time between consecutive streamed chunks",
+    "tokens_per_second": "Output tokens per second over the whole stream",
+    "chunks": "Number of streamed chunks per response",
+}
+
+
+class StreamingMetricsHandler(BaseCallbackHandler):
+    """记录流式输出延迟指标的 callback handler，线程安全，可以在多个调用（以及 sync / async）之间共享"""
+
+    # 在事件循环里直接执行回调，不切到线程池，计时才准确
+    run_inline = True
+
+    def __init__(
+        self,
+        stall_threshold: float = 1.0,
+        namespace: str = "llm_stream",
+        max_run_age: float = 600.0,
+        max_runs: int = 10_000,
+    ) -> None:
+        self.stall_threshold = stall_threshold
+        self.namespace = namespace
+        # 调用方中途丢弃的流可能既不触发 on_llm_end 也不触发 on_llm_error，
+        # 开始超过 max_run_age 秒、或进行中的调用超过 max_runs 个时，最早开始的记为 abandoned 并清理
+        self.max_run_age = max_run_age
+        self.max_runs = max_runs
+        self.models: dict[str, ModelStreamMetrics] = {}
+        self._runs: OrderedDict[UUID, _Run] = OrderedDict()  # 按开始时间排序
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list,
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        invocation_params: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        model = (metadata or {}).get("ls_model_name") or (invocation_params or {}).get("model") \
+            or (invocation_params or {}).get("model_name") or (serialized or {}).get("name") or "unknown"
+        now = time.perf_counter()
+        with self._lock:
+            self._evict_stale(now)
+            self._runs[run_id] = _Run(model=str(model), start=now)
+
+    def on_llm_new_token(self, token: str, *, chunk: Any = None, run_id: UUID, **kwargs: Any) -> None:
+        now = time.perf_counter()
+        # 第一个 chunk 通常只有 role，没有内容；工具调用的 chunk 内容为空但有 tool_call_chunks
+        message = getattr(chunk, "message", None)
+        if not token and not getattr(message, "tool_call_chunks", None):
+            return
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return
+            stats = self._stats(run.model)
+            if run.first is None:
+                run.first = now
+                stats.ttft.observe(now - run.start)
+            else:
+                gap = now - run.last
+                stats.inter_chunk_gap.observe(gap)
+                if gap > self.stall_threshold:
+                    stats.stalls += 1
+            run.last = now
+            run.chunks += 1
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if run is None or run.first is None:  # 非流式调用不统计
+                return
+            stats = self._stats(run.model)
+            stats.streams += 1
+            stats.chunks.observe(run.chunks)
+            # 服务端返回了 usage 时用真实的输出 token 数，否则用 chunk 数近似
+            tokens = _output_tokens(response) or run.chunks
+            stats.tokens_per_second.observe(tokens / max(now - run.start, 1e-9))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if run is not None:
+                self._stats(run.model).errors += 1
+
+    def _evict_stale(self, now: float) -> None:
+        while self._runs:
+            run = next(iter(self._runs.values()))
+            if now - run.start <= self.max_run_age and len(self._runs) < self.max_runs:
+                break
+            self._runs.popitem(last=False)
+            self._stats(run.model).abandoned += 1
+
+    def _stats(self, model: str) -> ModelStreamMetrics:
+        if model not in self.models:
+            self.models[model] = ModelStreamMetrics()
+        return self.models[model]
+
+    def reset(self) -> None:
+        with self._lock:
+            self.models.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                model: {
+                    "streams": m.streams,
+                    "errors": m.errors,
+                    "stalls": m.stalls,
+                    "abandoned": m.abandoned,
+                    **{name: h.to_dict() for name, h in m.histograms().items()},
+                }
+                for model, m in self.models.items()
+            }
+
+    def to_json(self, **kwargs: Any) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, **kwargs)
+
+    def to_prometheus(self) -> str:
+        """导出为 Prometheus text exposition 格式"""
+        lines: list[str] = []
+        with self._lock:
+            models = list(self.models.items())
+            for name, help_text in _HELP.items():
+                metric = f"{self.namespace}_{name}"
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+                for model, m in models:
+                    h = m.histograms()[name]
+                    label = f'model="{_escape(model)}"'
+                    for le, count in h.cumulative():
+                        lines.append(f'{metric}_bucket{{{label},le="{le}"}} {count}')
+                    lines.append(f"{metric}_sum{{{label}}} {h.sum:g}")
+                    lines.append(f"{metric}_count{{{label}}} {h.count}")
+            counters = (
+                ("streams_total", "streams"),
+                ("errors_total", "errors"),
+                ("stalls_total", "stalls"),
+                ("abandoned_total", "abandoned"),
+            )
+            for name, attr in counters:
+                metric = f"{self.namespace}_{name}"
+                lines.append(f"# TYPE {metric} counter")
+                for model, m in models:
+                    lines.append(f'{metric}{{model="{_escape(model)}"}} {getattr(m, attr)}')
+        return "\n".join(lines) + "\n"
+
+
+def _output_tokens(response: LLMResult) -> int:
+    for generations in response.generations:
+        for gen in generations:
+            usage = getattr(getattr(gen, "message", None), "usage_metadata", None)
+            if usage and usage.get("output_tokens"):
+                return usage["output_tokens"]
+    return 0
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,142 @@
+import json
+from collections.abc import Awaitable, Callable
+from typing import Any, Literal
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
+from langchain.agents.structured_output import ProviderStrategy, StructuredOutputValidationError
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from pydantic import BaseModel, RootModel
+from app.json_repair import RepairingOutputParser, RepairStats
+
+"""
+单次调用的结构化响应：结束 agent 循环的那次模型调用直接输出最终的结构化结果。
+create_agent(response_format=...) 在模型 profile 没有声明支持原生结构化输出时（如 SiliconFlow 上的模型）使用 ToolStrategy：
+schema 作为一个额外的工具，每一轮都强制调用工具（tool_choice="any"），结果在工具调用参数中，还要插入一条 ToolMessage；
+先让 agent 用文字回答、再用 with_structured_output 抽取则要多一次完整的模型调用。
+ProviderStrategy 需要显式指定，且输出不合格（代码块、多余的文字）时直接报错。
+SingleCallResponseMiddleware 在每次模型调用时带上 provider 的 response_format（工具照常绑定、不强制调用工具），
+模型不再调用工具时，它的回答本身就是符合 schema 的 JSON：
+- mode="json_schema"：{"type": "json_schema", ...}，由 provider 按 schema 约束输出
+- mode="json_mode"：{"type": "json_object"}，只保证输出 JSON（schema 写在 system prompt 中），支持的 provider 更多
+最终回答先经过 app.json_repair 的本地修复再按 schema 校验，仍不合格时才让模型按格式重新回答（max_retries 次）。
+结构化结果写入 state["structured_response"]，与 response_format 的用法相同。
+
+用法：
+    agent = create_agent(
+        model,
+        tools=[compare_two_numbers],
+        middleware=[SingleCallResponseMiddleware(CompareResult)],   # 不再传 response_format
+    )
+    agent.invoke(...)["structured_response"]
+"""
+
+_INSTRUCTIONS = """不需要再调用工具时，直接用 JSON 给出最终回答（不要使用代码块，不要输出其它文字），JSON 需符合以下 JSON Schema：
+{schema}"""
+
+_RETRY_MESSAGE = """上面的回答不符合要求的 JSON 格式（{error}），请只输出符合 JSON Schema 的 JSON。"""
+
+
+class SingleCallResponseMiddleware(AgentMiddleware):
+    """
+    Args:
+        schema: Pydantic 模型或 dataclass（与 create_agent 的 response_format 相同）
+        mode: "json_schema" 或 "json_mode"
+        strict: json_schema 模式下是否要求 provider 严格按 schema 输出
+        max_retries: 最终回答本地修复后仍不合格时，让模型重新回答的次数
+    """
+
+    def __init__(
+        self,
+        schema: type,
+        mode: Literal["json_schema", "json_mode"] = "json_schema",
+        strict: bool | None = None,
+        max_retries: int = 1,
+    ) -> None:
+        super().__init__()
+        strategy = ProviderStrategy(schema, strict=strict)
+        self.schema = schema
+        self.mode = mode
+        self.max_retries = max_retries
+        if mode == "json_schema":
+            self.response_format = strategy.to_model_kwargs()["response_format"]
+        else:
+            self.response_format = {"type": "json_object"}
+        self.instructions = _INSTRUCTIONS.format(schema=json.dumps(strategy.schema_spec.json_schema, ensure_ascii=False))
+        # dataclass 等非 Pydantic 的 schema 包一层 RootModel 校验
+        self._wrapped = not (isinstance(schema, type) and issubclass(schema, BaseModel))
+        self.parser = RepairingOutputParser(pydantic_object=RootModel[schema] if self._wrapped else schema)
+
+    @property
+    def stats(self) -> RepairStats:
+        """最终回答的解析情况：strict / repaired（本地修复）/ retries（让模型重新回答）/ failed"""
+        return self.parser.stats
+
+    def _prepare(self, request: ModelRequest) -> ModelRequest:
+        system_prompt = request.system_prompt
+        content = f"{system_prompt}\n\n{self.instructions}" if system_prompt else self.instructions
+        model_settings = dict(request.model_settings)
+        if self.mode == "json_mode":
+            # bind_tools 会把 response_format 都转成 json_schema，json_object 通过 extra_body 直接放进请求体
+            extra_body = getattr(request.model, "extra_body", None) or {}
+            model_settings["extra_body"] = {**extra_body, **model_settings.get("extra_body", {}), "response_format": self.response_format}
+        else:
+            model_settings["response_format"] = self.response_format
+            if request.tools:
+                # langchain_openai 带 json_schema 时要求工具也是 strict 的（与 ProviderStrategy 的绑定方式相同）
+                model_settings["strict"] = True
+        return request.override(system_message=SystemMessage(content=content), model_settings=model_settings)
+
+    def _final_message(self, response: ModelResponse) -> AIMessage | None:
+        """结束循环的回答（没有工具调用的 AIMessage），还要继续调用工具时返回 None"""
+        message = next((m for m in reversed(response.result) if isinstance(m, AIMessage)), None)
+        return message if message is not None and not message.tool_calls else None
+
+    def _parse(self, message: AIMessage) -> tuple[Any, Exception | None]:
+        """(结构化结果, 错误)"""
+        result, fixes, error = self.parser.try_parse(message.text)
+        if result is None:
+            return None, error
+        self.parser.record("repaired" if fixes else "strict", fixes)
+        return (result.root if self._wrapped else result), None
+
+    def _retry(self, request: ModelRequest, message: AIMessage, error: Exception) -> ModelRequest:
+        retry = HumanMessage(content=_RETRY_MESSAGE.format(error=error))
+        return request.override(messages=[*request.messages, message, retry])
+
+    def _error(self, message: AIMessage, error: Exception) -> StructuredOutputValidationError:
+        return StructuredOutputValidationError(getattr(self.schema, "__name__", "response_format"), error, message)
+
+    def wrap_model_call(
+        self, request: ModelRequest, handler: Callable[[ModelRequest], ModelResponse]
+    ) -> ModelResponse:
+        request = self._prepare(request)
+        for attempt in range(self.max_retries + 1):
+            response = handler(request)
+            message = self._final_message(response)
+            if message is None:
+                return response
+            structured, error = self._parse(message)
+            if error is None:
+                return ModelResponse(result=response.result, structured_response=structured)
+            if attempt == self.max_retries:
+                self.parser.record("failed")
+                raise self._error(message, error) from error
+            self.parser.record("retries")
+            request = self._retry(request, message, error)
+
+    async def awrap_model_call(
+        self, request: ModelRequest, handler: Callable[[ModelRequest], Awaitable[ModelResponse]]
+    ) -> ModelResponse:
+        request = self._prepare(request)
+        for attempt in range(self.max_retries + 1):
+            response = await handler(request)
+            message = self._final_message(response)
+            if message is None:
+                return response
+            structured, error = self._parse(message)
+            if error is None:
+                return ModelResponse(result=response.result, structured_response=structured)
+            if attempt == self.max_retries:
+                self.parser.record("failed")
+                raise self._error(message, error) from error
+            self.parser.record("retries")
+            request = self._retry(request, message, error)
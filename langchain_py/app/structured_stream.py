@@ -0,0 +1,281 @@
+import functools
+import json
+import re
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import BaseTransformOutputParser
+from langchain_core.outputs import ChatGeneration, Generation
+from langchain_core.runnables import Runnable, RunnableSequence
+from pydantic import BaseModel, RootModel, ValidationError, create_model
+
+"""
+流式结构化输出：边生成边解析 JSON，逐步产出经过校验的部分 Pydantic 对象，下游不用等整个 JSON 生成完。
+- PartialJSONParser：增量 JSON 解析器，每个字符只扫描一次，只暴露已经完整的值
+  （未闭合的字符串 / 数字不出现；最外层容器是部分的，内层的对象 / 数组闭合后才出现）
+- StreamingPydanticParser：输出解析器，每当多了一个完整的字段 / 列表元素时产出一次
+  普通模型产出 Partial{Model}（所有字段可选，默认 None），RootModel[list[...]] 产出只包含已闭合元素的同类型对象，
+  最后一次产出完整校验过的 schema 对象
+- with_streaming_structure(model, schema)：与 model.with_structured_output(schema) 使用相同的请求参数
+  （provider 的 json_schema / json_mode / function_calling），但解析器换成流式的
+
+用法：
+    chain = with_streaming_structure(model, DevProcessList)
+    for partial in chain.stream(messages):
+        print(partial.root)   # ['需求分析'] -> ['需求分析', '系统设计'] -> ...
+"""
+
+_WHITESPACE = " \t\r\n"
+_STRING_RUN = re.compile(r'[^"\\]+')
+_LITERAL_CHARS = set("+-0123456789.eEtrufalsn")
+
+
+@dataclass
+class _Frame:
+    container: dict | list
+    key: str | None = None  # 对象中等待值的 key
+
+
+@dataclass
+class PartialJSONParser:
+    """
+    增量 JSON 解析器：feed() 追加文本，value 为当前已经完整的部分。
+    最外层的 { 或 [ 之前的内容（如 ```json）会被跳过，最外层闭合之后的内容被忽略。
+    """
+    value: dict | list | None = None
+    done: bool = False
+    consumed: int = 0  # 已经处理的字符数，done 之后即 JSON 结束的位置（之后的内容没有处理）
+    _stack: list[_Frame] = field(default_factory=list)
+    _state: str = "start"  # start / value / key / colon / after / string / literal
+    _buf: list[str] = field(default_factory=list)
+    _escape: bool = False
+    _string_is_key: bool = False
+
+    def feed(self, text: str) -> bool:
+        """追加文本，返回 value 是否有变化（最外层容器多了完整的值，或者整个 JSON 结束）"""
+        changed = False
+        i, n = 0, len(text)
+        while i < n and not self.done:
+            c = text[i]
+            state = self._state
+            if state == "string":
+                if self._escape:
+                    self._buf.append(c)
+                    self._escape = False
+                elif c == "\\":
+                    self._buf.append(c)
+                    self._escape = True
+                elif c == '"':
+                    s = json.loads('"' + "".join(self._buf) + '"')
+                    self._buf.clear()
+                    if self._string_is_key:
+                        self._stack[-1].key = s
+                        self._state = "colon"
+                    else:
+                        changed |= self._add(s)
+                else:
+                    # 一次消费一段普通字符
+                    m = _STRING_RUN.match(text, i)
+                    self._buf.append(m.group())
+                    i = m.end()
+                    continue
+                i += 1
+                continue
+            if state == "literal":
+                if c in _LITERAL_CHARS:
+                    self._buf.append(c)
+                    i += 1
+                    continue
+                literal = "".join(self._buf)
+                self._buf.clear()
+                try:
+                    changed |= self._add(json.loads(literal))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"invalid JSON literal: {literal!r}") from e
+                continue  # 当前字符按 after 状态重新处理
+            i += 1
+            if c in _WHITESPACE:
+                continue
+            if state == "start":
+                if c in "{[":
+                    changed |= self._open(c)
+                continue
+            if c == "{" and state == "value":
+                changed |= self._open(c)
+            elif c == "[" and state == "value":
+                changed |= self._open(c)
+            elif c == '"' and state in ("value", "key"):
+                self._string_is_key = state == "key"
+                self._state = "string"
+            elif c == "}" and state in ("key", "after") and isinstance(self._stack[-1].container, dict):
+                changed |= self._close()
+            elif c == "]" and state in ("value", "after") and isinstance(self._stack[-1].container, list):
+                changed |= self._close()
+            elif c == "," and state == "after":
+                self._state = "key" if isinstance(self._stack[-1].container, dict) else "value"
+            elif c == ":" and state == "colon":
+                self._state = "value"
+            elif state == "value" and c in _LITERAL_CHARS:
+                self._buf.append(c)
+                self._state = "literal"
+            else:
+                raise ValueError(f"unexpected {c!r} in JSON (state={state})")
+        self.consumed += i
+        return changed
+
+    def _open(self, c: str) -> bool:
+        container: dict | list = {} if c == "{" else []
+        if not self._stack:
+            self.value = container
+        self._stack.append(_Frame(container))
+        self._state = "key" if c == "{" else "value"
+        return False  # 空容器不算变化，内层容器闭合后才挂到树上
+
+    def _close(self) -> bool:
+        frame = self._stack.pop()
+        if not self._stack:
+            self.done = True
+            return True
+        return self._add(frame.container)
+
+    def _add(self, value: Any) -> bool:
+        frame = self._stack[-1]
+        if isinstance(frame.container, list):
+            frame.container.append(value)
+        else:
+            frame.container[frame.key] = value
+            frame.key = None
+        self._state = "after"
+        # 只有最外层容器的直接子元素变化才算（内层容器此时还没有挂到树上）
+        return len(self._stack) == 1
+
+
+@functools.cache
+def partial_model(schema: type[BaseModel]) -> type[BaseModel]:
+    """所有字段变成可选（默认 None）的模型；RootModel 原样返回"""
+    if issubclass(schema, RootModel):
+        return schema
+    fields = {name: (Optional[f.annotation], None) for name, f in schema.model_fields.items()}
+    return create_model(f"Partial{schema.__name__}", __doc__=schema.__doc__, **fields)
+
+
+def _message_text(message: BaseMessage) -> str:
+    """json_schema / json_mode 的 JSON 在 content 中，function_calling 的在工具调用参数中"""
+    for key in ("tool_call_chunks", "tool_calls"):
+        calls = getattr(message, key, None)
+        if calls:
+            args = calls[0].get("args")
+            return args if isinstance(args, str) else json.dumps(args, ensure_ascii=False)
+    return message.text
+
+
+class StreamingPydanticParser(BaseTransformOutputParser[BaseModel]):
+    """流式产出部分 Pydantic 对象的解析器"""
+
+    pydantic_object: type[BaseModel]
+
+    @property
+    def _type(self) -> str:
+        return "streaming_pydantic"
+
+    def _validate_partial(self, value: Any) -> BaseModel | None:
+        model = partial_model(self.pydantic_object)
+        if isinstance(value, dict):
+            value = dict(value)
+            # 校验失败的字段（比如类型不对）先去掉，其余字段照常产出
+            for _ in range(len(value) + 1):
+                try:
+                    return model.model_validate(value)
+                except ValidationError as e:
+                    bad = {err["loc"][0] for err in e.errors() if err["loc"]}
+                    if not bad & value.keys():
+                        return None
+                    for key in bad:
+                        value.pop(key, None)
+            return None
+        try:
+            return model.model_validate(value)
+        except ValidationError:
+            return None
+
+    def _validate_final(self, value: Any, text: str) -> BaseModel:
+        try:
+            return self.pydantic_object.model_validate(value)
+        except ValidationError as e:
+            raise OutputParserException(f"Failed to parse {self.pydantic_object.__name__}: {e}", llm_output=text) from e
+
+    def _step(self, parser: PartialJSONParser, chunk: str | BaseMessage, last: BaseModel | None) -> BaseModel | None:
+        text = _message_text(chunk) if isinstance(chunk, BaseMessage) else chunk
+        try:
+            changed = parser.feed(text)
+        except ValueError as e:
+            raise OutputParserException(str(e), llm_output=text) from e
+        if not changed or parser.done:
+            return None
+        partial = self._validate_partial(parser.value)
+        return partial if partial is not None and partial != last else None
+
+    def _transform(self, input: Iterator[str | BaseMessage]) -> Iterator[BaseModel]:
+        parser, last = PartialJSONParser(), None
+        for chunk in input:
+            partial = self._step(parser, chunk, last)
+            if partial is not None:
+                last = partial
+                yield partial
+            if parser.done:
+                break
+        if not parser.done:
+            raise OutputParserException("Incomplete JSON in streamed output", llm_output=json.dumps(parser.value))
+        final = self._validate_final(parser.value, json.dumps(parser.value, ensure_ascii=False))
+        if final != last:  # RootModel 的最后一次部分结果可能已经是完整的
+            yield final
+
+    async def _atransform(self, input: AsyncIterator[str | BaseMessage]) -> AsyncIterator[BaseModel]:
+        parser, last = PartialJSONParser(), None
+        async for chunk in input:
+            partial = self._step(parser, chunk, last)
+            if partial is not None:
+                last = partial
+                yield partial
+            if parser.done:
+                break
+        if not parser.done:
+            raise OutputParserException("Incomplete JSON in streamed output", llm_output=json.dumps(parser.value))
+        final = self._validate_final(parser.value, json.dumps(parser.value, ensure_ascii=False))
+        if final != last:  # RootModel 的最后一次部分结果可能已经是完整的
+            yield final
+
+    def parse_result(self, result: list[Generation], *, partial: bool = False) -> BaseModel:
+        generation = result[0]
+        text = _message_text(generation.message) if isinstance(generation, ChatGeneration) else generation.text
+        parser = PartialJSONParser()
+        try:
+            parser.feed(text)
+        except ValueError as e:
+            raise OutputParserException(str(e), llm_output=text) from e
+        if not parser.done:
+            raise OutputParserException("Incomplete JSON in output", llm_output=text)
+        return self._validate_final(parser.value, text)
+
+    def parse(self, text: str) -> BaseModel:
+        return self.parse_result([Generation(text=text)])
+
+
+def with_streaming_structure(model: BaseChatModel, schema: type[BaseModel], **kwargs: Any) -> Runnable:
+    """
+    与 model.with_structured_output(schema, **kwargs) 的请求相同，stream() 时逐步产出部分对象，
+    invoke() 时返回完整对象
+    """
+    if kwargs.get("include_raw"):
+        raise ValueError("with_streaming_structure does not support include_raw")
+    structured = model.with_structured_output(schema, **kwargs)
+    # 需要 "请求参数 | 解析器" 的形式，才能把解析器换成流式的
+    if not isinstance(structured, RunnableSequence):
+        raise TypeError(
+            f"with_streaming_structure expects with_structured_output() to return a RunnableSequence, "
+            f"got {type(structured).__name__}"
+        )
+    return structured.first | StreamingPydanticParser(pydantic_object=schema)
@@ -0,0 +1,79 @@
+import re
+import unicodedata
+import zlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+"""
+本地文本特征：字符 n-gram + 哈希技巧（hashing trick）得到固定维度的向量，不需要训练，也不需要调用 API。
+中文没有空格分词，字符 n-gram 比按词切分更稳；维度固定，可以直接放进 numpy 矩阵做向量化计算。
+- char_ngrams / hash_vector：单条文本的特征
+- hash_matrix：批量文本 -> (n, dim) 矩阵
+- HashingEmbeddings：实现 langchain 的 Embeddings 接口，可以替代 OpenAIEmbeddings 做离线测试或低延迟场景
+"""
+
+DEFAULT_DIM = 2048
+DEFAULT_NGRAM_RANGE = (1, 3)
+
+_PUNCT = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """全角转半角、小写、去掉标点和空白"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _PUNCT.sub("", text)
+
+
+def char_ngrams(text: str, ngram_range: tuple[int, int] = DEFAULT_NGRAM_RANGE) -> list[str]:
+    text = normalize_text(text)
+    lo, hi = ngram_range
+    return [text[i:i + n] for n in range(lo, hi + 1) for i in range(len(text) - n + 1)]
+
+
+def _bucket(gram: str, dim: int) -> tuple[int, float]:
+    # zlib.crc32 在不同进程之间结果一致（内置 hash() 对字符串加了随机盐）
+    h = zlib.crc32(gram.encode())
+    return h % dim, 1.0 if (h >> 31) & 1 else -1.0
+
+
+def hash_vector(
+    text: str,
+    dim: int = DEFAULT_DIM,
+    ngram_range: tuple[int, int] = DEFAULT_NGRAM_RANGE,
+    normalize: bool = True,
+) -> np.ndarray:
+    """文本 -> L2 归一化的哈希特征向量（float32）"""
+    vec = np.zeros(dim, dtype=np.float32)
+    for gram in char_ngrams(text, ngram_range):
+        index, sign = _bucket(gram, dim)
+        vec[index] += sign
+    if normalize:
+        norm = np.linalg.norm(vec)
+        if norm:
+            vec /= norm
+    return vec
+
+
+def hash_matrix(
+    texts: list[str],
+    dim: int = DEFAULT_DIM,
+    ngram_range: tuple[int, int] = DEFAULT_NGRAM_RANGE,
+    normalize: bool = True,
+) -> np.ndarray:
+    if not texts:
+        return np.zeros((0, dim), dtype=np.float32)
+    return np.stack([hash_vector(t, dim, ngram_range, normalize) for t in texts])
+
+
+class HashingEmbeddings(Embeddings):
+    """基于字符 n-gram 哈希的本地 Embeddings（语义能力弱于模型，但零延迟、零成本）"""
+
+    def __init__(self, dim: int = DEFAULT_DIM, ngram_range: tuple[int, int] = DEFAULT_NGRAM_RANGE) -> None:
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return hash_matrix(texts, self.dim, self.ngram_range).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return hash_vector(text, self.dim, self.ngram_range).tolist()
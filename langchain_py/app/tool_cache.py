@@ -0,0 +1,222 @@
+import copy
+import functools
+import inspect
+import json
+import threading
+import time
+import typing
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+from langchain.tools import ToolRuntime, tool
+from langchain_core.tools import BaseTool, InjectedToolArg
+from app.llm_cache import CacheStats
+
+"""
+带缓存的 @tool：纯函数或变化很慢的工具（get_reviews、get_weather_for_location、compare_two_numbers 等）
+按参数缓存结果，agent 在不同轮次、不同会话中重复调用时直接返回，不再执行工具函数。
+- 缓存键：工具参数（补全默认值后按 key 排序的 JSON），不包括 ToolRuntime 等注入参数
+- ttl：过期时间（秒），None 表示不过期；max_size：最多缓存的结果数，超出时淘汰最久未使用的
+- scope：按 ToolRuntime 的 context 隔离缓存，如 scope="user_id"（context.user_id），或 runtime -> 可哈希值 的函数
+- 失效：tool_cache(t).invalidate(city="北京")、invalidate(scope="1")、clear()
+- 统计：tool_cache(t).stats（命中率等，与 LLM 缓存的 CacheStats 相同）
+
+结果在写入和命中时都会深拷贝，调用方修改返回值不会影响缓存。
+返回的是普通的 StructuredTool，手动调用（tool.invoke）和 create_agent 中都可以使用。
+
+用法：
+    @cached_tool(ttl=600)
+    def get_weather_for_location(city: str) -> str:
+        ...
+
+    @cached_tool(scope="user_id")
+    def get_user_location(runtime: ToolRuntime[Context]) -> str:
+        ...
+
+    tool_cache(get_weather_for_location).stats.hit_rate
+"""
+
+_ANY = object()
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float | None
+    scope: Hashable
+    arguments: dict[str, Any]
+
+
+def _canonical(value: Any) -> Any:
+    """参数归一化：pydantic 模型转成 dict，其它不能 JSON 序列化的值转成字符串"""
+    return json.loads(json.dumps(value, sort_keys=True, ensure_ascii=False, default=_default))
+
+
+def _default(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+def _injected_params(func: Callable) -> tuple[set[str], str | None]:
+    """ToolRuntime 和 InjectedToolArg 注入的参数（模型看不到，不参与缓存键），以及 ToolRuntime 参数名"""
+    hints = typing.get_type_hints(func, include_extras=True)
+    injected, runtime = set(), None
+    for name, hint in hints.items():
+        if typing.get_origin(hint) is typing.Annotated:
+            if any(arg is InjectedToolArg or isinstance(arg, InjectedToolArg) for arg in hint.__metadata__):
+                injected.add(name)
+            hint = typing.get_args(hint)[0]
+        if hint is ToolRuntime or typing.get_origin(hint) is ToolRuntime:
+            injected.add(name)
+            runtime = name
+    return injected, runtime
+
+
+class ToolCache:
+    """
+    单个工具函数的结果缓存（LRU + TTL），线程安全
+    Args:
+        func: 被缓存的工具函数
+        ttl: 过期时间（秒），None 表示不过期
+        max_size: 最多缓存的结果数
+        scope: context 的属性名（如 "user_id"）或 runtime -> 可哈希值 的函数
+    """
+
+    def __init__(
+        self,
+        func: Callable,
+        ttl: float | None = None,
+        max_size: int = 1024,
+        scope: str | Callable[[ToolRuntime], Hashable] | None = None,
+    ) -> None:
+        self.signature = inspect.signature(func)
+        self.injected, self.runtime_param = _injected_params(func)
+        if scope is not None and self.runtime_param is None:
+            raise ValueError(f"scope requires a ToolRuntime parameter on {func.__name__}")
+        self.ttl = ttl
+        self.max_size = max_size
+        self.scope = scope
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _scope_of(self, runtime: ToolRuntime | None) -> Hashable:
+        if self.scope is None:
+            return None
+        if callable(self.scope):
+            return self.scope(runtime)
+        context = getattr(runtime, "context", None)
+        if isinstance(context, dict):
+            return context.get(self.scope)
+        return getattr(context, self.scope, None)
+
+    def key(self, args: tuple, kwargs: dict) -> tuple[str, Hashable, dict[str, Any]]:
+        """(缓存键, scope, 归一化后的参数)"""
+        bound = self.signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = _canonical({k: v for k, v in bound.arguments.items() if k not in self.injected})
+        scope = self._scope_of(bound.arguments.get(self.runtime_param)) if self.runtime_param else None
+        key = json.dumps([scope, arguments], sort_keys=True, ensure_ascii=False, default=str)
+        return key, scope, arguments
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                self.stats.expired += 1
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return True, copy.deepcopy(entry.value)
+
+    def set(self, key: str, value: Any, scope: Hashable, arguments: dict[str, Any]) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = _Entry(copy.deepcopy(value), expires_at, scope, arguments)
+            self._entries.move_to_end(key)
+            self.stats.writes += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def invalidate(self, scope: Hashable = _ANY, **arguments: Any) -> int:
+        """
+        删除匹配的缓存：只传参数时删除所有 scope 下参数匹配的结果（可以只传部分参数），
+        只传 scope 时删除该 scope 下的所有结果。返回删除的数量
+        """
+        arguments = _canonical(arguments)
+        with self._lock:
+            keys = [
+                key for key, entry in self._entries.items()
+                if (scope is _ANY or entry.scope == scope)
+                and all(entry.arguments.get(k) == v for k, v in arguments.items())
+            ]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def cached_tool(
+    func: Callable | None = None,
+    *,
+    ttl: float | None = None,
+    max_size: int = 1024,
+    scope: str | Callable[[ToolRuntime], Hashable] | None = None,
+    **tool_kwargs: Any,
+) -> BaseTool | Callable[[Callable], BaseTool]:
+    """
+    用法与 @tool 相同（@cached_tool 或 @cached_tool(ttl=..., parse_docstring=True)），
+    tool_kwargs 原样传给 @tool
+    """
+
+    def decorator(f: Callable) -> BaseTool:
+        cache = ToolCache(f, ttl=ttl, max_size=max_size, scope=scope)
+
+        if inspect.iscoroutinefunction(f):
+            @functools.wraps(f)
+            async def wrapper(*args: Any, **kwargs: Any) -> Any:
+                key, scope_value, arguments = cache.key(args, kwargs)
+                found, value = cache.get(key)
+                if found:
+                    return value
+                value = await f(*args, **kwargs)
+                cache.set(key, value, scope_value, arguments)
+                return value
+        else:
+            @functools.wraps(f)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                key, scope_value, arguments = cache.key(args, kwargs)
+                found, value = cache.get(key)
+                if found:
+                    return value
+                value = f(*args, **kwargs)
+                cache.set(key, value, scope_value, arguments)
+                return value
+
+        wrapper.cache = cache
+        return tool(wrapper, **tool_kwargs)
+
+    return decorator(func) if func is not None else decorator
+
+
+def tool_cache(t: BaseTool) -> ToolCache:
+    """取出 @cached_tool 创建的工具的缓存"""
+    func = getattr(t, "func", None) or getattr(t, "coroutine", None)
+    cache = getattr(func, "cache", None)
+    if not isinstance(cache, ToolCache):
+        raise ValueError(f"{t.name} is not created by @cached_tool")
+    return cache
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Mapping, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass
+from typing import Any
+from langchain_core.messages import AIMessage, ToolCall, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langchain_core.tools import BaseTool
+
+"""
+并发执行一条 AIMessage 中的多个工具调用（模型并行调用工具时，总耗时从所有工具耗时之和变成最慢的那个）。
+- execute() 在线程池中执行，aexecute() 用 asyncio 执行（工具的 ainvoke，同步工具由 langchain 放到线程池）
+- 每个工具可以单独设置超时和并发上限（ToolLimits），超时的调用返回 status="error" 的 ToolMessage
+- 返回的 ToolMessage 与 tool_calls 的顺序一致，与完成顺序无关，多次执行得到的消息列表相同
+- 工具报错、未知工具默认转成 status="error" 的 ToolMessage 交给模型处理，handle_errors=False 时直接抛出
+
+注意：线程无法被强制停止，同步执行时超时的工具仍会在后台执行完（占用线程池和该工具的并发名额），
+只是不再等待它的结果；异步执行时超时会取消协程。
+排队等待并发名额的调用也有期限：从 execute() 开始超过该工具的超时仍没有轮到时直接返回超时，
+不会无限期地等待前面卡住的调用，execute() 最多耗时约两倍的超时。
+
+用法：
+    executor = ToolExecutor([get_reviews], timeout=10, limits={"get_reviews": ToolLimits(max_concurrency=2)})
+    response = model_with_tools.invoke(prompt)
+    tool_messages = executor.execute(response)        # 或 await executor.aexecute(response)
+    final = model_with_tools.invoke([HumanMessage(prompt), response, *tool_messages])
+"""
+
+
+@dataclass
+class ToolLimits:
+    timeout: float | None = None  # 秒，None 表示使用执行器的默认值
+    max_concurrency: int | None = None  # 同一条消息中该工具同时执行的调用数，None 表示不限
+
+
+@dataclass
+class ToolExecutorStats:
+    calls: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    peak_concurrency: int = 0
+
+
+def format_tool_output(output: Any) -> str:
+    """工具返回值转成 ToolMessage 的内容：字符串原样保留，其它按 JSON 序列化（保留中文）"""
+    if isinstance(output, str):
+        return output
+    return json.dumps(output, ensure_ascii=False, default=str)
+
+
+class ToolExecutor:
+    """
+    Args:
+        tools: 可用的工具
+        timeout: 每个工具调用的默认超时（秒），None 表示不限
+        max_concurrency: 同时执行的工具调用总数（也是线程池大小）
+        limits: 工具名 -> ToolLimits，覆盖默认的超时和并发
+        handle_errors: 工具报错 / 超时 / 未知工具时返回 status="error" 的 ToolMessage，否则抛出异常
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        timeout: float | None = None,
+        max_concurrency: int = 8,
+        limits: Mapping[str, ToolLimits] | None = None,
+        handle_errors: bool = True,
+    ) -> None:
+        self.tools = {t.name: t for t in tools}
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.limits = dict(limits or {})
+        self.handle_errors = handle_errors
+        self.stats = ToolExecutorStats()
+        self._pool: ContextThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _timeout(self, name: str) -> float | None:
+        limits = self.limits.get(name)
+        return limits.timeout if limits and limits.timeout is not None else self.timeout
+
+    def _max_concurrency(self, name: str) -> int | None:
+        limits = self.limits.get(name)
+        return limits.max_concurrency if limits else None
+
+    def _get_pool(self) -> ContextThreadPoolExecutor:
+        # 线程池跨调用复用：超时的工具仍在执行时不能用 with 等待线程池关闭
+        with self._lock:
+            if self._pool is None:
+                self._pool = ContextThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="tool-executor")
+            return self._pool
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    # ---------------- 结果 ----------------
+
+    def _record(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def _peak(self, running: int) -> None:
+        with self._lock:
+            self.stats.peak_concurrency = max(self.stats.peak_concurrency, running)
+
+    def _success(self, call: ToolCall, output: Any) -> ToolMessage:
+        if isinstance(output, ToolMessage):
+            return output
+        return ToolMessage(content=format_tool_output(output), tool_call_id=call["id"], name=call["name"])
+
+    def _failure(self, call: ToolCall, error: BaseException) -> ToolMessage:
+        if isinstance(error, TimeoutError):
+            self._record(timeouts=1)
+        else:
+            self._record(errors=1)
+        if not self.handle_errors:
+            raise error
+        if isinstance(error, TimeoutError):
+            content = f"Error: tool {call['name']} timed out after {self._timeout(call['name'])}s"
+        else:
+            content = f"Error: {error!r}"
+        return ToolMessage(content=content, tool_call_id=call["id"], name=call["name"], status="error")
+
+    def _unknown(self, call: ToolCall) -> ToolMessage:
+        return self._failure(call, ValueError(f"Unknown tool: {call['name']}"))
+
+    @staticmethod
+    def _tool_calls(message: AIMessage | Sequence[ToolCall]) -> list[ToolCall]:
+        return list(message.tool_calls if isinstance(message, AIMessage) else message)
+
+    # ---------------- 同步 ----------------
+
+    def execute(self, message: AIMessage | Sequence[ToolCall], config: RunnableConfig | None = None) -> list[ToolMessage]:
+        """执行 message 中的所有工具调用，按 tool_calls 的顺序返回 ToolMessage"""
+        calls = self._tool_calls(message)
+        self._record(calls=len(calls))
+        results: list[ToolMessage | None] = [None] * len(calls)
+        pending: deque[int] = deque()
+        for i, call in enumerate(calls):
+            if call["name"] in self.tools:
+                pending.append(i)
+            else:
+                results[i] = self._unknown(call)
+
+        pool = self._get_pool()
+        start = time.monotonic()
+        # 排队中的调用（下标 -> 期限），超过期限还没拿到名额时按超时处理
+        queued_deadlines = {
+            i: start + timeout for i in pending if (timeout := self._timeout(calls[i]["name"])) is not None
+        }
+        running: dict[Future, int] = {}
+        deadlines: dict[Future, float] = {}
+        abandoned: dict[Future, str] = {}  # 已超时但线程仍在执行的调用（-> 工具名），仍占用并发名额
+        active: Counter = Counter()
+        try:
+            while pending or running:
+                for _ in range(len(pending)):
+                    if len(running) + len(abandoned) >= self.max_concurrency:
+                        break
+                    i = pending.popleft()
+                    name = calls[i]["name"]
+                    limit = self._max_concurrency(name)
+                    if limit is not None and active[name] >= limit:
+                        pending.append(i)
+                        continue
+                    future = pool.submit(self.tools[name].invoke, calls[i]["args"], config)
+                    queued_deadlines.pop(i, None)
+                    running[future] = i
+                    active[name] += 1
+                    if (timeout := self._timeout(name)) is not None:
+                        deadlines[future] = time.monotonic() + timeout
+                self._peak(len(running))
+
+                wait_for = min([*deadlines.values(), *queued_deadlines.values()], default=None)
+                finished, _ = wait(
+                    [*running, *abandoned],
+                    timeout=None if wait_for is None else max(wait_for - time.monotonic(), 0.0),
+                    return_when=FIRST_COMPLETED,
+                )
+                now = time.monotonic()
+                for future in finished:
+                    if future in abandoned:
+                        active[abandoned.pop(future)] -= 1
+                        continue
+                    i = running.pop(future)
+                    deadlines.pop(future, None)
+                    active[calls[i]["name"]] -= 1
+                    error = future.exception()
+                    results[i] = self._success(calls[i], future.result()) if error is None else self._failure(calls[i], error)
+                for future, deadline in list(deadlines.items()):
+                    if deadline <= now and future not in finished:
+                        i = running.pop(future)
+                        del deadlines[future]
+                        abandoned[future] = calls[i]["name"]
+                        results[i] = self._failure(calls[i], TimeoutError())
+                for i in [i for i in pending if queued_deadlines.get(i, float("inf")) <= now]:
+                    pending.remove(i)
+                    del queued_deadlines[i]
+                    results[i] = self._failure(calls[i], TimeoutError())
+        finally:
+            for future in running:
+                future.cancel()
+        return results
+
+    # ---------------- 异步 ----------------
+
+    async def aexecute(self, message: AIMessage | Sequence[ToolCall], config: RunnableConfig | None = None) -> list[ToolMessage]:
+        calls = self._tool_calls(message)
+        self._record(calls=len(calls))
+        total = asyncio.Semaphore(self.max_concurrency)
+        per_tool = {
+            name: asyncio.Semaphore(limit)
+            for name in {call["name"] for call in calls}
+            if (limit := self._max_concurrency(name)) is not None
+        }
+        running = 0
+
+        async def run(call: ToolCall) -> ToolMessage:
+            nonlocal running
+            tool = self.tools.get(call["name"])
+            if tool is None:
+                return self._unknown(call)
+            tool_limit = per_tool.get(call["name"])
+            # 先拿工具自己的名额，避免排队等待的调用占住总并发
+            if tool_limit is not None:
+                await tool_limit.acquire()
+            try:
+                async with total:
+                    running += 1
+                    self._peak(running)
+                    try:
+                        output = await asyncio.wait_for(tool.ainvoke(call["args"], config), self._timeout(call["name"]))
+                    finally:
+                        running -= 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                return self._failure(call, e)
+            finally:
+                if tool_limit is not None:
+                    tool_limit.release()
+            return self._success(call, output)
+
+        # gather 按参数顺序返回结果
+        return list(await asyncio.gather(*(run(call) for call in calls)))
@@ -0,0 +1,367 @@
+import atexit
+import json
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Literal
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tracers.stdout import ConsoleCallbackHandler
+from pydantic import BaseModel
+from app.config import settings
+
+"""
+结构化跟踪，代替示例模块导入时的 set_debug(True)（同步打印每条消息、工具调用和 state，拖慢每一轮对话）。
+- TracingHandler 是一个 callback handler，调用路径上只把事件（时间、run_id、名称、输入 / 输出的引用）追加到当前 trace 的列表里，
+  不做序列化、不做 IO
+- 采样按 trace（最外层的一次调用，如 agent 的一轮对话）决定：
+  头部采样：开始时以 sample_rate 的概率选中；尾部采样：结束时耗时超过 slow_threshold 或出错的 trace 也保留；
+  其它 trace 的事件直接丢弃
+- 保留的事件进入 TraceBuffer：有界的环形缓冲区（满了丢弃最旧的事件），由后台线程定期序列化并追加写入 JSONL
+- handler 通过 config 的 callbacks 挂在各模块创建的 agent / 链上（子调用会继承），不修改进程全局的状态，
+  每个模块一个 handler，事件里的 module 就是创建这个 agent 的模块
+- 每个模块可以单独设置详细程度（TRACE_VERBOSITY / TRACE_MODULE_VERBOSITY）：
+    off      不跟踪
+    summary  名称、耗时、错误、token 用量
+    full     再加上输入 / 输出（截断到 max_chars）
+    debug    ConsoleCallbackHandler，即原来 set_debug(True) 的同步打印，但只打印这个模块的调用（只用于本地调试）
+
+用法：
+    agent = create_agent(...).with_config(tracing_config("app.3.agent"))
+    agent.invoke(...)                 # 这个 agent 的调用（包括其中的模型 / 工具调用）按 app.3.agent 的设置跟踪
+    chain.invoke(inputs, config=tracing_config("app.2.structure_output"))
+    default_buffer().flush()          # 立即写入（进程退出时也会自动写入）
+
+每一行是一个事件：{"trace_id", "run_id", "parent_run_id", "module", "event", "name", "ts", "duration", ...}，
+每个 trace 最后一行是 event="trace"，带有采样原因（sampled / slow / error）和总耗时。
+"""
+
+Verbosity = Literal["off", "summary", "full", "debug"]
+
+
+def to_jsonable(obj: Any, max_chars: int = 2000, depth: int = 0) -> Any:
+    """输入 / 输出转成可以写入 JSON 的形式，字符串截断到 max_chars"""
+    if obj is None or isinstance(obj, (bool, int, float)):
+        return obj
+    if isinstance(obj, str):
+        return obj if len(obj) <= max_chars else obj[:max_chars] + f"...(+{len(obj) - max_chars})"
+    if depth > 6:
+        return to_jsonable(repr(obj), max_chars)
+    if isinstance(obj, BaseMessage):
+        data = {"type": obj.type, "content": to_jsonable(obj.content, max_chars, depth + 1)}
+        if getattr(obj, "tool_calls", None):
+            data["tool_calls"] = to_jsonable(obj.tool_calls, max_chars, depth + 1)
+        return data
+    if isinstance(obj, LLMResult):
+        return [to_jsonable(getattr(g, "message", None) or g.text, max_chars, depth + 1) for gs in obj.generations for g in gs]
+    if isinstance(obj, BaseModel):
+        return to_jsonable(obj.model_dump(), max_chars, depth + 1)
+    if isinstance(obj, Mapping):
+        return {str(k): to_jsonable(v, max_chars, depth + 1) for k, v in obj.items()}
+    if isinstance(obj, Sequence) and not isinstance(obj, (bytes, bytearray)):
+        return [to_jsonable(item, max_chars, depth + 1) for item in obj]
+    return to_jsonable(repr(obj), max_chars)
+
+
+@dataclass
+class BufferStats:
+    events: int = 0  # 进入缓冲区的事件数
+    dropped: int = 0  # 缓冲区满时丢弃的事件数
+    written: int = 0
+    flushes: int = 0
+
+
+class TraceBuffer:
+    """
+    有界的环形缓冲区 + 后台写入线程（第一次写入事件时启动，daemon 线程，进程退出时写完剩余的事件）
+    Args:
+        path: JSONL 文件路径（追加写入）
+        max_events: 缓冲区大小，写入跟不上时丢弃最旧的事件
+        flush_interval: 后台写入的间隔（秒）
+        max_chars: full 模式下输入 / 输出中每个字符串的最大长度
+    """
+
+    def __init__(self, path: str | Path, max_events: int = 10_000, flush_interval: float = 1.0, max_chars: int = 2000) -> None:
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.max_chars = max_chars
+        self.stats = BufferStats()
+        self._events: deque[dict] = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread: threading.Thread | None = None
+
+    def put(self, events: Sequence[dict]) -> None:
+        with self._lock:
+            overflow = len(self._events) + len(events) - self._events.maxlen
+            self.stats.dropped += max(overflow, 0)
+            self.stats.events += len(events)
+            self._events.extend(events)
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _format(self, event: dict) -> str:
+        # 输入 / 输出在这里（后台线程）才序列化
+        for key in ("inputs", "outputs"):
+            if key in event:
+                event[key] = to_jsonable(event[key], self.max_chars)
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+    def flush(self) -> int:
+        """把缓冲区中的事件写入文件，返回写入的事件数"""
+        with self._write_lock:
+            with self._lock:
+                events = list(self._events)
+                self._events.clear()
+            if not events:
+                return 0
+            lines = [self._format(event) for event in events]
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            with self._lock:
+                self.stats.written += len(lines)
+                self.stats.flushes += 1
+            return len(lines)
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+@dataclass
+class TraceStats:
+    traces: int = 0
+    sampled: int = 0  # 头部采样选中
+    slow: int = 0  # 尾部采样：耗时超过 slow_threshold
+    errors: int = 0  # 尾部采样：出错
+    discarded: int = 0  # 没有保留的 trace
+
+
+@dataclass
+class _Trace:
+    sampled: bool
+    start: float
+    events: list[dict] = field(default_factory=list)
+    error: bool = False
+
+
+class TracingHandler(BaseCallbackHandler):
+    """
+    Args:
+        buffer: 保留的事件写入的 TraceBuffer
+        module: 写入每个事件的模块名
+        verbosity: "summary" 或 "full"
+        sample_rate: 头部采样的比例
+        slow_threshold: 耗时超过该值（秒）的 trace 总是保留，None 表示不按耗时保留
+        max_events_per_trace: 单个 trace 最多记录的事件数（超出的只计数）
+    """
+
+    # 在事件循环里直接执行回调，不切到线程池
+    run_inline = True
+
+    def __init__(
+        self,
+        buffer: TraceBuffer,
+        module: str = "",
+        verbosity: Verbosity = "summary",
+        sample_rate: float = 0.01,
+        slow_threshold: float | None = 10.0,
+        max_events_per_trace: int = 1000,
+    ) -> None:
+        self.buffer = buffer
+        self.module = module
+        self.full = verbosity == "full"
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.max_events_per_trace = max_events_per_trace
+        self.stats = TraceStats()
+        self._traces: dict[UUID, _Trace] = {}
+        self._roots: dict[UUID, UUID] = {}  # run_id -> 所在 trace 的 run_id
+        self._starts: dict[UUID, float] = {}
+        self._lock = threading.Lock()
+
+    # ---------------- 记录 ----------------
+
+    def _start(self, kind: str, serialized: dict[str, Any] | None, payload: Any, run_id: UUID, parent_run_id: UUID | None, name: str | None) -> None:
+        now = time.time()
+        name = name or (serialized or {}).get("name") or ((serialized or {}).get("id") or ["unknown"])[-1]
+        with self._lock:
+            root = self._roots.get(parent_run_id) if parent_run_id is not None else None
+            if root is None:
+                # 父调用不在记录中（handler 只挂在了这一层上）时也当作新的 trace
+                root = run_id
+                self._traces[run_id] = _Trace(sampled=random.random() < self.sample_rate, start=now)
+            trace = self._traces.get(root)
+            if trace is None:
+                return
+            self._roots[run_id] = root
+            self._starts[run_id] = now
+            if len(trace.events) < self.max_events_per_trace:
+                event = {"event": f"{kind}_start", "run_id": run_id, "parent_run_id": parent_run_id, "name": name, "ts": now}
+                if self.full:
+                    event["inputs"] = payload
+                trace.events.append(event)
+
+    def _end(self, kind: str, output: Any, run_id: UUID, error: BaseException | None = None, **extra: Any) -> None:
+        now = time.time()
+        with self._lock:
+            root = self._roots.pop(run_id, None)
+            start = self._starts.pop(run_id, now)
+            trace = self._traces.get(root) if root is not None else None
+            if trace is None:
+                return
+            if len(trace.events) < self.max_events_per_trace:
+                event = {"event": f"{kind}_end", "run_id": run_id, "ts": now, "duration": now - start, **extra}
+                if error is not None:
+                    event["error"] = repr(error)
+                elif self.full:
+                    event["outputs"] = output
+                trace.events.append(event)
+            trace.error = trace.error or error is not None
+            if root != run_id:
+                return
+            del self._traces[root]
+        self._finish(root, trace, now)
+
+    def _finish(self, trace_id: UUID, trace: _Trace, now: float) -> None:
+        duration = now - trace.start
+        slow = self.slow_threshold is not None and duration >= self.slow_threshold
+        reasons = [r for r, hit in (("sampled", trace.sampled), ("slow", slow), ("error", trace.error)) if hit]
+        with self._lock:
+            self.stats.traces += 1
+            self.stats.sampled += trace.sampled
+            self.stats.slow += slow
+            self.stats.errors += trace.error
+            self.stats.discarded += not reasons
+        if not reasons:
+            return
+        trace.events.append({"event": "trace", "run_id": trace_id, "ts": now, "duration": duration, "reasons": reasons, "events": len(trace.events)})
+        for event in trace.events:
+            event["trace_id"] = trace_id
+            event["module"] = self.module
+        self.buffer.put(trace.events)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, name=None, **kwargs: Any) -> None:
+        self._start("chain", serialized, inputs, run_id, parent_run_id, name)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs: Any) -> None:
+        self._end("chain", outputs, run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs: Any) -> None:
+        # langgraph 用异常实现中断 / 跳转，这里也按错误记录（会触发尾部采样）
+        self._end("chain", None, run_id, error=error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, name=None, **kwargs: Any) -> None:
+        self._start("llm", serialized, messages, run_id, parent_run_id, name)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, name=None, **kwargs: Any) -> None:
+        self._start("llm", serialized, prompts, run_id, parent_run_id, name)
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs: Any) -> None:
+        usage = (response.llm_output or {}).get("token_usage")
+        self._end("llm", response, run_id, **({"token_usage": usage} if usage else {}))
+
+    def on_llm_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._end("llm", None, run_id, error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, name=None, **kwargs: Any) -> None:
+        self._start("tool", serialized, input_str, run_id, parent_run_id, name)
+
+    def on_tool_end(self, output, *, run_id, **kwargs: Any) -> None:
+        self._end("tool", output, run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._end("tool", None, run_id, error=error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, name=None, **kwargs: Any) -> None:
+        self._start("retriever", serialized, query, run_id, parent_run_id, name)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs: Any) -> None:
+        self._end("retriever", [d.page_content for d in documents], run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._end("retriever", None, run_id, error=error)
+
+
+# ---------------- 配置 ----------------
+
+_default_buffer: TraceBuffer | None = None
+_buffer_lock = threading.Lock()
+
+
+def default_buffer() -> TraceBuffer:
+    """所有模块共用的 TraceBuffer（TRACE_PATH）"""
+    global _default_buffer
+    if _default_buffer is None:
+        with _buffer_lock:
+            if _default_buffer is None:
+                _default_buffer = TraceBuffer(
+                    settings.trace_path,
+                    max_events=settings.trace_buffer_size,
+                    flush_interval=settings.trace_flush_interval,
+                )
+    return _default_buffer
+
+
+def module_verbosity(module: str) -> Verbosity:
+    """TRACE_MODULE_VERBOSITY（如 "app.3.agent=full,app.2.tool_calling=off"）中该模块的设置，没有时为 TRACE_VERBOSITY"""
+    for item in settings.trace_module_verbosity.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() == module and value.strip():
+            return value.strip()  # type: ignore[return-value]
+    return settings.trace_verbosity  # type: ignore[return-value]
+
+
+_module_handlers: dict[str, BaseCallbackHandler | None] = {}
+_handlers_lock = threading.Lock()
+
+
+def module_tracer(module: str) -> BaseCallbackHandler | None:
+    """
+    按配置为模块创建的 handler（每个模块只创建一次）：summary / full 时为 TracingHandler，
+    debug 时为 ConsoleCallbackHandler，off 时为 None
+    """
+    with _handlers_lock:
+        if module not in _module_handlers:
+            verbosity = module_verbosity(module)
+            if verbosity == "debug":
+                handler = ConsoleCallbackHandler()
+            elif verbosity == "off":
+                handler = None
+            else:
+                handler = TracingHandler(
+                    default_buffer(),
+                    module=module,
+                    verbosity=verbosity,
+                    sample_rate=settings.trace_sample_rate,
+                    slow_threshold=settings.trace_slow_threshold or None,
+                )
+            _module_handlers[module] = handler
+        return _module_handlers[module]
+
+
+def tracing_config(module: str) -> RunnableConfig:
+    """带上模块 handler 的 config，用于 runnable.with_config(...) 或调用时的 config（off 时为空）"""
+    handler = module_tracer(module)
+    return {"callbacks": [handler]} if handler is not None else {}
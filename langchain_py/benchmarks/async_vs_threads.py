@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from benchmarks.stub_server import StubConfig, StubServer, stub_env
+
+"""
+线程 vs asyncio 基准：N 个并发会话，每个会话连续调用 turns 次，模型为本地 stub 服务。
+    threads: 每个会话一个线程，使用 invoke
+    async:   每个会话一个 asyncio task，使用 ainvoke
+每种组合在独立的子进程中运行，报告吞吐（次/秒）、峰值 RSS 增量和峰值线程数。
+运行：uv run -m benchmarks.async_vs_threads [--sessions 100 1000] [--workload chain|agent]
+"""
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def _rss_mb() -> float:
+    # Linux 上 ru_maxrss 的单位是 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_runnable(workload: str):
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+    from app.registry import get_chat_model
+
+    model = get_chat_model("glm", max_tokens=100, max_retries=0)
+    if workload == "agent":
+        from langchain.agents import create_agent
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        agent = create_agent(model, checkpointer=InMemorySaver())
+        return lambda session, turn: (
+            {"messages": [{"role": "user", "content": f"会话 {session} 第 {turn} 轮"}]},
+            {"configurable": {"thread_id": f"session-{session}"}},
+        ), agent
+    prompt = ChatPromptTemplate([("system", "你是一个专业的翻译。"), ("human", "{text}")])
+    return lambda session, turn: ({"text": f"会话 {session} 第 {turn} 轮"}, None), prompt | model | StrOutputParser()
+
+
+def worker(mode: str, sessions: int, turns: int, workload: str) -> dict:
+    make_input, runnable = build_runnable(workload)
+    peak_threads = threading.active_count()
+    baseline = _rss_mb()
+
+    def sample_threads() -> None:
+        nonlocal peak_threads
+        peak_threads = max(peak_threads, threading.active_count())
+
+    start = time.perf_counter()
+    if mode == "threads":
+        def session_run(session: int) -> None:
+            for turn in range(turns):
+                runnable.invoke(*make_input(session, turn))
+                sample_threads()
+
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            list(pool.map(session_run, range(sessions)))
+    else:
+        async def session_run(session: int) -> None:
+            for turn in range(turns):
+                await runnable.ainvoke(*make_input(session, turn))
+                sample_threads()
+
+        async def main() -> None:
+            await asyncio.gather(*(session_run(s) for s in range(sessions)))
+
+        asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "sessions": sessions,
+        "calls": sessions * turns,
+        "elapsed": elapsed,
+        "throughput": sessions * turns / elapsed,
+        "rss_delta_mb": _rss_mb() - baseline,
+        "peak_threads": peak_threads,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="线程 vs asyncio 基准")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub 服务的响应延迟（秒）")
+    parser.add_argument("--workload", choices=["chain", "agent"], default="chain")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "SESSIONS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        mode, sessions = args.worker
+        print(json.dumps(worker(mode, int(sessions), args.turns, args.workload)))
+        return
+
+    with StubServer(StubConfig(latency=args.latency)) as server:
+        print(f"{'mode':<9}{'sessions':>9}{'calls':>8}{'time(s)':>9}{'calls/s':>10}{'RSS +MB':>9}{'threads':>9}")
+        for sessions in args.sessions:
+            for mode in ("threads", "async"):
+                env = {
+                    **os.environ,
+                    **stub_env(server.base_url),
+                    # 连接池不成为瓶颈，只比较执行模型本身
+                    "HTTP_MAX_CONNECTIONS": str(sessions),
+                    "HTTP_MAX_KEEPALIVE_CONNECTIONS": str(sessions),
+                }
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.async_vs_threads", "--worker", mode, str(sessions),
+                     "--turns", str(args.turns), "--workload", args.workload],
+                    cwd=PROJECT_DIR, env=env, capture_output=True, text=True, check=True,
+                )
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                print(f"{r['mode']:<9}{r['sessions']:>9}{r['calls']:>8}{r['elapsed']:>9.2f}"
+                      f"{r['throughput']:>10.1f}{r['rss_delta_mb']:>9.1f}{r['peak_threads']:>9}")
+
+
+if __name__ == "__main__":
+    main()
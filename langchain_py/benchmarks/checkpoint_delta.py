@@ -0,0 +1,107 @@
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+"""
+增量 checkpoint 的写入量和还原延迟：一个会话连续对话 --turns 轮（每轮 3 个 checkpoint），agent 用一个不调用模型的
+StateGraph（MessagesState + 固定回复），对比
+    full:   checkpointer 原样保存（每个 checkpoint 都是完整的 messages）
+    delta:  DeltaCheckpointSaver(snapshot_every=--snapshot-every) 包装同一种 checkpointer
+--saver sqlite 时为 PooledSqliteSaver（写入量 = 表中 checkpoint / metadata / writes 的字节数），
+--saver memory 时为 InMemorySaver（写入量 = 保存的序列化字节数）。
+报告写入的总字节数、平均每轮的写入耗时，以及还原最新 checkpoint（get_tuple，sqlite 时用新的连接）的 p50 / p99 延迟。
+运行：uv run -m benchmarks.checkpoint_delta [--turns 10 100 1000] [--snapshot-every 20] [--saver sqlite|memory]
+"""
+
+
+def build_graph(reply_chars: int):
+    from langchain_core.messages import AIMessage
+    from langgraph.graph import START, MessagesState, StateGraph
+
+    reply = "好的，这是我的回答。" * (reply_chars // 10)
+
+    def respond(state: MessagesState) -> dict:
+        return {"messages": [AIMessage(reply)]}
+
+    graph = StateGraph(MessagesState)
+    graph.add_node(respond)
+    graph.add_edge(START, "respond")
+    return graph
+
+
+def stored_bytes(saver) -> int:
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    if isinstance(saver, InMemorySaver):
+        checkpoints = sum(len(c[1]) + len(m[1]) for ns in saver.storage.values() for cps in ns.values() for c, m, _ in cps.values())
+        writes = sum(len(w[2][1]) for ws in saver.writes.values() for w in ws.values())
+        return checkpoints + writes + sum(len(b[1]) for b in saver.blobs.values())
+    with saver._reader() as conn:
+        checkpoints = conn.execute("SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints").fetchone()[0]
+        writes = conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes").fetchone()[0]
+    return checkpoints + writes
+
+
+def measure(mode: str, turns: int, args) -> dict:
+    from langgraph.checkpoint.memory import InMemorySaver
+    from app.checkpoint_delta import DeltaCheckpointSaver
+    from app.checkpoint_sqlite import PooledSqliteSaver
+
+    graph = build_graph(args.reply_chars)
+    config = {"configurable": {"thread_id": "long-conversation"}}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "checkpoints.sqlite"
+        inner = InMemorySaver() if args.saver == "memory" else PooledSqliteSaver(path)
+        wrap = (lambda saver: DeltaCheckpointSaver(saver, snapshot_every=args.snapshot_every)) if mode == "delta" else (lambda saver: saver)
+        agent = graph.compile(checkpointer=wrap(inner))
+        start = time.perf_counter()
+        for turn in range(turns):
+            agent.invoke({"messages": [{"role": "user", "content": f"第 {turn} 个问题"}]}, config)
+        write_time = time.perf_counter() - start
+        size = stored_bytes(inner)
+
+        # 还原：sqlite 用新的 saver（没有缓存），memory 用同一个 InMemorySaver 上新的包装
+        reader = PooledSqliteSaver(path) if args.saver == "sqlite" else inner
+        saver = wrap(reader)
+        restores = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            restored = saver.get_tuple(config)
+            restores.append(time.perf_counter() - start)
+        assert len(restored.checkpoint["channel_values"]["messages"]) == 2 * turns
+        if args.saver == "sqlite":
+            reader.close()
+            inner.close()
+    restores.sort()
+    return {
+        "bytes": size,
+        "turn_ms": write_time / turns * 1e3,
+        "p50": statistics.median(restores) * 1e3,
+        "p99": restores[min(len(restores) - 1, int(len(restores) * 0.99))] * 1e3,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="增量 checkpoint 的写入量和还原延迟")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--snapshot-every", type=int, default=20)
+    parser.add_argument("--saver", choices=["sqlite", "memory"], default="sqlite")
+    parser.add_argument("--reply-chars", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20, help="还原的次数")
+    args = parser.parse_args()
+
+    print(f"saver={args.saver} snapshot_every={args.snapshot_every} reply={args.reply_chars} chars")
+    print(f"{'turns':>6} {'mode':<7}{'bytes':>14}{'ratio':>8}{'turn(ms)':>10}{'restore p50':>13}{'p99':>9}")
+    for turns in args.turns:
+        baseline = None
+        for mode in ("full", "delta"):
+            r = measure(mode, turns, args)
+            baseline = baseline or r["bytes"]
+            print(f"{turns:>6} {mode:<7}{r['bytes']:>14,}{r['bytes'] / baseline:>8.3f}{r['turn_ms']:>10.2f}"
+                  f"{r['p50']:>13.2f}{r['p99']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
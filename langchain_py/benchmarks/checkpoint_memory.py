@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+"""
+内存 checkpointer 的 soak 测试：依次和 --threads 个会话（thread）各对话一轮，每 --revisit-every 轮回到
+--revisit-lag 轮之前的某个会话再对话一轮（检查历史是否还在），对比
+    unbounded:  InMemorySaver()，所有 thread 的所有 checkpoint 一直留在内存
+    bounded:    BoundedInMemorySaver(max_threads=--max-threads)，超出时按 LRU 丢弃
+    spill:      同上，被淘汰的 thread 写入 SQLite（PooledSqliteSaver），再次访问时读回
+agent 用一个不调用模型的 StateGraph（MessagesState + 固定回复），只测 langgraph 和 checkpointer 本身。
+每种模式在单独的子进程里运行，RSS 互不影响；报告随 thread 数增长的 RSS、每轮耗时、回访时历史保留的比例。
+运行：uv run -m benchmarks.checkpoint_memory [--threads 100000] [--max-threads 2000] [--modes unbounded,bounded,spill]
+"""
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def _rss_mb() -> float:
+    # 当前 RSS；没有 /proc 时退回到峰值（ru_maxrss，Linux 上单位是 KB，macOS 上是字节）
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 2**20 if sys.platform == "darwin" else maxrss / 1024
+
+
+def worker(args) -> None:
+    from langchain_core.messages import AIMessage
+    from langgraph.checkpoint.memory import InMemorySaver
+    from langgraph.graph import START, MessagesState, StateGraph
+    from app.checkpoint_memory import BoundedInMemorySaver
+    from app.checkpoint_sqlite import PooledSqliteSaver
+
+    reply = "好的，我记下来了。" * (args.reply_chars // 9)
+
+    def respond(state: MessagesState) -> dict:
+        return {"messages": [AIMessage(reply)]}
+
+    graph = StateGraph(MessagesState)
+    graph.add_node(respond)
+    graph.add_edge(START, "respond")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.worker == "unbounded":
+            memory = InMemorySaver()
+        else:
+            spill = None
+            if args.worker == "spill":
+                spill = PooledSqliteSaver(Path(tmp) / "spill.sqlite", readers=1, mmap_size=0, cache_size_kb=8 * 1024)
+            memory = BoundedInMemorySaver(max_threads=args.max_threads, spill=spill)
+        agent = graph.compile(checkpointer=memory)
+
+        def chat(thread: int) -> int:
+            config = {"configurable": {"thread_id": f"thread-{thread}"}}
+            result = agent.invoke({"messages": [{"role": "user", "content": f"我是第 {thread} 位用户"}]}, config)
+            return len(result["messages"])
+
+        baseline = _rss_mb()
+        sample_every = max(args.threads // args.samples, 1)
+        turns, revisits, kept = 0, 0, 0
+        start = time.perf_counter()
+        for i in range(1, args.threads + 1):
+            chat(i)
+            turns += 1
+            if i > args.revisit_lag and i % args.revisit_every == 0:
+                # 第二轮对话：历史还在时有 4 条消息
+                kept += chat(i - args.revisit_lag) == 4
+                revisits += 1
+                turns += 1
+            if i % sample_every == 0:
+                print(json.dumps({"threads": i, "rss": _rss_mb() - baseline}), flush=True)
+        elapsed = time.perf_counter() - start
+        print(json.dumps({
+            "turn_ms": elapsed / turns * 1e3,
+            "kept": kept / revisits if revisits else 0.0,
+            "in_memory": getattr(memory, "thread_count", len(memory.storage)),
+            "stats": str(getattr(memory, "stats", "")),
+        }), flush=True)
+
+
+def run_mode(mode: str, args) -> tuple[dict[int, float], dict]:
+    cmd = [
+        sys.executable, "-m", "benchmarks.checkpoint_memory", "--worker", mode,
+        "--threads", str(args.threads), "--max-threads", str(args.max_threads), "--samples", str(args.samples),
+        "--revisit-every", str(args.revisit_every), "--revisit-lag", str(args.revisit_lag),
+        "--reply-chars", str(args.reply_chars),
+    ]
+    output = subprocess.run(cmd, cwd=PROJECT_DIR, capture_output=True, text=True, check=True).stdout
+    samples, summary = {}, {}
+    for line in output.splitlines():
+        record = json.loads(line)
+        if "threads" in record:
+            samples[record["threads"]] = record["rss"]
+        else:
+            summary = record
+    return samples, summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="内存 checkpointer 的 soak 测试")
+    parser.add_argument("--threads", type=int, default=100_000)
+    parser.add_argument("--max-threads", type=int, default=2000)
+    parser.add_argument("--samples", type=int, default=10, help="RSS 采样次数")
+    parser.add_argument("--revisit-every", type=int, default=10)
+    parser.add_argument("--revisit-lag", type=int, default=5000)
+    parser.add_argument("--reply-chars", type=int, default=500)
+    parser.add_argument("--modes", default="unbounded,bounded,spill")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    modes = args.modes.split(",")
+    results = {mode: run_mode(mode, args) for mode in modes}
+    print(f"threads={args.threads} max_threads={args.max_threads} revisit every {args.revisit_every} "
+          f"turns, {args.revisit_lag} threads back; reply={args.reply_chars} chars")
+    print("RSS 增长（MB）")
+    print(f"{'threads':>9}" + "".join(f"{mode:>12}" for mode in modes))
+    for threads in sorted(results[modes[0]][0]):
+        print(f"{threads:>9}" + "".join(f"{results[mode][0].get(threads, 0.0):>12.1f}" for mode in modes))
+    print(f"\n{'mode':<11}{'turn(ms)':>9}{'kept':>7}{'in_memory':>11}  stats")
+    for mode in modes:
+        summary = results[mode][1]
+        print(f"{mode:<11}{summary['turn_ms']:>9.2f}{summary['kept']:>7.0%}{summary['in_memory']:>11}  {summary['stats']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import random
+import time
+from pathlib import Path
+
+"""
+checkpoint 序列化的压缩率和编解码吞吐：语料是 --conversations 个中文对话（用户提问、带工具调用的回答、工具结果），
+每轮保存一个包含完整 messages 的 checkpoint（和 SqliteSaver 保存的 checkpoint 列一致）；
+也可以用 --from-sqlite 读取已有的 checkpoints.sqlite。按对话分成训练集（80%，训练字典）和测试集（其余，计算下面的指标），对比
+    msgpack:    JsonPlusSerializer，checkpointer 默认的 serde（不压缩）
+    zlib / zstd:            CompressedSerializer，不用字典
+    zlib+dict / zstd+dict:  CompressedSerializer，用训练集训练的共享字典（--dict-size）
+报告保存的总字节数和相对 msgpack 的比例、dumps_typed / loads_typed 的吞吐（按 msgpack 字节数计算的 MB/s），
+并检查每种方式都能读取 msgpack（加入压缩之前保存的）checkpoint。--save 把训练的字典写入文件（CHECKPOINT_DICTIONARY_PATH）。
+运行：uv run -m benchmarks.checkpoint_serde [--conversations 200] [--dict-size 32768] [--save .cache/checkpoints.dict]
+"""
+
+QUESTIONS = [
+    "你好，我叫{name}，想了解一下{city}明天的天气。",
+    "帮我查一下{city}到上海的高铁，{day}出发。",
+    "我叫什么名字？",
+    "{city}有哪些适合周末带孩子去的景点？",
+    "把刚才的行程整理成一个表格。",
+    "推荐几本关于{topic}的入门书。",
+    "用三句话解释一下{topic}是什么。",
+    "{day}的会议改到下午三点，帮我通知一下大家。",
+]
+ANSWERS = [
+    "你好，{name}！很高兴认识你。{city}明天多云转晴，气温 12 到 21 摄氏度，东南风 3 级，适合出行。",
+    "已为你查询到{day}从{city}出发的车次：G102 08:00 出发，G108 09:30 出发，二等座均有余票。需要我帮你预订吗？",
+    "你刚才告诉我你叫{name}。如果还有其他需要，随时告诉我。",
+    "{city}适合亲子游的地方有：科技馆、动物园、植物园和湿地公园。建议提前在官方小程序预约门票。",
+    "好的，下面是整理后的行程：\n| 时间 | 安排 |\n| --- | --- |\n| 上午 | 出发前往{city} |\n| 下午 | 参观景点 |",
+    "关于{topic}，推荐从这几本开始：《{topic}导论》《深入浅出{topic}》《{topic}实战》。先读导论，再结合实践。",
+    "{topic}是一门研究如何让计算机从数据中学习规律的学科。它通过模型拟合数据。训练好的模型可以对新数据做出预测。",
+    "已经把{day}的会议改到下午三点，并通过邮件通知了所有参会人。",
+]
+TOOL_RESULTS = [
+    '{{"city": "{city}", "date": "{day}", "weather": "多云转晴", "temp_min": 12, "temp_max": 21, "wind": "东南风3级"}}',
+    '{{"trains": [{{"no": "G102", "depart": "08:00", "seats": "有"}}, {{"no": "G108", "depart": "09:30", "seats": "有"}}]}}',
+    '{{"status": "ok", "notified": ["张三", "李四", "王五"], "time": "{day} 15:00"}}',
+]
+NAMES = ["疯狂踩坑人", "Charlie", "小明", "王小红", "李雷", "韩梅梅"]
+CITIES = ["北京", "杭州", "成都", "广州", "西安", "南京", "武汉"]
+DAYS = ["周一", "周三", "周五", "明天", "后天", "下周二"]
+TOPICS = ["机器学习", "量子计算", "数据库", "操作系统", "编译原理"]
+
+
+def build_corpus(conversations: int, turns: int, seed: int) -> list[list[dict]]:
+    """每个对话一组 checkpoint（每轮一个），checkpoint 里是到这一轮为止的完整 messages"""
+    from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+    from langgraph.checkpoint.base import empty_checkpoint
+
+    rng = random.Random(seed)
+    corpus = []
+    for c in range(conversations):
+        messages, checkpoints = [], []
+        for turn in range(rng.randint(1, turns)):
+            slots = {"name": rng.choice(NAMES), "city": rng.choice(CITIES), "day": rng.choice(DAYS), "topic": rng.choice(TOPICS)}
+            i = rng.randrange(len(QUESTIONS))
+            messages.append(HumanMessage(QUESTIONS[i].format(**slots)))
+            if rng.random() < 0.4:
+                call_id = f"call_{c}_{turn}"
+                tool = rng.choice(["get_weather", "search_trains", "send_notice"])
+                messages.append(AIMessage("", tool_calls=[{"name": tool, "args": slots, "id": call_id}]))
+                messages.append(ToolMessage(rng.choice(TOOL_RESULTS).format(**slots), tool_call_id=call_id, name=tool))
+            messages.append(AIMessage(ANSWERS[i].format(**slots), response_metadata={"model_name": "qwen3-32b", "finish_reason": "stop"}))
+            checkpoint = empty_checkpoint()
+            checkpoint["channel_values"] = {"messages": list(messages)}
+            checkpoints.append(checkpoint)
+        corpus.append(checkpoints)
+    return corpus
+
+
+def load_sqlite(path: Path) -> list[list[dict]]:
+    """已有数据库里的 checkpoint，按 thread 分组（压缩保存的值按 CHECKPOINT_* 配置解码）"""
+    import sqlite3
+    from app.checkpoint_serde import CompressedSerializer, default_serde
+
+    serde = default_serde() or CompressedSerializer()
+    threads: dict[str, list] = {}
+    with sqlite3.connect(path) as conn:
+        for thread_id, type_, data in conn.execute("SELECT thread_id, type, checkpoint FROM checkpoints ORDER BY thread_id"):
+            threads.setdefault(thread_id, []).append(serde.loads_typed((type_, data)))
+    return list(threads.values())
+
+
+def throughput(serde, objects: list, raw_bytes: int, repeat: int) -> tuple[list, float, float]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        typed = [serde.dumps_typed(obj) for obj in objects]
+    encode = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in typed:
+            serde.loads_typed(item)
+    decode = time.perf_counter() - start
+    mb = raw_bytes * repeat / 2**20
+    return typed, mb / encode, mb / decode
+
+
+def main() -> None:
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    from app.checkpoint_serde import CompressedSerializer, train_dictionary
+
+    parser = argparse.ArgumentParser(description="checkpoint 序列化的压缩率和编解码吞吐")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20, help="每个对话最多的轮数")
+    parser.add_argument("--from-sqlite", type=Path, help="用已有的 checkpoints.sqlite 作为语料")
+    parser.add_argument("--dict-size", type=int, default=32 * 1024)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", type=Path, help="把训练的字典写入这个文件")
+    args = parser.parse_args()
+
+    corpus = load_sqlite(args.from_sqlite) if args.from_sqlite else build_corpus(args.conversations, args.turns, args.seed)
+    split = max(int(len(corpus) * 0.8), 1)
+    train = [cp for checkpoints in corpus[:split] for cp in checkpoints]
+    test = [cp for checkpoints in corpus[split:] for cp in checkpoints] or train
+
+    plain = JsonPlusSerializer()
+    dictionary = train_dictionary([plain.dumps_typed(cp)[1] for cp in train], args.dict_size)
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_bytes(dictionary)
+        print(f"字典已写入 {args.save}")
+
+    legacy = [plain.dumps_typed(cp) for cp in test]
+    raw_bytes = sum(len(data) for _, data in legacy)
+    modes = {"msgpack": plain}
+    for codec in ("zlib", "zstd"):
+        modes[codec] = CompressedSerializer(codec=codec, min_size=0)
+        modes[f"{codec}+dict"] = CompressedSerializer(codec=codec, dictionaries=[dictionary], min_size=0)
+
+    print(f"corpus: {len(corpus)} conversations, train {len(train)} / test {len(test)} checkpoints, "
+          f"test msgpack {raw_bytes:,} bytes; dictionary {len(dictionary):,} bytes")
+    print(f"{'mode':<11}{'bytes':>12}{'ratio':>8}{'encode MB/s':>13}{'decode MB/s':>13}  legacy")
+    for name, serde in modes.items():
+        typed, encode, decode = throughput(serde, test, raw_bytes, args.repeat)
+        stored = sum(len(data) for _, data in typed)
+        # 加入压缩之前保存的 checkpoint 也要能读取
+        compatible = all(serde.loads_typed(item) == cp for item, cp in zip(legacy, test))
+        print(f"{name:<11}{stored:>12,}{stored / raw_bytes:>8.3f}{encode:>13.1f}{decode:>13.1f}  {'ok' if compatible else 'FAIL'}")
+
+
+if __name__ == "__main__":
+    main()
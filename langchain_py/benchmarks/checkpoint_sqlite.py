@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from benchmarks.stub_server import percentile
+
+"""
+SQLite checkpointer 的读写吞吐：--concurrency 个会话同时进行，每个会话连续 --turns 轮，每轮和 agent 的一步一样
+先 get_tuple 读出最新的 checkpoint，在 messages 后追加一问一答，再 put 新的 checkpoint 和一条 put_writes。对比
+    sqlite:  SqliteSaver(sqlite3.connect(path, check_same_thread=False))，test_sqlite_saver 原来的写法
+    pooled:  PooledSqliteSaver(path)：WAL + synchronous=NORMAL，只读连接池，单独的写线程按批提交
+--async 时每个会话是一个 asyncio task，sqlite 换成 AsyncSqliteSaver（aiosqlite）。
+报告每秒完成的操作数（get + put + put_writes）、get / put 的 p50 / p99 延迟，以及 pooled 平均每次提交的写入数。
+运行：uv run -m benchmarks.checkpoint_sqlite [--concurrency 1 8 64] [--turns 20] [--async]
+"""
+
+
+def next_checkpoint(latest, turn: int, message_chars: int):
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langgraph.checkpoint.base import empty_checkpoint
+
+    messages = list(latest.checkpoint["channel_values"]["messages"]) if latest else []
+    messages += [HumanMessage(f"第 {turn} 个问题：" + "问" * message_chars), AIMessage("回答：" + "答" * message_chars)]
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"messages": messages}
+    checkpoint["channel_versions"] = {"messages": turn + 1}
+    checkpoint["updated_channels"] = ["messages"]
+    return checkpoint, messages[-1]
+
+
+def run_threads(saver, concurrency: int, turns: int, message_chars: int) -> tuple[float, list[float], list[float]]:
+    gets, puts = [], []
+    lock = threading.Lock()
+
+    def conversation(index: int) -> None:
+        config = {"configurable": {"thread_id": f"conversation-{index}", "checkpoint_ns": ""}}
+        local_gets, local_puts = [], []
+        for turn in range(turns):
+            start = time.perf_counter()
+            latest = saver.get_tuple(config)
+            local_gets.append(time.perf_counter() - start)
+            checkpoint, reply = next_checkpoint(latest, turn, message_chars)
+            start = time.perf_counter()
+            next_config = saver.put(latest.config if latest else config, checkpoint, {"step": turn}, {"messages": turn + 1})
+            saver.put_writes(next_config, [("messages", [reply])], f"task-{turn}")
+            local_puts.append(time.perf_counter() - start)
+        with lock:
+            gets.extend(local_gets)
+            puts.extend(local_puts)
+
+    threads = [threading.Thread(target=conversation, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, gets, puts
+
+
+async def run_async(saver, concurrency: int, turns: int, message_chars: int) -> tuple[float, list[float], list[float]]:
+    gets, puts = [], []
+
+    async def conversation(index: int) -> None:
+        config = {"configurable": {"thread_id": f"conversation-{index}", "checkpoint_ns": ""}}
+        for turn in range(turns):
+            start = time.perf_counter()
+            latest = await saver.aget_tuple(config)
+            gets.append(time.perf_counter() - start)
+            checkpoint, reply = next_checkpoint(latest, turn, message_chars)
+            start = time.perf_counter()
+            next_config = await saver.aput(latest.config if latest else config, checkpoint, {"step": turn}, {"messages": turn + 1})
+            await saver.aput_writes(next_config, [("messages", [reply])], f"task-{turn}")
+            puts.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(conversation(i) for i in range(concurrency)))
+    return time.perf_counter() - start, gets, puts
+
+
+async def measure_async(mode: str, path: Path, args, concurrency: int):
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    from app.checkpoint_sqlite import PooledSqliteSaver
+
+    if mode == "sqlite":
+        async with AsyncSqliteSaver.from_conn_string(str(path)) as saver:
+            return await run_async(saver, concurrency, args.turns, args.message_chars), ""
+    with PooledSqliteSaver(path) as saver:
+        return await run_async(saver, concurrency, args.turns, args.message_chars), f"{saver.stats.writes_per_commit:.1f}"
+
+
+def measure(mode: str, path: Path, args, concurrency: int):
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    from app.checkpoint_sqlite import PooledSqliteSaver
+
+    if mode == "sqlite":
+        conn = sqlite3.connect(path, check_same_thread=False)
+        try:
+            return run_threads(SqliteSaver(conn), concurrency, args.turns, args.message_chars), ""
+        finally:
+            conn.close()
+    with PooledSqliteSaver(path) as saver:
+        return run_threads(saver, concurrency, args.turns, args.message_chars), f"{saver.stats.writes_per_commit:.1f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SQLite checkpointer 的读写吞吐")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--message-chars", type=int, default=200)
+    parser.add_argument("--async", dest="use_async", action="store_true", help="asyncio task + 异步方法（sqlite 为 AsyncSqliteSaver）")
+    args = parser.parse_args()
+
+    print(f"mode={'async' if args.use_async else 'threads'} turns={args.turns} message_chars={args.message_chars}")
+    print(f"{'conc':>5} {'saver':<8}{'ops/s':>9}{'get p50':>9}{'get p99':>9}{'put p50':>9}{'put p99':>9}{'w/commit':>10}")
+    for concurrency in args.concurrency:
+        for mode in ("sqlite", "pooled"):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / "checkpoints.sqlite"
+                if args.use_async:
+                    (elapsed, gets, puts), batch = asyncio.run(measure_async(mode, path, args, concurrency))
+                else:
+                    (elapsed, gets, puts), batch = measure(mode, path, args, concurrency)
+            ops = len(gets) + 2 * len(puts)
+            print(f"{concurrency:>5} {mode:<8}{ops / elapsed:>9.0f}{percentile(gets, 50) * 1e3:>9.2f}{percentile(gets, 99) * 1e3:>9.2f}"
+                  f"{percentile(puts, 50) * 1e3:>9.2f}{percentile(puts, 99) * 1e3:>9.2f}{batch:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from benchmarks.stub_server import percentile
+from app.complexity import ComplexityModel, heuristic_complexity, read_decision_log
+from app.local_classifier import LocalClassifier
+
+"""
+本地复杂度分类器评估：在记录下来的 LLM 路由结果（_judge_complexity 的 simple / complex）上做 k 折交叉验证，对比
+    heuristic:        heuristic_complexity（长度 / 关键词规则，无法判断时交给 LLM）
+    centroid:         字符 n-gram 最近质心（app.local_classifier.LocalClassifier）
+    logreg:           ComplexityModel 完全替代 LLM（阈值 0.5）
+    logreg@t:         ComplexityModel 作为预分类器，概率不够确定时交给 LLM
+报告与 LLM 路由的一致率（只统计本地做出判断的问题）、本地判断的比例、每次判断的延迟，以及模型文件的加载耗时。
+不需要模型服务。默认使用下面的内置数据，--log 可以换成 ComplexityRouter(decision_log=...) 记录的真实结果，
+--save 在全部数据上训练后保存模型（配合 COMPLEXITY_MODEL_PATH 使用）。
+运行：uv run -m benchmarks.complexity_classifier [--folds 5] [--log decisions.jsonl] [--save .cache/complexity_model.npy]
+"""
+
+# 记录下来的路由结果：(用户问题, LLM 的判断)
+DECISIONS: list[tuple[str, str]] = [
+    ("1.9 和1.11 哪个数字大？", "simple"), ("鲸鱼是哺乳动物吗？", "simple"), ("北京今天天气怎么样？", "simple"),
+    ("把这句话翻译成英文：今天很开心", "simple"), ("100字内，介绍下langchain。", "simple"), ("Python 中列表和元组的区别？", "simple"),
+    ("中国的首都是哪里？", "simple"), ("一年有多少天？", "simple"), ("帮我润色一下：我们明天开会", "simple"),
+    ("HTTP 404 是什么意思？", "simple"), ("水的沸点是多少度？", "simple"), ("光速是多少？", "simple"),
+    ("git 怎么撤销上一次提交？", "simple"), ("linux 怎么查看当前目录？", "simple"), ("苹果用英语怎么说？", "simple"),
+    ("三角形内角和是多少？", "simple"), ("现在几点了？", "simple"), ("推荐一本入门的 Python 书", "simple"),
+    ("谁写了《红楼梦》？", "simple"), ("json 是什么？", "simple"), ("1 公里等于多少米？", "simple"),
+    ("翻译：Good morning", "simple"), ("地球到月球多远？", "simple"), ("pip 怎么安装指定版本？", "simple"),
+    ("什么是 API？", "simple"), ("周末去哪里玩比较好？", "simple"), ("给我讲个笑话", "simple"),
+    ("CPU 和 GPU 有什么区别？", "simple"), ("把 hello world 改成大写", "simple"), ("太阳系有几大行星？", "simple"),
+    ("docker ps 是做什么的？", "simple"), ("3 的平方是多少？", "simple"), ("帮我把这段话缩短一点：会议改到下午三点", "simple"),
+    ("长城有多长？", "simple"), ("什么是机器学习？简单说一下", "simple"), ("端午节是几月几号？", "simple"),
+    ("爱因斯坦是哪国人？", "simple"), ("SQL 中 where 和 having 的区别？", "simple"), ("Markdown 怎么加粗？", "simple"),
+    ("早上好，今天有什么新闻？", "simple"), ("2 的 10 次方是多少？", "simple"), ("python 怎么读取 json 文件？", "simple"),
+    ("请用langchain 1.x 设计一个简单的问答系统，用户可以向系统咨询某地的天气信息，包括天气工具调用。", "complex"),
+    ("设计一个支持千万级用户的短链接系统，给出架构和数据库设计", "complex"),
+    ("证明根号2是无理数，写出完整推导过程", "complex"),
+    ("帮我写一个带重试和限流的异步爬虫，要求支持断点续爬", "complex"),
+    ("对比 Kafka、RabbitMQ 和 RocketMQ 的优缺点，给出选型建议", "complex"),
+    ("这段代码报错 KeyError，帮我一步步排查原因并修复", "complex"),
+    ("写一篇 3000 字的关于人工智能伦理的文章", "complex"),
+    ("推导一下逻辑回归的梯度公式，并解释正则化的作用", "complex"),
+    ("我们的服务 p99 延迟突然升高，可能的原因有哪些？如何系统地排查？", "complex"),
+    ("用 React 和 FastAPI 实现一个带登录的待办事项应用，给出完整代码", "complex"),
+    ("分析一下微服务拆分的原则，并结合电商系统举例说明", "complex"),
+    ("如何设计一个分布式锁？需要考虑哪些异常情况？", "complex"),
+    ("比较动态规划和贪心算法，并分别用它们解背包问题", "complex"),
+    ("帮我规划一个为期三个月的机器学习学习路线，包括每周的目标和资料", "complex"),
+    ("实现一个 LRU 缓存，要求 O(1) 的 get 和 put，并写单元测试", "complex"),
+    ("解释 Transformer 的注意力机制，并推导缩放点积注意力为什么要除以根号 d", "complex"),
+    ("帮我 review 这个数据库表结构，指出范式问题并给出重构方案", "complex"),
+    ("写一个 Python 脚本，批量重命名文件夹中的图片并按拍摄日期分类", "complex"),
+    ("我的 Kubernetes pod 一直 CrashLoopBackOff，日志如下，帮我分析", "complex"),
+    ("设计一个推荐系统的召回和排序流程，说明每一层的模型选择", "complex"),
+    ("用数学归纳法证明 1+2+...+n = n(n+1)/2", "complex"),
+    ("权衡一下单体架构和微服务架构在初创公司的利弊", "complex"),
+    ("帮我把这个 2000 行的遗留模块重构成可测试的结构，给出步骤", "complex"),
+    ("实现一个支持撤销和重做的文本编辑器核心数据结构", "complex"),
+    ("解释 CAP 定理，并分析 etcd、Cassandra 分别做了什么取舍", "complex"),
+    ("写一份新产品上线的完整发布计划，包括灰度、监控和回滚方案", "complex"),
+    ("分析 2008 年金融危机的成因及其对全球经济的长期影响", "complex"),
+    ("优化这个 SQL 查询，表有 5 亿行，现在要跑 30 秒", "complex"),
+    ("用 Rust 写一个线程安全的无锁队列并解释内存序的选择", "complex"),
+    ("详细说明 TCP 拥塞控制的各个阶段，并比较 Cubic 和 BBR", "complex"),
+    ("帮我设计一个 agent，能够自动调用搜索和计算器工具完成多步任务", "complex"),
+    ("一个球从 10 米高处自由落下，每次弹回一半高度，求总路程并给出推导", "complex"),
+    ("为一家咖啡店写一份商业计划书，包括市场分析和财务预测", "complex"),
+    ("讲解一下快速排序的原理，分析最坏情况并给出优化方法", "complex"),
+]
+
+
+def cross_validate(texts: list[str], labels: list[str], folds: int, seed: int):
+    """按折产出 (训练集, 测试集)"""
+    order = list(range(len(texts)))
+    random.Random(seed).shuffle(order)
+    for k in range(folds):
+        test = set(order[k::folds])
+        train = [i for i in order if i not in test]
+        yield ([texts[i] for i in train], [labels[i] for i in train]), [(texts[i], labels[i]) for i in sorted(test)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地复杂度分类器评估")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.8])
+    parser.add_argument("--log", help="ComplexityRouter 的 decision_log（JSON Lines），默认使用内置数据")
+    parser.add_argument("--save", help="在全部数据上训练并保存模型")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.log:
+        texts, labels = read_decision_log(args.log)
+    else:
+        texts, labels = [t for t, _ in DECISIONS], [label for _, label in DECISIONS]
+
+    # 名称 -> (判断次数, 一致次数, 交给 LLM 的次数, 每次判断的耗时)
+    results: dict[str, list] = {}
+
+    def record(name: str, label: str, predicted: str | None, elapsed: float) -> None:
+        entry = results.setdefault(name, [0, 0, 0, []])
+        entry[3].append(elapsed)
+        if predicted is None:
+            entry[2] += 1
+        else:
+            entry[0] += 1
+            entry[1] += predicted == label
+
+    train_times = []
+    for (train_texts, train_labels), test in cross_validate(texts, labels, args.folds, args.seed):
+        start = time.perf_counter()
+        model = ComplexityModel.train(train_texts, train_labels)
+        train_times.append(time.perf_counter() - start)
+        examples = {label: [t for t, l in zip(train_texts, train_labels) if l == label] for label in ("simple", "complex")}
+        centroid = LocalClassifier(examples, min_similarity=0.0, min_margin=0.0, memo_size=0)
+        classifiers = {
+            "heuristic": heuristic_complexity,
+            "centroid": lambda text: centroid.classify(text).label,
+            "logreg": model.predict,
+            **{f"logreg@{t}": model.classifier(t) for t in args.thresholds},
+        }
+        for text, label in test:
+            for name, classify in classifiers.items():
+                start = time.perf_counter()
+                predicted = classify(text)
+                record(name, label, predicted, time.perf_counter() - start)
+
+    print(f"decisions={len(texts)} (complex={labels.count('complex')}) folds={args.folds} "
+          f"train p50={percentile(train_times, 50) * 1e3:.0f}ms")
+    print(f"{'classifier':<14}{'agreement':>10}{'local':>8}{'to LLM':>8}{'p50(us)':>9}{'p99(us)':>9}")
+    for name, (decided, agreed, deferred, timings) in results.items():
+        agreement = agreed / decided if decided else 0.0
+        print(f"{name:<14}{agreement:>10.1%}{decided / len(texts):>8.0%}{deferred:>8}"
+              f"{percentile(timings, 50) * 1e6:>9.0f}{percentile(timings, 99) * 1e6:>9.0f}")
+
+    model = ComplexityModel.train(texts, labels)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "complexity_model.npy"
+        model.save(path)
+        loads = []
+        for _ in range(20):
+            start = time.perf_counter()
+            ComplexityModel.load(path)
+            loads.append(time.perf_counter() - start)
+        print(f"\nmodel file {path.stat().st_size / 1024:.1f}KB, load p50={percentile(loads, 50) * 1e6:.0f}us")
+    if args.save:
+        model.save(args.save)
+        print(f"saved to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
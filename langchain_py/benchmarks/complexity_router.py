@@ -0,0 +1,90 @@
+import argparse
+import importlib
+import os
+import re
+import time
+from benchmarks.stub_server import StubConfig, StubServer, percentile, stub_env
+
+"""
+复杂度路由基准：app/3/agent.py 的 dynamic_model_selection + compare_two_numbers，多轮会话（带工具循环）中对比
+    none:       每次模型调用都请 LLM 分类（原来的做法）
+    cache:      按 (thread_id, 最新的用户消息) 缓存，每轮对话只分类一次
+    heuristic:  缓存 + heuristic_complexity 预分类，寒暄 / 明显的复杂任务不调用 LLM
+stub 的分类模型按问题返回固定的 simple / complex，回答模型遇到比较数字的问题时先调用 compare_two_numbers。
+报告每个会话的分类调用数、省下的调用数、会话耗时，以及各回答模型的调用数（与 none 一致说明路由结果没有变化）。
+运行：uv run -m benchmarks.complexity_router [--router-latency 0.3]
+"""
+
+CONVERSATIONS = [
+    ["1.9 和1.11 哪个数字大？", "那 2.5 和 2.45 呢，哪个大？", "谢谢！"],
+    ["请用langchain 1.x 设计一个简单的问答系统，用户可以向系统咨询某地的天气信息。", "3.14 和 3.141 哪个数字大？", "好的"],
+    ["100字内，介绍下langchain。", "7 和 7.0 哪个数字大？", "再见"],
+    ["你好", "帮我对比一下 LangChain 和 LlamaIndex 的优缺点", "8 和 9 哪个大？", "thanks"],
+]
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def responder(body: dict) -> dict:
+    messages = body["messages"]
+    last_user = max(i for i, m in enumerate(messages) if m["role"] == "user")
+    question = messages[last_user]["content"]
+    if body.get("model") == "qwen3_32b":
+        return {"content": "complex" if any(k in question for k in ("设计", "对比")) else "simple"}
+    numbers = _NUMBER.findall(question)
+    has_result = any(m["role"] == "tool" for m in messages[last_user:])
+    if "大" in question and len(numbers) >= 2 and not has_result:
+        return {"tool_calls": [{"name": "compare_two_numbers", "arguments": {"a": float(numbers[0]), "b": float(numbers[1])}}]}
+    return {"content": f"stub answer: {question[:20]}"}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="复杂度路由基准")
+    parser.add_argument("--router-latency", type=float, default=0.3, help="分类模型的延迟（秒）")
+    parser.add_argument("--latency", type=float, default=0.5, help="回答模型的延迟（秒）")
+    args = parser.parse_args()
+
+    config = StubConfig(latency=args.latency, responder=responder, models={"qwen3_32b": {"latency": args.router_latency}})
+    with StubServer(config) as server:
+        os.environ.update(stub_env(server.base_url))
+        from langchain.agents import create_agent
+        from langgraph.checkpoint.memory import InMemorySaver
+        from app.complexity import ComplexityRouter, heuristic_complexity
+
+        agent_module = importlib.import_module("app.3.agent")
+        judge, ajudge = agent_module._judge_complexity, agent_module._ajudge_complexity
+        routers = {
+            "none": lambda: ComplexityRouter(judge, ajudge, pre_classifiers=(), max_size=0),
+            "cache": lambda: ComplexityRouter(judge, ajudge, pre_classifiers=()),
+            "heuristic": lambda: ComplexityRouter(judge, ajudge, pre_classifiers=(heuristic_complexity,)),
+        }
+
+        turns = sum(len(c) for c in CONVERSATIONS)
+        print(f"conversations={len(CONVERSATIONS)} turns={turns} router_latency={args.router_latency}s latency={args.latency}s")
+        print(f"{'router':<11}{'decisions':>10}{'router calls':>14}{'saved/conv':>12}{'conv p50(s)':>13}  answer models")
+        for name, make_router in routers.items():
+            router = agent_module.complexity_router = make_router()
+            agent_module.compare_two_numbers.func.cache.clear()
+            agent = create_agent(
+                agent_module.glm_model(),
+                tools=[agent_module.compare_two_numbers],
+                middleware=[agent_module.dynamic_model_selection],
+                checkpointer=InMemorySaver(),
+            )
+            server.stats.reset()
+            durations = []
+            for i, conversation in enumerate(CONVERSATIONS):
+                start = time.perf_counter()
+                for question in conversation:
+                    agent.invoke(
+                        {"messages": [{"role": "user", "content": question}]},
+                        config={"configurable": {"thread_id": f"{name}-{i}"}},
+                    )
+                durations.append(time.perf_counter() - start)
+            stats = router.stats
+            answers = {model: count for model, count in server.stats.models.items() if model != "qwen3_32b"}
+            print(f"{name:<11}{stats.decisions:>10}{server.stats.models['qwen3_32b']:>14}"
+                  f"{stats.saved / len(CONVERSATIONS):>12.1f}{percentile(durations, 50):>13.2f}  {dict(sorted(answers.items()))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import os
+import time
+from benchmarks.stub_server import StubConfig, StubServer, percentile, stub_env
+
+"""
+按延迟选择模型 + 对冲请求的尾延迟基准：stub 的 ds 和 glm 都有一小部分请求会慢 slow_delay 秒，
+ds 延迟更低但有少量 500。连续发出 --n 个简单问题（ds / glm 都可以回答），对比
+    fixed:     固定用 ds
+    routing:   LatencyRoutingMiddleware(hedge=False)，按延迟 / 错误率 EWMA 选模型，报错时转移到另一个模型
+    hedged:    LatencyRoutingMiddleware，超过首选模型的 p95 还没返回时向另一个模型发出对冲请求
+报告 p50 / p95 / p99 延迟、失败数、请求数（对冲带来的额外请求）和 RoutingStats；
+--async 使用 ainvoke，落后的请求被取消，stub 端的 disconnects 即被断开的请求数。
+运行：uv run -m benchmarks.hedging [--n 200] [--slow-ratio 0.04] [--slow-delay 1.5] [--async]
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="按延迟选择模型 + 对冲请求的尾延迟基准")
+    parser.add_argument("--n", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="ds 的延迟（秒）")
+    parser.add_argument("--backup-latency", type=float, default=0.08, help="glm 的延迟（秒）")
+    parser.add_argument("--slow-ratio", type=float, default=0.04)
+    parser.add_argument("--slow-delay", type=float, default=1.5)
+    parser.add_argument("--error-ratio", type=float, default=0.01)
+    parser.add_argument("--async", dest="use_async", action="store_true", help="使用 ainvoke（取消时立即断开请求）")
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency=args.backup_latency,
+        slow_ratio=args.slow_ratio,
+        slow_delay=args.slow_delay,
+        models={"ds": {"latency": args.latency, "error_ratio": args.error_ratio}},
+    )
+    with StubServer(config) as server:
+        os.environ.update(stub_env(server.base_url))
+        from langchain.agents import create_agent
+        from app.latency_routing import LatencyRoutingMiddleware
+        from app.registry import get_chat_model
+
+        # 不做 openai 客户端自己的重试，失败直接计入
+        ds, glm = get_chat_model("ds", max_retries=0), get_chat_model("glm", max_retries=0)
+        eligible = lambda request: [ds, glm]
+        modes = {
+            "fixed": None,
+            "routing": lambda: LatencyRoutingMiddleware(eligible, hedge=False),
+            "hedged": lambda: LatencyRoutingMiddleware(eligible, min_hedge_delay=0.02, default_hedge_delay=0.3),
+        }
+
+        print(f"mode={'async' if args.use_async else 'sync'} n={args.n} ds: latency={args.latency}s "
+              f"errors={args.error_ratio:.0%}; glm: latency={args.backup_latency}s; slow={args.slow_ratio:.0%}x{args.slow_delay}s")
+        print(f"{'mode':<9}{'p50(ms)':>9}{'p95(ms)':>9}{'p99(ms)':>9}{'max(ms)':>9}{'failed':>8}{'requests':>10}{'disconnects':>13}  stats")
+        for name, make_middleware in modes.items():
+            middleware = make_middleware() if make_middleware else None
+            agent = create_agent(ds, middleware=[middleware] if middleware else [])
+            server.stats.reset()
+            latencies, failed = [], 0
+
+            def run(i: int) -> None:
+                inputs = {"messages": [{"role": "user", "content": f"问题 {i}：1 公里等于多少米？"}]}
+                if args.use_async:
+                    asyncio.run(agent.ainvoke(inputs))
+                else:
+                    agent.invoke(inputs)
+
+            for i in range(args.n):
+                start = time.perf_counter()
+                try:
+                    run(i)
+                except Exception:
+                    failed += 1
+                latencies.append(time.perf_counter() - start)
+            time.sleep(args.slow_delay)  # 等落后的请求在 stub 端结束，disconnects 才完整
+            stats = middleware.stats if middleware else ""
+            print(f"{name:<9}{percentile(latencies, 50) * 1e3:>9.0f}{percentile(latencies, 95) * 1e3:>9.0f}"
+                  f"{percentile(latencies, 99) * 1e3:>9.0f}{max(latencies) * 1e3:>9.0f}{failed:>8}"
+                  f"{server.stats.requests:>10}{server.stats.disconnects:>13}  {stats}")
+
+
+if __name__ == "__main__":
+    main()
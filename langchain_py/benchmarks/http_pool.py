@@ -0,0 +1,92 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from benchmarks.stub_server import StubConfig, StubServer, percentile, stub_env
+
+"""
+共享连接池基准：3 个 chat model + 2 个 embedding 客户端（与 app/3/agent.py、app/4/embedding.py 相同的规模）
+在多线程并发下访问本地 stub 服务，对比新建连接数与延迟。
+请求按波次轮流打到不同客户端（像 agent 在不同模型之间切换），每一波 threads 个并发请求。
+    isolated: 每个客户端各自一个连接池（openai SDK 的默认行为）
+    default:  langchain 默认行为（chat model 按 base_url/timeout 共享，embedding 各自一个）
+    shared:   app.registry + app.http_pool 的共享连接池
+运行：uv run -m benchmarks.http_pool [--threads 32] [--requests 20]
+"""
+
+
+def build_clients(mode: str):
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+    from app import registry
+    from app.config import settings
+
+    if mode == "shared":
+        registry.clear()
+        return [
+            registry.get_chat_model("glm", max_tokens=100, max_retries=0),
+            registry.get_chat_model("ds", max_tokens=100, max_retries=0),
+            registry.get_chat_model("qwen3_32b", max_tokens=100, max_retries=0),
+            registry.get_embeddings(max_retries=0, check_embedding_ctx_length=False),
+            registry.get_embeddings(max_retries=0, check_embedding_ctx_length=False, chunk_size=16),
+        ]
+
+    def own_pool() -> dict:
+        if mode == "isolated":
+            return {"http_client": httpx.Client(), "http_async_client": httpx.AsyncClient()}
+        return {}
+
+    common = dict(base_url=settings.siliconflow_base_url, api_key=settings.siliconflow_api_key, max_retries=0)
+    return [
+        ChatOpenAI(model=settings.glm_model, max_tokens=100, timeout=60, **common, **own_pool()),
+        ChatOpenAI(model=settings.ds_model, max_tokens=100, timeout=60, **common, **own_pool()),
+        ChatOpenAI(model=settings.qwen3_32b_model, max_tokens=100, timeout=60, **common, **own_pool()),
+        OpenAIEmbeddings(model=settings.embedding_model, check_embedding_ctx_length=False, **common, **own_pool()),
+        OpenAIEmbeddings(model=settings.embedding_model, check_embedding_ctx_length=False, chunk_size=16, **common, **own_pool()),
+    ]
+
+
+def call(client, i: int) -> float:
+    start = time.perf_counter()
+    if hasattr(client, "embed_query"):
+        client.embed_query(f"第 {i} 条文本")
+    else:
+        client.invoke(f"第 {i} 个问题")
+    return time.perf_counter() - start
+
+
+def run(server: StubServer, mode: str, threads: int, requests: int) -> dict:
+    clients = build_clients(mode)
+    server.stats.reset()
+    total = threads * requests
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        latencies = list(pool.map(lambda i: call(clients[(i // threads) % len(clients)], i), range(total)))
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "connections": server.stats.connections,
+        "requests": server.stats.requests,
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+        "rps": total / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="共享连接池基准")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20, help="每个线程的请求数")
+    parser.add_argument("--latency", type=float, default=0.01, help="stub 服务的响应延迟（秒）")
+    args = parser.parse_args()
+
+    with StubServer(StubConfig(latency=args.latency)) as server:
+        os.environ.update(stub_env(server.base_url))
+        print(f"{'mode':<10}{'connections':>12}{'requests':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'rps':>10}")
+        for mode in ("isolated", "default", "shared"):
+            r = run(server, mode, args.threads, args.requests)
+            print(f"{r['mode']:<10}{r['connections']:>12}{r['requests']:>10}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['rps']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
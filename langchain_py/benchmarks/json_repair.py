@@ -0,0 +1,100 @@
+import argparse
+import importlib
+import time
+from collections import Counter
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import PydanticOutputParser
+from app.json_repair import RepairingOutputParser
+
+"""
+本地 JSON 修复基准：app/2/structure_output.py 的 Movie 和 DevProcessList，在一组记录下来的模型输出
+（代码块、前后说明文字、编号列表、单引号、被截断等）上对比
+    baseline:  PydanticOutputParser，解析失败就要重新调用一次 LLM
+    repair:    RepairingOutputParser，先本地修复，修不好才重试
+报告两者需要重试的次数、省下的重试（按 --retry-latency 估算省下的时间）、各种修复的次数和本地修复的耗时。
+不需要模型服务。运行：uv run -m benchmarks.json_repair [--retry-latency 2.0]
+"""
+
+MOVIE_JSON = '{"title": "罗小黑战记2", "year": 2025, "director": "MTJJ", "rating": 8.5}'
+
+MOVIE_OUTPUTS = [
+    MOVIE_JSON,
+    f"```json\n{MOVIE_JSON}\n```",
+    f"好的，以下是《罗小黑战记2》的信息：\n{MOVIE_JSON}",
+    f"{MOVIE_JSON}\n\n说明：评分来自豆瓣，可能会随时间变化。",
+    f"以下是结果：\n```json\n{MOVIE_JSON}\n```\n如需更多信息请告诉我。",
+    "{'title': '罗小黑战记2', 'year': 2025, 'director': 'MTJJ', 'rating': 8.5}",
+    '{"title": "罗小黑战记2", "year": 2025, "director": "MTJJ", "rating": 8.5,}',
+    '{\n  "title": "罗小黑战记2",\n  "year": 2025,\n  "director": "MTJJ",\n  "rating": 8.5\n',
+    '{"title": "罗小黑战记2", "year": 2025, "director": "MTJJ", "rating": 8.5, "released": True, "sequel_of": None}',
+    # 缺少必填字段：修复不能编造，只能重试
+    '{"title": "罗小黑战记2", "year": 2025, "director": "MTJJ", "rating": 8.',
+    "《罗小黑战记2》于2025年上映，导演是MTJJ，豆瓣评分8.5。",
+]
+
+STEPS_JSON = '["需求分析", "系统设计", "编码实现", "软件测试", "部署发布", "运维维护"]'
+
+LIST_OUTPUTS = [
+    STEPS_JSON,
+    f"```json\n{STEPS_JSON}\n```",
+    f"软件开发的流程如下：{STEPS_JSON}",
+    "以下是标准软件开发流程（SDLC）的字符串列表：\n1. 需求分析\n2. 系统设计\n3. 编码实现\n4. 软件测试\n5. 部署发布\n6. 运维维护",
+    "- 需求分析\n- 系统设计\n- 编码实现\n- 软件测试\n- 部署发布\n- 运维维护",
+    "1、需求分析\n2、系统设计\n3、编码实现\n4、软件测试\n5、部署发布\n6、运维维护",
+    "需求分析, 系统设计, 编码实现, 软件测试, 部署发布, 运维维护",
+    "['需求分析', '系统设计', '编码实现', '软件测试', '部署发布', '运维维护']",
+    '["需求分析", "系统设计", "编码实现", "软件测试", "部署发布", "运维维',
+    '{"steps": ["需求分析", "系统设计", "编码实现"]}',
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地 JSON 修复基准")
+    parser.add_argument("--retry-latency", type=float, default=2.0, help="一次重试（LLM 调用）的耗时估计（秒）")
+    parser.add_argument("--repeat", type=int, default=200, help="测量本地修复耗时的重复次数")
+    args = parser.parse_args()
+
+    structure_output = importlib.import_module("app.2.structure_output")
+    corpus = {
+        "Movie": (structure_output.Movie, MOVIE_OUTPUTS),
+        "DevProcessList": (structure_output.DevProcessList, LIST_OUTPUTS),
+    }
+
+    print(f"retry_latency={args.retry_latency}s")
+    print(f"{'schema':<16}{'outputs':>8}{'baseline retries':>18}{'repair retries':>16}{'saved':>7}"
+          f"{'saved(s)':>10}{'repair p50(us)':>16}")
+    fixes: Counter = Counter()
+    total_saved = 0
+    for name, (schema, outputs) in corpus.items():
+        baseline = PydanticOutputParser(pydantic_object=schema)
+        repairing = RepairingOutputParser(pydantic_object=schema)
+        baseline_retries = 0
+        for text in outputs:
+            try:
+                baseline.parse(text)
+            except OutputParserException:
+                baseline_retries += 1
+        timings = []
+        for text in outputs:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                repairing.try_parse(text)
+            timings.append((time.perf_counter() - start) / args.repeat)
+            try:
+                repairing.parse(text)
+            except OutputParserException:
+                pass
+        stats = repairing.stats
+        fixes.update(stats.fixes)
+        saved = baseline_retries - stats.failed
+        total_saved += saved
+        timings.sort()
+        print(f"{name:<16}{len(outputs):>8}{baseline_retries:>18}{stats.failed:>16}{saved:>7}"
+              f"{saved * args.retry_latency:>10.1f}{timings[len(timings) // 2] * 1e6:>16.0f}")
+
+    print(f"\nsaved retries: {total_saved}  (~{total_saved * args.retry_latency:.1f}s of LLM calls)")
+    print("fixes: " + ", ".join(f"{fix}={count}" for fix, count in fixes.most_common()))
+
+
+if __name__ == "__main__":
+    main()
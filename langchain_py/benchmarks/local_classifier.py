@@ -0,0 +1,103 @@
+import argparse
+import importlib
+import json
+import os
+import time
+from benchmarks.stub_server import StubConfig, StubServer, percentile, stub_env
+
+"""
+本地分类器基准：在带标注的问题集上对比
+    llm only:  每个问题都调用 LLM 结构化输出分类（app/1/lcel.py 原来的做法）
+    local:     关键词 + 字符 n-gram 质心，不确定时回退到 LLM（build_topic_classifier）
+LLM 使用本地 stub 服务，按标注返回正确类别（相当于一个准确率 100%、有固定延迟的分类模型），
+所以 local 的准确率损失全部来自本地阶段的误判。
+报告：准确率、本地判断的比例和准确率、每个问题的延迟，以及按不同 min_margin 扫描的结果（用来调阈值）。
+运行：uv run -m benchmarks.local_classifier [--latency 0.5]
+"""
+
+# 与 TOPIC_EXAMPLES 不重复的标注问题
+LABELLED: list[tuple[str, str]] = [
+    ("简单回答下，鲸鱼是哺乳动物吗？", "科普"), ("月亮为什么会有阴晴圆缺？", "科普"), ("量子纠缠是什么？", "科普"),
+    ("彩虹是怎么形成的？", "科普"), ("人体有多少块骨头？", "科普"), ("为什么海水是咸的？", "科普"),
+    ("火山为什么会喷发？", "科普"), ("蜜蜂是怎么酿蜜的？", "科普"), ("太阳还能燃烧多久？", "科普"),
+    ("雷和闪电哪个先出现？", "科普"), ("DNA 的双螺旋结构是谁发现的？", "科普"), ("猫为什么喜欢晒太阳？", "科普"),
+    ("冰为什么会浮在水面上？", "科普"), ("声音在真空中能传播吗？", "科普"), ("候鸟是怎么辨别方向的？", "科普"),
+    ("怎么用 pandas 合并两个表？", "编程"), ("Python 的装饰器怎么写？", "编程"), ("React 的 useEffect 什么时候执行？", "编程"),
+    ("Docker 容器怎么挂载目录？", "编程"), ("正则表达式怎么匹配邮箱？", "编程"), ("TypeScript 泛型怎么用？", "编程"),
+    ("如何优化一个很慢的 SQL 查询？", "编程"), ("Go 语言的 goroutine 是什么？", "编程"), ("怎么解决跨域问题？", "编程"),
+    ("numpy 数组怎么转置？", "编程"), ("写一个二分查找", "编程"), ("Linux 怎么查看端口占用？", "编程"),
+    ("vue 组件之间怎么传值？", "编程"), ("怎么用 LCEL 把 prompt 和模型串起来？", "编程"), ("Rust 的所有权是什么意思？", "编程"),
+    ("帮我写封情书", "其他"), ("明天穿什么衣服好？", "其他"), ("推荐一部好看的电影", "其他"),
+    ("怎么跟父母沟通？", "其他"), ("帮我想一个生日祝福", "其他"), ("减肥期间晚上可以吃什么？", "其他"),
+    ("去云南旅游要准备什么？", "其他"), ("面试的时候怎么自我介绍？", "其他"), ("给我讲个睡前故事", "其他"),
+    ("养猫和养狗哪个好？", "其他"), ("怎么提高睡眠质量？", "其他"), ("帮我写一段朋友圈文案", "其他"),
+    ("第一次约会去哪里好？", "其他"), ("工作压力大怎么办？", "其他"), ("给新店起个名字", "其他"),
+]
+
+
+def oracle_responder(body: dict) -> dict:
+    """按标注返回正确类别（JSON），模拟结构化输出的分类模型"""
+    text = body["messages"][-1]["content"]
+    label = next((label for question, label in LABELLED if question in text), "其他")
+    return {"content": json.dumps({"type": label}, ensure_ascii=False)}
+
+
+def run(classify, dataset) -> tuple[float, list[float], list]:
+    latencies, results = [], []
+    for question, label in dataset:
+        start = time.perf_counter()
+        result = classify(question)
+        latencies.append(time.perf_counter() - start)
+        results.append((result, label))
+    return latencies, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地分类器基准")
+    parser.add_argument("--latency", type=float, default=0.5, help="stub 分类模型的延迟（秒）")
+    parser.add_argument("--margins", type=float, nargs="+", default=[0.03, 0.05, 0.1, 0.15])
+    args = parser.parse_args()
+
+    with StubServer(StubConfig(latency=args.latency, responder=oracle_responder)) as server:
+        os.environ.update(stub_env(server.base_url))
+        from app.registry import get_chat_model
+
+        lcel = importlib.import_module("app.1.lcel")
+        structured_model = get_chat_model("glm", max_tokens=100).with_structured_output(lcel.ClassifyResult)
+
+        print(f"{'mode':<22}{'accuracy':>9}{'local':>8}{'local acc':>11}{'p50(ms)':>10}{'p99(ms)':>10}{'LLM calls':>11}")
+
+        def report(name: str, latencies: list[float], pairs: list[tuple[str, str, str]]) -> None:
+            # pairs: (预测, 标注, 来源)
+            local = [(p, l) for p, l, source in pairs if source != "fallback"]
+            accuracy = sum(p == l for p, l, _ in pairs) / len(pairs)
+            local_acc = sum(p == l for p, l in local) / len(local) if local else float("nan")
+            print(f"{name:<22}{accuracy:>9.1%}{len(local) / len(pairs):>8.0%}{local_acc:>11.1%}"
+                  f"{percentile(latencies, 50) * 1e3:>10.1f}{percentile(latencies, 99) * 1e3:>10.1f}{server.stats.requests:>11}")
+
+        server.stats.reset()
+        latencies, results = run(lambda q: structured_model.invoke(f"问题：{q}").type, LABELLED)
+        report("llm only", latencies, [(r, l, "fallback") for r, l in results])
+
+        for margin in args.margins:
+            classifier = lcel.build_topic_classifier(structured_model)
+            classifier.min_margin = margin
+            classifier.learn_from_fallback = False  # 不让前面的回退结果影响后面的判断，方便比较不同阈值
+            server.stats.reset()
+            latencies, results = run(classifier.classify, LABELLED)
+            report(f"local (margin={margin})", latencies, [(r.label, l, r.source) for r, l in results])
+
+        # 回退结果加入质心：越往后，本地能判断的问题越多
+        classifier = lcel.build_topic_classifier(structured_model)
+        server.stats.reset()
+        latencies, results = run(classifier.classify, LABELLED)
+        report("local + learn", latencies, [(r.label, l, r.source) for r, l in results])
+
+        # 记忆：同样的问题再问一遍
+        server.stats.reset()
+        latencies, results = run(classifier.classify, LABELLED)
+        report("local, repeated (memo)", latencies, [(r.label, l, r.source) for r, l in results])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import os
+import time
+from benchmarks.stub_server import StubConfig, StubServer, percentile, stub_env
+
+"""
+模型调用容错的故障注入测试：stub 的 ds 按场景注入故障，glm 正常，对比
+    baseline:   ChatOpenAI 默认行为（timeout=60，openai 客户端自己重试 2 次）
+    resilient:  ResilientModelMiddleware（模型 max_retries=0，单次调用超时 --call-timeout，
+                带抖动的指数退避重试，熔断后改用 glm）
+场景：
+    errors:     30% 的请求返回 500
+    hang:       10% 的请求挂起 --hang-delay 秒
+    outage:     ds 全部返回 500（熔断器打开后直接改用 glm，不再请求 ds）
+    deadline:   ds 全部挂起，一轮对话的总时限 --turn-timeout 秒到达后直接报错
+报告成功数、p50 / p99 / max 延迟、两个模型收到的请求数、ResilienceStats 和熔断器状态。
+--async 使用 ainvoke，超时的请求被取消（stub 端的 disconnects）。
+运行：uv run -m benchmarks.resilience [--n 40] [--call-timeout 1] [--async]
+"""
+
+
+def scenarios(args) -> dict[str, dict]:
+    hang = {"hang_ratio": 1.0, "hang_delay": args.hang_delay}
+    return {
+        "errors": {"error_ratio": 0.3},
+        "hang": {"hang_ratio": 0.1, "hang_delay": args.hang_delay},
+        "outage": {"error_ratio": 1.0},
+        "deadline": hang,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="模型调用容错的故障注入测试")
+    parser.add_argument("--n", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--hang-delay", type=float, default=5.0)
+    parser.add_argument("--call-timeout", type=float, default=1.0)
+    parser.add_argument("--turn-timeout", type=float, default=3.0)
+    parser.add_argument("--async", dest="use_async", action="store_true", help="使用 ainvoke（超时时取消请求）")
+    args = parser.parse_args()
+
+    with StubServer(StubConfig(latency=args.latency)) as server:
+        os.environ.update(stub_env(server.base_url))
+        from langchain.agents import create_agent
+        from app.registry import get_chat_model
+        from app.resilience import ResilientModelMiddleware
+
+        print(f"mode={'async' if args.use_async else 'sync'} n={args.n} latency={args.latency}s "
+              f"call_timeout={args.call_timeout}s turn_timeout={args.turn_timeout}s hang_delay={args.hang_delay}s")
+        print(f"{'scenario':<10}{'mode':<11}{'ok':>5}{'p50(ms)':>9}{'p99(ms)':>9}{'max(ms)':>9}{'ds':>5}{'glm':>5}{'disc':>6}  stats")
+        for scenario, faults in scenarios(args).items():
+            # deadline 场景只跑一部分：baseline 每次都要等满 hang_delay
+            n = args.n if scenario != "deadline" else max(args.n // 10, 2)
+            for mode in ("baseline", "resilient"):
+                if mode == "baseline":
+                    agent, middleware = create_agent(get_chat_model("ds")), None
+                else:
+                    ds, glm = get_chat_model("ds", max_retries=0), get_chat_model("glm", max_retries=0)
+                    middleware = ResilientModelMiddleware(
+                        fallbacks=None if scenario == "deadline" else lambda request: [glm],
+                        call_timeout=args.call_timeout,
+                        turn_timeout=args.turn_timeout,
+                        backoff_base=0.05,
+                        backoff_max=0.5,
+                    )
+                    agent = create_agent(ds, middleware=[middleware])
+                server.config = StubConfig(latency=args.latency, models={"ds": faults})
+                server.stats.reset()
+                latencies, ok = [], 0
+                for i in range(n):
+                    inputs = {"messages": [{"role": "user", "content": f"问题 {i}：1 公里等于多少米？"}]}
+                    start = time.perf_counter()
+                    try:
+                        if args.use_async:
+                            asyncio.run(agent.ainvoke(inputs))
+                        else:
+                            agent.invoke(inputs)
+                        ok += 1
+                    except Exception:
+                        pass
+                    latencies.append(time.perf_counter() - start)
+                if mode == "resilient" and faults.get("hang_ratio"):
+                    time.sleep(args.hang_delay)  # 等超时的请求在 stub 端结束，disconnects 才完整
+                stats = f"{middleware.stats} {middleware.breaker_states()}" if middleware else ""
+                print(f"{scenario:<10}{mode:<11}{ok:>3}/{n:<2}{percentile(latencies, 50) * 1e3:>8.0f}"
+                      f"{percentile(latencies, 99) * 1e3:>9.0f}{max(latencies) * 1e3:>9.0f}"
+                      f"{server.stats.models['ds']:>5}{server.stats.models['glm']:>5}{server.stats.disconnects:>6}  {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import time
+import numpy as np
+from langchain_core.load import dumps
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.outputs import Generation
+from benchmarks.stub_server import percentile
+
+"""
+语义缓存基准：用合成的同义改写问题集评估不同阈值下的命中率和准确率，以及查找延迟。
+- 每个意图有若干槽位（城市、短语、数字……）和若干种问法；用第一种问法为前 2/3 的槽位预热缓存，
+  其余问法作为查询：槽位已缓存时应命中同一条，槽位未缓存时应未命中（例如问过北京天气，再问成都天气不能返回北京的答案）
+- precision：命中里答案正确的比例；recall：应命中的查询里正确命中的比例；false hit：返回了错误答案的查询数
+- 最后测量索引规模对单次查找的影响（embedding 之外的矩阵扫描耗时）
+运行：uv run -m benchmarks.semantic_cache [--embeddings hashing|embedding]
+    hashing 为本地字符 n-gram 向量（不需要网络），embedding 为 app.registry 中配置的 embedding 模型
+"""
+
+INTENTS: dict[str, tuple[list[str], list]] = {
+    "weather": (
+        ["{0}明天天气怎么样？", "明天{0}的天气如何", "请告诉我{0}明天的天气", "{0}明天会下雨吗，天气怎样"],
+        ["北京", "上海", "广州", "深圳", "杭州", "成都"],
+    ),
+    "translate": (
+        ["把“{0}”翻译成中文", "“{0}”用中文怎么说", "请翻译：{0}", "{0} 是什么意思？翻译一下"],
+        ["I love programming", "Good morning", "See you tomorrow", "How are you", "Thank you very much", "Nice to meet you"],
+    ),
+    "concept": (
+        ["什么是{0}？", "请解释一下{0}", "{0}是什么意思", "简单介绍下{0}"],
+        ["langchain", "向量数据库", "RAG", "Embedding", "LCEL", "智能体"],
+    ),
+    "compare": (
+        ["{0}和{1}哪个大？", "比较一下{0}与{1}的大小", "{0}、{1}哪个数字更大", "请问{0}比{1}大吗"],
+        [("1.9", "1.11"), ("3.14", "3.2"), ("10", "9.99"), ("0.5", "0.45"), ("2.5", "2.05"), ("7", "7.01")],
+    ),
+    "howto": (
+        ["Python 里怎么{0}？", "如何用 Python {0}", "用Python{0}的方法", "Python 怎样{0}"],
+        ["读取文件", "反转列表", "发送HTTP请求", "合并两个字典", "对字典排序", "创建虚拟环境"],
+    ),
+}
+
+SYSTEM = SystemMessage("You are a helpful assistant.")
+LLM_STRING = "benchmark"
+
+
+def _prompt(text: str) -> str:
+    return dumps([SYSTEM, HumanMessage(text)])
+
+
+def _format(template: str, slot) -> str:
+    return template.format(*slot) if isinstance(slot, tuple) else template.format(slot)
+
+
+def build_dataset() -> tuple[list[tuple[str, tuple]], list[tuple[str, tuple, bool]]]:
+    """返回 (预热数据 [(问题, key)], 查询 [(问题, key, 是否应命中)])"""
+    seeds, queries = [], []
+    for intent, (templates, slots) in INTENTS.items():
+        cached = len(slots) * 2 // 3
+        for i, slot in enumerate(slots):
+            key = (intent, slot)
+            if i < cached:
+                seeds.append((_format(templates[0], slot), key))
+            for template in templates[1:]:
+                queries.append((_format(template, slot), key, i < cached))
+    return seeds, queries
+
+
+def build_embeddings(name: str):
+    if name == "hashing":
+        from app.text_features import HashingEmbeddings
+
+        return HashingEmbeddings()
+    from app.registry import get_embeddings
+
+    return get_embeddings(name)
+
+
+def evaluate(embeddings_name: str, thresholds: list[float]) -> None:
+    from app.semantic_cache import SemanticCache
+
+    seeds, queries = build_dataset()
+    # 阈值设为 -1：每次都返回最相似的一条，再离线扫描不同阈值
+    cache = SemanticCache(build_embeddings(embeddings_name), threshold=-1.0)
+    for text, key in seeds:
+        cache.update(_prompt(text), LLM_STRING, [Generation(text=repr(key))])
+
+    results, latencies = [], []
+    for text, key, should_hit in queries:
+        start = time.perf_counter()
+        found = cache.lookup(_prompt(text), LLM_STRING)
+        latencies.append(time.perf_counter() - start)
+        results.append((cache.last_score, found[0].text == repr(key), should_hit))
+
+    positives = sum(r[2] for r in results)
+    print(f"embeddings={embeddings_name} seeds={len(seeds)} queries={len(queries)} (should hit: {positives})")
+    print(f"lookup latency: p50={percentile(latencies, 50) * 1e3:.2f}ms p99={percentile(latencies, 99) * 1e3:.2f}ms")
+    print(f"{'threshold':>10}{'hits':>7}{'precision':>11}{'recall':>9}{'false hit':>11}")
+    for threshold in thresholds:
+        hits = [r for r in results if r[0] >= threshold]
+        correct = sum(r[1] and r[2] for r in hits)
+        precision = correct / len(hits) if hits else 1.0
+        print(f"{threshold:>10.2f}{len(hits):>7}{precision:>11.1%}{correct / positives:>9.1%}{len(hits) - correct:>11}")
+
+
+def scan_latency(sizes: list[int], dim: int) -> None:
+    from app.semantic_cache import VectorIndex
+
+    rng = np.random.default_rng(0)
+    print(f"\n{'entries':>10}{'search p50(ms)':>16}{'search p99(ms)':>16}")
+    for size in sizes:
+        index = VectorIndex(max_entries=size)
+        vectors = rng.standard_normal((size, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        for i, vec in enumerate(vectors):
+            index.add(vec, i)
+        latencies = []
+        for vec in vectors[:200]:
+            start = time.perf_counter()
+            index.search(vec)
+            latencies.append(time.perf_counter() - start)
+        print(f"{size:>10}{percentile(latencies, 50) * 1e3:>16.3f}{percentile(latencies, 99) * 1e3:>16.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="语义缓存基准")
+    parser.add_argument("--embeddings", default="hashing", help="hashing 或 app.registry 中的 embedding 逻辑名")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--dim", type=int, default=2048)
+    args = parser.parse_args()
+
+    evaluate(args.embeddings, args.thresholds)
+    scan_latency(args.sizes, args.dim)
+
+
+if __name__ == "__main__":
+    main()
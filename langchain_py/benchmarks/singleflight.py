@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import importlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.stub_server import StubConfig, StubServer, stub_env
+
+"""
+请求合并（single-flight）基准：N 个并发用户在同一时刻提问，问题只有 K 种（热点问题），
+分别走 app/3/agent.py 的复杂度路由（_judge_complexity / _ajudge_complexity）和流式链，
+对比 LLM_COALESCE_ENABLED 关闭 / 开启时发往上游的请求数、耗时和合并次数（只有 temperature=0 的调用会合并，两者都是）。
+最后一行用默认 temperature（0.9）的模型对照：开启后也不合并。
+运行：uv run -m benchmarks.singleflight [--users 100] [--distinct 5]
+"""
+
+
+def set_coalesce(enabled: bool) -> None:
+    from app import registry
+    from app.config import LLMCoalesceSettings, settings
+
+    settings.section(LLMCoalesceSettings).llm_coalesce_enabled = enabled
+    registry.clear()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="请求合并基准")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--distinct", type=int, default=5, help="不同问题的数量")
+    parser.add_argument("--latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    with StubServer(StubConfig(latency=args.latency, token_delay=0.005)) as server:
+        os.environ.update(stub_env(server.base_url))
+        from langchain_core.output_parsers import StrOutputParser
+        from app.registry import get_chat_model
+        from app.singleflight import default_group
+
+        agent = importlib.import_module("app.3.agent")
+        questions = [f"热点问题 {i % args.distinct}：1.9 和 1.11 哪个大？" for i in range(args.users)]
+
+        def run_threads() -> None:
+            with ThreadPoolExecutor(args.users) as pool:
+                list(pool.map(agent._judge_complexity, questions))
+
+        def run_async() -> None:
+            async def main() -> None:
+                await asyncio.gather(*(agent._ajudge_complexity(q) for q in questions))
+            asyncio.run(main())
+
+        def run_stream(temperature: float | None = 0) -> None:
+            overrides = {} if temperature is None else {"temperature": temperature}
+            chain = get_chat_model("glm", max_tokens=100, **overrides) | StrOutputParser()
+            with ThreadPoolExecutor(args.users) as pool:
+                list(pool.map(lambda q: "".join(chain.stream(q)), questions))
+
+        print(f"users={args.users} distinct={args.distinct}")
+        print(f"{'workload':<16}{'coalesce':>9}{'requests':>10}{'coalesced':>11}{'time(s)':>9}")
+        workloads = (
+            ("router/threads", run_threads),
+            ("router/async", run_async),
+            ("stream/threads", run_stream),
+            ("stream/sampled", lambda: run_stream(None)),
+        )
+        for name, run in workloads:
+            for enabled in (False, True):
+                set_coalesce(enabled)
+                server.stats.reset()
+                before = default_group().stats.coalesced
+                start = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - start
+                coalesced = default_group().stats.coalesced - before
+                print(f"{name:<16}{'on' if enabled else 'off':>9}{server.stats.requests:>10}{coalesced:>11}{elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
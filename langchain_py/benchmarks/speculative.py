@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import importlib
+import os
+import time
+from benchmarks.local_classifier import LABELLED, oracle_responder
+from benchmarks.stub_server import StubConfig, StubServer, percentile, stub_env
+
+"""
+投机执行基准：app/1/lcel.py 的三个专家链，分类器为 LLM（qwen3_32b，结构化输出），专家为 glm（流式输出）。
+    top_k=0:  先分类再执行分支（RunnableBranch 的行为）
+    top_k=N:  分类的同时按本地分类器排序投机执行 N 个分支
+报告首 chunk 延迟（TTFT）、总耗时、命中率，以及成本：发往上游的请求数和被取消的请求数。
+运行：uv run -m benchmarks.speculative [--n 15] [--async]
+"""
+
+CLASSIFIER_MODEL = "qwen3_32b"
+ANSWER = "这是专家给出的回答。" * 20
+
+
+def responder(body: dict) -> dict:
+    if body.get("model") == CLASSIFIER_MODEL:
+        return oracle_responder(body)
+    return {"content": ANSWER}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="投机执行基准")
+    parser.add_argument("--n", type=int, default=15, help="问题数")
+    parser.add_argument("--classifier-latency", type=float, default=0.5)
+    parser.add_argument("--expert-latency", type=float, default=0.5)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[0, 1, 2, 3])
+    parser.add_argument("--async", dest="use_async", action="store_true", help="使用 astream（默认 stream）")
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency=args.expert_latency, token_delay=0.01, chunk_size=4, responder=responder,
+        models={CLASSIFIER_MODEL: {"latency": args.classifier_latency}},
+    )
+    with StubServer(config) as server:
+        os.environ.update(stub_env(server.base_url))
+        from langchain_core.runnables import RunnableLambda
+        from app.registry import get_chat_model
+        from app.speculative import SpeculativeBranch
+
+        lcel = importlib.import_module("app.1.lcel")
+        structured = get_chat_model("qwen3_32b", max_tokens=100).with_structured_output(lcel.ClassifyResult)
+        experts = lcel.build_topic_experts(get_chat_model("glm", max_tokens=3000))
+        ranker = lcel.build_topic_classifier()
+        questions = [q for q, _ in LABELLED[::max(len(LABELLED) // args.n, 1)]][:args.n]
+        classifier = RunnableLambda(lambda input: structured.invoke(f"问题：{input['question']}"))
+
+        print(f"mode={'async' if args.use_async else 'sync'} questions={len(questions)}")
+        print(f"{'top_k':>6}{'TTFT p50':>10}{'TTFT p99':>10}{'total p50':>11}{'hit rate':>10}{'requests':>10}{'cancelled':>11}")
+        for top_k in args.top_k:
+            branch = SpeculativeBranch(
+                classifier, experts, default="其他", top_k=top_k,
+                predict=lambda input: ranker.rank(input["question"]),
+                label_of=lambda result: result.type,
+            )
+            ttft, total = [], []
+
+            async def arun(question: str) -> None:
+                start, first = time.perf_counter(), None
+                async for chunk in branch.astream({"question": question}):
+                    if first is None and chunk:
+                        first = time.perf_counter() - start
+                ttft.append(first)
+                total.append(time.perf_counter() - start)
+
+            server.stats.reset()
+            for question in questions:
+                if args.use_async:
+                    asyncio.run(arun(question))
+                    continue
+                start, first = time.perf_counter(), None
+                for chunk in branch.stream({"question": question}):
+                    if first is None and chunk:
+                        first = time.perf_counter() - start
+                ttft.append(first)
+                total.append(time.perf_counter() - start)
+            time.sleep(0.5)  # 等被取消的请求在 stub 端结束，disconnects 才完整
+            s = branch.stats
+            hit_rate = s.hits / s.runs if top_k else float("nan")
+            print(f"{top_k:>6}{percentile(ttft, 50) * 1e3:>10.0f}{percentile(ttft, 99) * 1e3:>10.0f}"
+                  f"{percentile(total, 50) * 1e3:>11.0f}{hit_rate:>10.0%}{server.stats.requests:>10}{server.stats.disconnects:>11}")
+
+
+if __name__ == "__main__":
+    main()
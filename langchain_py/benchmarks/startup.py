@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+"""
+冷启动基准：分别在新进程里导入每个入口模块，记录导入耗时，以及第一次创建模型的耗时。
+运行：uv run -m benchmarks.startup [--repeat 5] [--importtime]
+"""
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+ENTRY_POINTS = [
+    "app.1.quickstart",
+    "app.1.invocation",
+    "app.1.lcel",
+    "app.2.structure_output",
+    "app.2.tool_calling",
+    "app.3.agent",
+    "app.3.checkpointer",
+    "app.3.short_memory",
+    "app.4.embedding",
+]
+
+# 只为创建模型实例提供占位配置，不会发出网络请求
+DUMMY_ENV = {
+    "SILICONFLOW_BASE_URL": "http://127.0.0.1:9/v1",
+    "SILICONFLOW_API_KEY": "dummy",
+    "DS_MODEL": "ds",
+    "DSR1_MODEL": "dsr1",
+    "GLM_MODEL": "glm",
+    "Qwen3_32B_MODEL": "qwen3",
+    "EMBEDDING_MODEL": "embedding",
+}
+
+PROBE = """
+import importlib, json, time
+t0 = time.perf_counter()
+importlib.import_module({module!r})
+t1 = time.perf_counter()
+from app.registry import get_chat_model
+get_chat_model("glm")
+t2 = time.perf_counter()
+get_chat_model("glm")
+t3 = time.perf_counter()
+print(json.dumps({{"import": t1 - t0, "first_model": t2 - t1, "cached_model": t3 - t2}}))
+"""
+
+
+def _env() -> dict[str, str]:
+    env = dict(os.environ)
+    for key, value in DUMMY_ENV.items():
+        env.setdefault(key, value)
+    return env
+
+
+def measure(module: str, repeat: int) -> dict[str, float]:
+    samples: dict[str, list[float]] = {"import": [], "first_model": [], "cached_model": []}
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module)],
+            cwd=PROJECT_DIR, env=_env(), capture_output=True, text=True, check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        for key, value in result.items():
+            samples[key].append(value)
+    return {key: statistics.median(values) for key, values in samples.items()}
+
+
+def import_time_top(module: str, top: int = 10) -> list[tuple[int, str]]:
+    """使用 -X importtime 找出最耗时的依赖（累计微秒）"""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import importlib; importlib.import_module({module!r})"],
+        cwd=PROJECT_DIR, env=_env(), capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # 只看顶层导入
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="入口模块冷启动基准")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="打印每个入口最耗时的顶层依赖")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出，方便记录历史数据")
+    args = parser.parse_args()
+
+    report = {module: measure(module, args.repeat) for module in ENTRY_POINTS}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'entry point':<26}{'import(ms)':>12}{'first model(ms)':>18}{'cached(us)':>12}")
+        for module, r in report.items():
+            print(f"{module:<26}{r['import'] * 1e3:>12.1f}{r['first_model'] * 1e3:>18.1f}{r['cached_model'] * 1e6:>12.1f}")
+
+    if args.importtime:
+        for module in ENTRY_POINTS:
+            print(f"\n{module}")
+            for cumulative, name in import_time_top(module):
+                print(f"  {cumulative / 1e3:>8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
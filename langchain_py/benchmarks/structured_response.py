@@ -0,0 +1,111 @@
+import argparse
+import importlib
+import json
+import os
+import random
+import time
+from benchmarks.stub_server import StubConfig, StubServer, percentile, stub_env
+
+"""
+agent 结构化响应基准：app/3/agent.py 的 compare_two_numbers + CompareResult，对比
+    two-pass:      agent 先用文字回答，再用 with_structured_output 抽取（多一次模型调用）
+    tool:          response_format=ToolStrategy(CompareResult)（schema 作为工具，强制调用工具）
+    provider:      response_format=ProviderStrategy(CompareResult)（原生 json_schema，输出不合格时报错）
+    single-call:   SingleCallResponseMiddleware(CompareResult)（json_schema + 本地修复）
+    json-mode:     SingleCallResponseMiddleware(CompareResult, mode="json_mode")
+场景：
+    tool-turn:   "1.9 和1.11 哪个数字大？"，先调用 compare_two_numbers 再回答
+    chat-turn:   "谢谢！"，不需要工具，直接回答
+stub 模拟模型：还没有工具结果时调用 compare_two_numbers；有 CompareResult 工具时调用它；请求带 response_format 时输出 JSON，
+以 --noise 的概率把 JSON 放在代码块中并加上说明文字（json_mode 下常见）。
+报告每轮的模型调用数、端到端延迟 p50 和成功拿到 structured_response 的比例。
+运行：uv run -m benchmarks.structured_response [--turns 10] [--noise 0.3]
+"""
+
+ANSWER = {"num1": 1.9, "num2": 1.11, "result": 1}
+CHAT_ANSWER = {"num1": 0, "num2": 0, "result": 0}
+_random = random.Random(0)
+_noise = 0.0
+
+
+def responder(body: dict) -> dict:
+    messages = body["messages"]
+    tools = {t["function"]["name"] for t in body.get("tools", [])}
+    question = next(m["content"] for m in reversed(messages) if m["role"] == "user")
+    has_result = any(m["role"] == "tool" and m.get("name", "") != "CompareResult" for m in messages)
+    if "compare_two_numbers" in tools and "哪个" in question and not has_result:
+        return {"tool_calls": [{"name": "compare_two_numbers", "arguments": {"a": 1.9, "b": 1.11}}]}
+    answer = ANSWER if "哪个" in question or has_result else CHAT_ANSWER
+    if "CompareResult" in tools:
+        return {"tool_calls": [{"name": "CompareResult", "arguments": answer}]}
+    if "response_format" in body:
+        content = json.dumps(answer, ensure_ascii=False)
+        if _random.random() < _noise:
+            content = f"根据比较结果：\n```json\n{content}\n```"
+        return {"content": content}
+    return {"content": "根据比较结果，1.9 比 1.11 大。" if answer is ANSWER else "不客气！"}
+
+
+def main() -> None:
+    global _noise
+    parser = argparse.ArgumentParser(description="agent 结构化响应基准")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="首 token 延迟（秒）")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="每个 chunk 的生成耗时（秒）")
+    parser.add_argument("--noise", type=float, default=0.3, help="JSON 输出带代码块和说明文字的概率")
+    args = parser.parse_args()
+    _noise = args.noise
+
+    config = StubConfig(latency=args.latency, token_delay=args.token_delay, chunk_size=4, simulate_generation=True,
+                        responder=responder)
+    with StubServer(config) as server:
+        os.environ.update(stub_env(server.base_url))
+        from langchain.agents import create_agent
+        from langchain.agents.structured_output import ProviderStrategy, ToolStrategy
+        from app.structured_response import SingleCallResponseMiddleware
+
+        agent_module = importlib.import_module("app.3.agent")
+        CompareResult = agent_module.CompareResult
+        model = agent_module.glm_model()
+        tools = [agent_module.compare_two_numbers]
+        extractor = model.with_structured_output(CompareResult)
+
+        def two_pass(messages: list) -> object:
+            result = create_agent(model, tools=tools).invoke({"messages": messages})
+            return extractor.invoke(result["messages"])
+
+        def build(**kwargs):
+            agent = create_agent(model, tools=tools, **kwargs)
+            return lambda messages: agent.invoke({"messages": messages}).get("structured_response")
+
+        strategies = {
+            "two-pass": two_pass,
+            "tool": build(response_format=ToolStrategy(CompareResult)),
+            "provider": build(response_format=ProviderStrategy(CompareResult)),
+            "single-call": build(middleware=[SingleCallResponseMiddleware(CompareResult)]),
+            "json-mode": build(middleware=[SingleCallResponseMiddleware(CompareResult, mode="json_mode")]),
+        }
+        scenarios = {"tool-turn": "1.9 和1.11 哪个数字大？", "chat-turn": "谢谢！"}
+
+        print(f"turns={args.turns} latency={args.latency}s token_delay={args.token_delay}s noise={args.noise}")
+        print(f"{'scenario':<11}{'strategy':<13}{'calls/turn':>11}{'p50(ms)':>9}{'ok':>7}")
+        for scenario, question in scenarios.items():
+            for name, run in strategies.items():
+                # 工具结果缓存会让各策略的工具耗时不同，每个策略都重新开始
+                agent_module.compare_two_numbers.func.cache.clear()
+                _random.seed(0)
+                server.stats.reset()
+                latencies, ok = [], 0
+                for _ in range(args.turns):
+                    start = time.perf_counter()
+                    try:
+                        ok += run([{"role": "user", "content": question}]) is not None
+                    except Exception:
+                        pass
+                    latencies.append(time.perf_counter() - start)
+                print(f"{scenario:<11}{name:<13}{server.stats.requests / args.turns:>11.1f}"
+                      f"{percentile(latencies, 50) * 1e3:>9.0f}{ok / args.turns:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
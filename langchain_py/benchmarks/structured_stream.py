@@ -0,0 +1,83 @@
+import argparse
+import importlib
+import json
+import os
+import time
+from benchmarks.stub_server import StubConfig, StubServer, percentile, stub_env
+
+"""
+流式结构化输出基准：app/2/structure_output.py 的 Movie 和 DevProcessList，对比
+    blocking:   model.with_structured_output(schema).invoke（等整个 JSON 生成完）
+    streaming:  with_streaming_structure(model, schema).stream（每多一个完整字段 / 列表元素产出一次）
+报告首个字段（列表的第一个元素）可用的时间和总耗时。stub 按 token_delay 模拟模型的生成速度（非流式请求同样计入生成耗时）。
+运行：uv run -m benchmarks.structured_stream [--runs 10] [--token-delay 0.02]
+"""
+
+MOVIE = {"title": "罗小黑战记2", "year": 2025, "director": "MTJJ", "rating": 8.5}
+# 每个步骤带说明，让列表足够长，接近真实输出
+STEPS = [f"{name}：{desc}" for name, desc in [
+    ("需求分析", "与用户沟通，明确功能需求、非功能需求和验收标准，输出需求规格说明书"),
+    ("系统设计", "确定系统架构、模块划分、接口定义和数据库设计"),
+    ("编码实现", "按照设计文档编写代码，进行代码审查和单元测试"),
+    ("软件测试", "执行集成测试、系统测试和验收测试，修复发现的缺陷"),
+    ("部署发布", "准备生产环境，发布版本并进行上线验证"),
+    ("运维维护", "监控系统运行状态，处理线上问题，持续迭代优化"),
+]]
+
+
+def responder(body: dict) -> dict:
+    text = body["messages"][-1]["content"]
+    return {"content": json.dumps(MOVIE if "电影" in text else STEPS, ensure_ascii=False)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="流式结构化输出基准")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="首 token 延迟（秒）")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="每个 chunk 的间隔（秒）")
+    args = parser.parse_args()
+
+    config = StubConfig(latency=args.latency, token_delay=args.token_delay, chunk_size=2, simulate_generation=True,
+                        responder=responder)
+    with StubServer(config) as server:
+        os.environ.update(stub_env(server.base_url))
+        from app.registry import get_chat_model
+        from app.structured_stream import with_streaming_structure
+
+        structure_output = importlib.import_module("app.2.structure_output")
+        model = get_chat_model("glm", max_tokens=5000)
+        cases = {
+            "Movie": (structure_output.Movie, "介绍下电影《罗小黑战记2》，获取title、year、director、rating信息"),
+            "DevProcessList": (structure_output.DevProcessList, "软件开发的流程是？请给我一个有顺序的字符串列表"),
+        }
+
+        print(f"runs={args.runs} latency={args.latency}s token_delay={args.token_delay}s")
+        print(f"{'schema':<16}{'mode':<11}{'first field p50(ms)':>21}{'total p50(ms)':>15}{'partials':>10}")
+        for name, (schema, question) in cases.items():
+            messages = [{"role": "user", "content": question}]
+            blocking = model.with_structured_output(schema)
+            streaming = with_streaming_structure(model, schema)
+
+            totals = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                blocking.invoke(messages)
+                totals.append(time.perf_counter() - start)
+            p50 = percentile(totals, 50) * 1e3
+            print(f"{name:<16}{'blocking':<11}{p50:>21.0f}{p50:>15.0f}{1:>10}")
+
+            firsts, totals, partials = [], [], 0
+            for _ in range(args.runs):
+                start, first, partials = time.perf_counter(), None, 0
+                for _partial in streaming.stream(messages):
+                    partials += 1
+                    if first is None:
+                        first = time.perf_counter() - start
+                firsts.append(first)
+                totals.append(time.perf_counter() - start)
+            print(f"{name:<16}{'streaming':<11}{percentile(firsts, 50) * 1e3:>21.0f}"
+                  f"{percentile(totals, 50) * 1e3:>15.0f}{partials:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+"""
+本地 OpenAI 兼容的 stub 服务，供 benchmarks 使用，不会访问真实的模型服务。
+支持 /v1/chat/completions（普通 / 流式 / tool call）和 /v1/embeddings，
+可以注入延迟、慢请求、限流（429）、服务端错误（500）和挂起。
+
+用法：
+    with StubServer(StubConfig(latency=0.05)) as server:
+        model = ChatOpenAI(model="stub", base_url=server.base_url, api_key="stub")
+        model.invoke("你好")
+        print(server.stats.connections, server.stats.requests)
+
+运行：uv run -m benchmarks.stub_server --port 8765
+"""
+
+# responder(请求体) -> {"content": str} 或 {"tool_calls": [{"name": str, "arguments": dict | str}]}
+Responder = Callable[[dict[str, Any]], dict[str, Any]]
+
+
+@dataclass
+class StubConfig:
+    # 首字节前的固定延迟（秒）
+    latency: float = 0.0
+    # 流式输出时每个 chunk 之间的间隔（秒）
+    token_delay: float = 0.0
+    # 流式输出时每个 chunk 的字符数
+    chunk_size: int = 4
+    # 非流式请求也按 token_delay 模拟生成耗时（与流式输出完整个回复的时间相同），否则只有 latency
+    simulate_generation: bool = False
+    # 以 slow_ratio 的概率额外增加 slow_delay 的延迟
+    slow_ratio: float = 0.0
+    slow_delay: float = 0.0
+    # 以 error_ratio 的概率返回 500
+    error_ratio: float = 0.0
+    # 以 hang_ratio 的概率挂起 hang_delay 秒后再返回（模拟卡死的上游）
+    hang_ratio: float = 0.0
+    hang_delay: float = 30.0
+    # 令牌桶限流：每秒请求数，超出返回 429；0 表示不限流
+    rate_limit_rps: float = 0.0
+    rate_limit_burst: int = 1
+    # 同时处理的请求数上限，超出返回 429；0 表示不限
+    max_concurrency: int = 0
+    # 自定义回复内容
+    responder: Responder | None = None
+    # 按模型名覆盖以上配置，如 {"glm": {"latency": 0.5}}
+    models: dict[str, dict[str, Any]] = field(default_factory=dict)
+
+    def for_model(self, model: str) -> "StubConfig":
+        overrides = self.models.get(model)
+        return replace(self, **overrides) if overrides else self
+
+
+@dataclass
+class StubStats:
+    connections: int = 0
+    requests: int = 0
+    status: Counter = field(default_factory=Counter)
+    models: Counter = field(default_factory=Counter)
+    in_flight: int = 0
+    max_in_flight: int = 0
+    disconnects: int = 0  # 响应完成前客户端断开（超时或取消）
+
+    def reset(self) -> None:
+        self.connections = self.requests = self.in_flight = self.max_in_flight = self.disconnects = 0
+        self.status.clear()
+        self.models.clear()
+
+
+def default_responder(body: dict[str, Any]) -> dict[str, Any]:
+    """默认回复：复述最后一条用户消息"""
+    last = ""
+    for message in reversed(body.get("messages", [])):
+        if message.get("role") == "user":
+            content = message.get("content")
+            last = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+            break
+    return {"content": f"stub reply: {last[:200]}"}
+
+
+def _fake_embedding(text: str, dims: int = 64) -> list[float]:
+    """确定性的伪 embedding（字符二元组哈希），相同文本得到相同向量"""
+    vector = [0.0] * dims
+    for i in range(max(len(text) - 1, 1)):
+        h = int(hashlib.md5(text[i:i + 2].encode()).hexdigest()[:8], 16)
+        vector[h % dims] += 1.0 if h & 1 else -1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive
+    # 响应头和 body 分两次写入；不关闭 Nagle 的话，复用的连接每个请求都要等对方的延迟 ACK（约 40ms）
+    disable_nagle_algorithm = True
+    server: "_Server"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.stats.connections += 1
+
+    # ---------------------------------------------------------------- 路由
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        stub = self.server
+        config = stub.config.for_model(body.get("model", ""))
+        with stub.lock:
+            stub.stats.requests += 1
+            stub.stats.models[body.get("model", "")] += 1
+            stub.stats.in_flight += 1
+            stub.stats.max_in_flight = max(stub.stats.max_in_flight, stub.stats.in_flight)
+            in_flight = stub.stats.in_flight
+        try:
+            if config.max_concurrency and in_flight > config.max_concurrency:
+                return self._error(429, "too many concurrent requests")
+            if config.rate_limit_rps and not stub.bucket(config).take():
+                return self._error(429, "rate limit exceeded")
+            if config.error_ratio and random.random() < config.error_ratio:
+                return self._error(500, "injected server error")
+            delay = config.latency
+            if config.slow_ratio and random.random() < config.slow_ratio:
+                delay += config.slow_delay
+            if config.hang_ratio and random.random() < config.hang_ratio:
+                delay += config.hang_delay
+            if delay:
+                time.sleep(delay)
+            if self.path.endswith("/embeddings"):
+                return self._embeddings(body)
+            if self.path.endswith("/chat/completions"):
+                return self._chat(body, config)
+            self._error(404, f"unknown path {self.path}")
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端超时或取消后断开
+            with stub.lock:
+                stub.stats.disconnects += 1
+        finally:
+            with stub.lock:
+                stub.stats.in_flight -= 1
+
+    # ---------------------------------------------------------------- 响应
+    def _send_json(self, status: int, payload: dict[str, Any]) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with self.server.lock:
+            self.server.stats.status[status] += 1
+
+    def _error(self, status: int, message: str) -> None:
+        self._send_json(status, {"error": {"message": message, "type": "stub_error", "code": status}})
+
+    def _embeddings(self, body: dict[str, Any]) -> None:
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        data = [
+            {"object": "embedding", "index": i, "embedding": _fake_embedding(text if isinstance(text, str) else str(text))}
+            for i, text in enumerate(inputs)
+        ]
+        self._send_json(200, {"object": "list", "data": data, "model": body.get("model"), "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+
+    def _chat(self, body: dict[str, Any], config: StubConfig) -> None:
+        reply = (config.responder or default_responder)(body)
+        content = reply.get("content") or ""
+        tool_calls = [
+            {
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {
+                    "name": call["name"],
+                    "arguments": call["arguments"] if isinstance(call["arguments"], str)
+                    else json.dumps(call["arguments"], ensure_ascii=False),
+                },
+            }
+            for call in reply.get("tool_calls", [])
+        ]
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        usage = {"prompt_tokens": 10, "completion_tokens": max(len(content) // 2, 1), "total_tokens": 10 + max(len(content) // 2, 1)}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model", "stub")}
+
+        if not body.get("stream"):
+            if config.simulate_generation and config.token_delay:
+                generated = len(content) + sum(len(call["function"]["arguments"]) for call in tool_calls)
+                time.sleep(-(-generated // max(config.chunk_size, 1)) * config.token_delay)
+            message: dict[str, Any] = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            self._send_json(200, {
+                **base, "object": "chat.completion",
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def emit(payload: dict[str, Any] | str) -> None:
+            data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+            raw = f"data: {data}\n\n".encode()
+            self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta: dict[str, Any], finish: str | None = None) -> dict[str, Any]:
+            return {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+
+        emit(chunk({"role": "assistant", "content": ""}))
+        size = max(config.chunk_size, 1)
+        for i in range(0, len(content), size):
+            if i and config.token_delay:
+                time.sleep(config.token_delay)
+            emit(chunk({"content": content[i:i + size]}))
+        for index, call in enumerate(tool_calls):
+            emit(chunk({"tool_calls": [{"index": index, "id": call["id"], "type": "function", "function": {"name": call["function"]["name"], "arguments": ""}}]}))
+            arguments = call["function"]["arguments"]
+            for i in range(0, len(arguments), size):
+                if config.token_delay:
+                    time.sleep(config.token_delay)
+                emit(chunk({"tool_calls": [{"index": index, "function": {"arguments": arguments[i:i + size]}}]}))
+        emit(chunk({}, finish_reason))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            emit({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+        emit("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+        with self.server.lock:
+            self.server.stats.status[200] += 1
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address: tuple[str, int], config: StubConfig) -> None:
+        super().__init__(address, _Handler)
+        self.config = config
+        self.stats = StubStats()
+        self.lock = threading.Lock()
+        self._buckets: dict[tuple[float, int], _TokenBucket] = {}
+
+    def bucket(self, config: StubConfig) -> _TokenBucket:
+        key = (config.rate_limit_rps, config.rate_limit_burst)
+        with self.lock:
+            if key not in self._buckets:
+                self._buckets[key] = _TokenBucket(*key)
+            return self._buckets[key]
+
+    def server_bind(self) -> None:
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        super().server_bind()
+
+
+class StubServer:
+    """在后台线程中运行的 stub 服务"""
+
+    def __init__(self, config: StubConfig | None = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        self._server = _Server((host, port), config or StubConfig())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def config(self) -> StubConfig:
+        return self._server.config
+
+    @config.setter
+    def config(self, config: StubConfig) -> None:
+        self._server.config = config
+
+    @property
+    def stats(self) -> StubStats:
+        return self._server.stats
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def stub_env(base_url: str) -> dict[str, str]:
+    """让 app.config 指向 stub 服务的环境变量"""
+    return {
+        "SILICONFLOW_BASE_URL": base_url,
+        "SILICONFLOW_API_KEY": "stub",
+        "DS_MODEL": "ds",
+        "DSR1_MODEL": "dsr1",
+        "GLM_MODEL": "glm",
+        "Qwen3_32B_MODEL": "qwen3_32b",
+        "EMBEDDING_MODEL": "embedding",
+    }
+
+
+def percentile(values: list[float], p: float) -> float:
+    """最近秩法求百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容 stub 服务")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--rate-limit-rps", type=float, default=0.0)
+    args = parser.parse_args()
+    server = StubServer(
+        StubConfig(latency=args.latency, token_delay=args.token_delay, rate_limit_rps=args.rate_limit_rps),
+        port=args.port,
+    )
+    print(f"stub server listening on {server.base_url}")
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import time
+from langchain_core.messages import AIMessage, ToolCall
+from langchain_core.tools import StructuredTool
+from app.tool_executor import ToolExecutor, ToolLimits, format_tool_output
+
+"""
+工具并发执行基准：用 sleep 模拟慢工具（外部 API），对比一条 AIMessage 中的多个工具调用
+    sequential:   逐个 tool.invoke（app/2/tool_calling.py 原来的做法）
+    threads:      ToolExecutor.execute（线程池）
+    asyncio:      ToolExecutor.aexecute（异步工具）
+场景：
+    reviews:  正面 / 负面评论两个调用（test_tool_calling_3 的情况）
+    fan-out:  N 个搜索调用，search 限制并发为 3
+    timeout:  fan-out 加一个卡住的工具，单独设置 1 秒超时
+运行：uv run -m benchmarks.tool_executor [--delay 0.5] [--fan-out 8]
+"""
+
+
+def make_tool(name: str, delay: float) -> StructuredTool:
+    def func(query: str) -> list[str]:
+        time.sleep(delay)
+        return [f"{name}: {query}"]
+
+    async def afunc(query: str) -> list[str]:
+        await asyncio.sleep(delay)
+        return [f"{name}: {query}"]
+
+    return StructuredTool.from_function(func, coroutine=afunc, name=name, description=f"模拟耗时 {delay}s 的工具")
+
+
+def tool_call(name: str, i: int) -> ToolCall:
+    return ToolCall(name=name, args={"query": f"q{i}"}, id=f"call_{name}_{i}", type="tool_call")
+
+
+def run_sequential(tools: dict[str, StructuredTool], message: AIMessage) -> list[str]:
+    return [format_tool_output(tools[call["name"]].invoke(call["args"])) for call in message.tool_calls]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="工具并发执行基准")
+    parser.add_argument("--delay", type=float, default=0.5, help="每个工具调用的耗时（秒）")
+    parser.add_argument("--fan-out", type=int, default=8, help="fan-out 场景的搜索调用数")
+    parser.add_argument("--hang", type=float, default=5.0, help="卡住的工具的耗时（秒）")
+    args = parser.parse_args()
+
+    tools = {name: make_tool(name, args.delay) for name in ("get_positive_reviews", "get_negative_reviews", "search")}
+    tools["hanging"] = make_tool("hanging", args.hang)
+    limits = {"search": ToolLimits(max_concurrency=3), "hanging": ToolLimits(timeout=1.0)}
+
+    scenarios = {
+        "reviews": [tool_call("get_positive_reviews", 0), tool_call("get_negative_reviews", 0)],
+        "fan-out": [tool_call("search", i) for i in range(args.fan_out)],
+        "timeout": [tool_call("search", i) for i in range(args.fan_out)] + [tool_call("hanging", 0)],
+    }
+
+    print(f"delay={args.delay}s fan_out={args.fan_out}")
+    print(f"{'scenario':<10}{'mode':<12}{'calls':>6}{'time(s)':>9}{'errors':>8}{'timeouts':>10}{'peak':>6}")
+    for scenario, calls in scenarios.items():
+        message = AIMessage(content="", tool_calls=calls)
+        modes = {
+            "threads": lambda executor: executor.execute(message),
+            "asyncio": lambda executor: asyncio.run(executor.aexecute(message)),
+        }
+        if scenario != "timeout":  # 逐个执行时卡住的工具没有超时
+            start = time.perf_counter()
+            run_sequential(tools, message)
+            print(f"{scenario:<10}{'sequential':<12}{len(calls):>6}{time.perf_counter() - start:>9.2f}{'-':>8}{'-':>10}{1:>6}")
+        expected = None
+        for mode, run in modes.items():
+            executor = ToolExecutor(list(tools.values()), limits=limits)
+            start = time.perf_counter()
+            messages = run(executor)
+            elapsed = time.perf_counter() - start
+            executor.close()
+            # 无论完成顺序如何，结果顺序都与 tool_calls 一致
+            ids = [m.tool_call_id for m in messages]
+            assert ids == [call["id"] for call in calls], ids
+            expected = expected or [m.content for m in messages]
+            assert [m.content for m in messages] == expected
+            s = executor.stats
+            print(f"{scenario:<10}{mode:<12}{len(calls):>6}{elapsed:>9.2f}{s.errors:>8}{s.timeouts:>10}{s.peak_concurrency:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import contextlib
+import importlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from benchmarks.stub_server import StubConfig, StubServer, percentile, stub_env
+
+"""
+跟踪对 agent 每轮对话的开销：app/3/agent.py 的 compare_two_numbers（每轮两次模型调用 + 一次工具调用），stub 服务不加延迟，
+只测 langchain / langgraph 本身和跟踪的耗时，对比
+    off:       不跟踪
+    sampled:   TracingHandler(verbosity="summary", sample_rate=0.01)，慢 / 出错的对话也会保留（这里没有）
+    full:      TracingHandler(verbosity="full", sample_rate=1.0)，每轮对话的所有事件和输入 / 输出都写入 JSONL
+    debug:     ConsoleCallbackHandler，原来 set_debug(True) 的打印（输出重定向到 /dev/null，打印到终端时更慢）
+报告每轮的 p50 / p99 / 平均耗时、相对 off 的额外耗时，以及写入的事件数和 JSONL 大小（写入在后台线程，不计入每轮耗时）。
+运行：uv run -m benchmarks.tracing [--turns 200]
+"""
+
+
+def responder(body: dict) -> dict:
+    if any(m["role"] == "tool" for m in body["messages"]):
+        return {"content": "1.9 比 1.11 大。"}
+    return {"tool_calls": [{"name": "compare_two_numbers", "arguments": {"a": 1.9, "b": 1.11}}]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="跟踪对 agent 每轮对话的开销")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+
+    with StubServer(StubConfig(responder=responder)) as server:
+        os.environ.update(stub_env(server.base_url))
+        from langchain.agents import create_agent
+        from langchain_core.tracers.stdout import ConsoleCallbackHandler
+        from app.tracing import TraceBuffer, TracingHandler
+
+        agent_module = importlib.import_module("app.3.agent")
+        agent_module.compare_two_numbers.func.cache.clear()
+        agent = create_agent(agent_module.ds_model(), tools=[agent_module.compare_two_numbers])
+        inputs = {"messages": [{"role": "user", "content": "1.9 和1.11 哪个数字大？"}]}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            modes = {
+                "off": None,
+                "sampled": TracingHandler(TraceBuffer(Path(tmp) / "sampled.jsonl"), verbosity="summary", sample_rate=0.01),
+                "full": TracingHandler(TraceBuffer(Path(tmp) / "full.jsonl"), verbosity="full", sample_rate=1.0),
+                "debug": ConsoleCallbackHandler(),
+            }
+            print(f"turns={args.turns}")
+            print(f"{'mode':<9}{'p50(ms)':>9}{'p99(ms)':>9}{'mean(ms)':>10}{'extra(ms)':>10}{'traces':>8}{'events':>8}{'jsonl(KB)':>11}")
+            baseline = None
+            for name, tracer in modes.items():
+                config = {"callbacks": [tracer]} if tracer is not None else {}
+                durations = []
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    for i in range(args.warmup + args.turns):
+                        start = time.perf_counter()
+                        agent.invoke(inputs, config=config)
+                        if i >= args.warmup:
+                            durations.append(time.perf_counter() - start)
+                mean = sum(durations) / len(durations)
+                baseline = mean if baseline is None else baseline
+                traces = events = size = 0
+                if isinstance(tracer, TracingHandler):
+                    tracer.buffer.close()
+                    traces = tracer.stats.sampled + tracer.stats.slow + tracer.stats.errors
+                    events = tracer.buffer.stats.written
+                    size = tracer.buffer.path.stat().st_size if tracer.buffer.path.exists() else 0
+                print(f"{name:<9}{percentile(durations, 50) * 1e3:>9.2f}{percentile(durations, 99) * 1e3:>9.2f}"
+                      f"{mean * 1e3:>10.2f}{(mean - baseline) * 1e3:>+10.2f}{traces:>8}{events:>8}{size / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()